@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Patch engine for the source codemods in codemod_patches.py (formerly the
+update_*.py, fix_paths.py, optimize_frontend.py and deep_optimize.py scripts).
+
+Every target file is read once; all registered patches for it are applied in
+memory, in registration order, and the result is written once. Files are
+processed in parallel across a process pool.
+
+A patch reports one of:
+    applied     its edits changed the file
+    already     its guard (or replacement text) is already present
+    n/a         its precondition is not met, or the target file does not exist
+    unmatched   none of its anchors were found: the patch did nothing
+    partial     some of its edits matched and some did not
+    journaled   skipped: the journal shows it already ran on this exact content
+
+The journal (.codemod_journal.json) records, per file, the content hash after
+the last run and the fingerprint of each patch that ran cleanly on it. A
+patch is skipped while both still match; editing the file or the patch makes
+it run again.
+
+Usage:
+    python3 codemod.py                     # apply every patch
+    python3 codemod.py --dry-run           # print unified diffs, write nothing
+    python3 codemod.py --only update_costs,fix_paths --workers 4
+    python3 codemod.py --list
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+JOURNAL_PATH = ".codemod_journal.json"
+CLEAN_STATUSES = ("applied", "already", "n/a")
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Replace:
+    """
+    Literal str.replace of every occurrence of old.
+    """
+
+    def __init__(self, old, new):
+        self.old, self.new = old, new
+
+    def apply(self, content):
+        count = content.count(self.old)
+        return (content.replace(self.old, self.new), count) if count else (content, 0)
+
+    def present(self, content):
+        return self.new in content
+
+    def key(self):
+        return ["replace", self.old, self.new]
+
+
+class Sub:
+    """
+    re.sub of pattern (a string, compiled with flags).
+    """
+
+    def __init__(self, pattern, repl, flags=0):
+        self.pattern, self.repl, self.flags = pattern, repl, flags
+        self.regex = re.compile(pattern, flags)
+
+    def apply(self, content):
+        # repl is inserted literally: no group references or escape processing.
+        return self.regex.subn(lambda m: self.repl, content)
+
+    def present(self, content):
+        return self.repl in content
+
+    def key(self):
+        return ["sub", self.pattern, self.repl, self.flags]
+
+
+class Prepend:
+    def __init__(self, text):
+        self.text = text
+
+    def apply(self, content):
+        return self.text + content, 1
+
+    def present(self, content):
+        return content.startswith(self.text)
+
+    def key(self):
+        return ["prepend", self.text]
+
+
+class Patch:
+    """
+    A named group of edits on one file. guard: text whose presence means the
+    patch is already applied. requires: text that must be present for the
+    patch to apply at all.
+    """
+
+    def __init__(self, name, path, edits, guard=None, requires=None, description=""):
+        self.name, self.path, self.edits = name, path, list(edits)
+        self.guard, self.requires, self.description = guard, requires, description
+        self.fingerprint = content_hash(json.dumps(
+            [path, guard, requires] + [edit.key() for edit in self.edits], ensure_ascii=False))[:16]
+
+    def apply(self, content):
+        """
+        Returns (new content, status, number of edits that missed).
+        """
+        if self.requires is not None and self.requires not in content:
+            return content, "n/a", 0
+        if self.guard is not None and self.guard in content:
+            return content, "already", 0
+        missed = 0
+        present = 0
+        for edit in self.edits:
+            content, count = edit.apply(content)
+            if count:
+                continue
+            if edit.present(content):
+                present += 1
+            else:
+                missed += 1
+        applied = len(self.edits) - missed - present
+        if not missed:
+            return content, "applied" if applied else "already", 0
+        return content, "partial" if applied or present else "unmatched", missed
+
+
+def load_registry():
+    # The registry lives with the patches, so it is the same dict whether this
+    # file runs as __main__ or is imported by a pool worker.
+    from codemod_patches import PATCHES
+    return PATCHES
+
+
+def select(names=None):
+    patches = list(load_registry().values())
+    if not names:
+        return patches
+    # A name selects one patch or, as a prefix, a whole group ("update_costs").
+    chosen = [p for p in patches if any(p.name == n or p.name.startswith(n + ".") for n in names)]
+    unknown = [n for n in names if not any(p.name == n or p.name.startswith(n + ".") for p in patches)]
+    if unknown:
+        raise SystemExit(f"Unknown patch: {', '.join(unknown)}")
+    return chosen
+
+
+def run_file(path, names, journal_entry, dry_run):
+    """
+    Apply the named patches to one file. Runs in a pool worker.
+    """
+    patches = [load_registry()[name] for name in names]
+    results = []
+    if not os.path.exists(path):
+        return {"path": path, "results": [(p.name, "n/a", 0, 0.0) for p in patches], "changed": False}
+
+    with open(path, "r", encoding="utf-8") as f:
+        original = f.read()
+    original_hash = content_hash(original)
+    journaled = journal_entry.get("patches", {}) if journal_entry.get("sha256") == original_hash else {}
+
+    content = original
+    for patch in patches:
+        if journaled.get(patch.name) == patch.fingerprint:
+            results.append((patch.name, "journaled", 0, 0.0))
+            continue
+        started = time.perf_counter()
+        content, status, missed = patch.apply(content)
+        results.append((patch.name, status, missed, time.perf_counter() - started))
+
+    changed = content != original
+    outcome = {"path": path, "results": results, "changed": changed, "sha256": content_hash(content)}
+    if changed and dry_run:
+        outcome["diff"] = "".join(difflib.unified_diff(
+            original.splitlines(keepends=True), content.splitlines(keepends=True), f"a/{path}", f"b/{path}"))
+    elif changed:
+        # Write-then-rename so an interrupted run never leaves a half-written source file.
+        tmp = f"{path}.codemod.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    return outcome
+
+
+def load_journal(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_journal(path, files):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def update_journal(journal, outcome):
+    if "sha256" not in outcome:
+        return
+    registry = load_registry()
+    entry = journal.get(outcome["path"], {})
+    # Fingerprints recorded for the old content only hold if the content is unchanged.
+    kept = entry.get("patches", {}) if entry.get("sha256") == outcome["sha256"] and not outcome["changed"] else {}
+    for name, status, _, _ in outcome["results"]:
+        if status in CLEAN_STATUSES or status == "journaled":
+            kept[name] = registry[name].fingerprint
+        else:
+            kept.pop(name, None)
+    journal[outcome["path"]] = {"sha256": outcome["sha256"], "patches": kept}
+
+
+def run(patches, workers=None, dry_run=False, journal_path=JOURNAL_PATH, use_journal=True):
+    """
+    Apply patches grouped by file across a process pool. Returns the per-file outcomes.
+    """
+    journal = load_journal(journal_path) if use_journal else {}
+    by_file = {}
+    for patch in patches:
+        by_file.setdefault(patch.path, []).append(patch.name)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_file, path, names, journal.get(path, {}), dry_run)
+                   for path, names in by_file.items()]
+        outcomes = [future.result() for future in futures]
+
+    if not dry_run and use_journal:
+        for outcome in outcomes:
+            update_journal(journal, outcome)
+        save_journal(journal_path, journal)
+    return outcomes
+
+
+def print_report(outcomes, elapsed, dry_run):
+    counts = {}
+    unmatched = []
+    for outcome in outcomes:
+        for name, status, missed, seconds in outcome["results"]:
+            counts[status] = counts.get(status, 0) + 1
+            detail = f" ({missed} edit(s) missed)" if status == "partial" else ""
+            print(f"{status:<10} {seconds * 1000:8.2f} ms  {name}  [{outcome['path']}]{detail}")
+            if status in ("unmatched", "partial"):
+                unmatched.append(name)
+        if outcome.get("diff"):
+            sys.stdout.write(outcome["diff"])
+    changed = sum(1 for o in outcomes if o["changed"])
+    verb = "would change" if dry_run else "changed"
+    print(f"\n{len(outcomes)} files read, {changed} {verb} in {elapsed:.2f}s: "
+          + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    if unmatched:
+        print(f"Patches that matched nothing: {', '.join(unmatched)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the registered source codemods")
+    parser.add_argument("--dry-run", action="store_true", help="print unified diffs instead of writing files")
+    parser.add_argument("--only", help="comma-separated patch names or groups")
+    parser.add_argument("--workers", type=int, default=None, help="pool processes (default: CPU count)")
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    parser.add_argument("--no-journal", action="store_true", help="evaluate every patch and leave the journal alone")
+    parser.add_argument("--list", action="store_true", help="list registered patches")
+    parser.add_argument("--strict", action="store_true", help="exit 1 if any patch matched nothing")
+    args = parser.parse_args()
+
+    patches = select([n.strip() for n in args.only.split(",") if n.strip()] if args.only else None)
+    if args.list:
+        for patch in patches:
+            print(f"{patch.name:<40} {patch.path:<45} {patch.description}")
+        return 0
+
+    started = time.perf_counter()
+    outcomes = run(patches, args.workers, args.dry_run, args.journal, not args.no_journal)
+    print_report(outcomes, time.perf_counter() - started, args.dry_run)
+    missed = any(status in ("unmatched", "partial") for o in outcomes for _, status, _, _ in o["results"])
+    return 1 if args.strict and missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,77 +1,301 @@
 #!/usr/bin/env python3
 """
 Deploy AI Team Frontend to Hugging Face Spaces
+
+Usage:
+    python3 deploy_to_hf.py                    # upload the whole folder
+    python3 deploy_to_hf.py --incremental      # upload only what changed since the last deploy
+    python3 deploy_to_hf.py --incremental --dry-run
+
+Incremental deploys keep the content hashes of the last successful deploy in
+a local manifest (.hf_deploy_manifest.json). Files are hashed in parallel
+(unchanged size and mtime reuse the stored hash), compared with the manifest,
+and only added, modified and deleted files go into a single commit. Nothing is
+uploaded when nothing changed. If the Space was pushed to from elsewhere since
+the manifest was written, every file is uploaded again.
+
+Set HF_ENDPOINT to point at another hub, e.g. the local stand-in in
+server/bench/fake_hf_hub.py.
 """
 
-from huggingface_hub import HfApi, create_repo, upload_folder
+from huggingface_hub import CommitOperationAdd, CommitOperationDelete, HfApi, upload_folder
+from huggingface_hub.utils import RepositoryNotFoundError
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
 
 # Configuration
 SPACE_NAME = "ai-team-frontend"
 USERNAME = "HuFelix135"
 REPO_ID = f"{USERNAME}/{SPACE_NAME}"
 TOKEN = os.getenv('HF_TOKEN', '')  # Set via environment variable
+MANIFEST_PATH = ".hf_deploy_manifest.json"
+COMMIT_MESSAGE = "🎨 Deploy new design with Claude.ai style"
 
-def main():
-    print("🚀 Starting deployment to Hugging Face Spaces...")
-    
-    # Initialize API
-    api = HfApi(token=TOKEN)
-    
-    # Step 1: Create Space (if not exists)
+# Files/folders to ignore
+IGNORE_PATTERNS = [
+    ".git/*",
+    ".github/*",
+    "node_modules/*",
+    "dist/*",
+    "*.log",
+    ".env*",
+    "__pycache__/*",
+    "*.pyc",
+    ".DS_Store",
+    "tmp/*",
+    "upload/*",
+    # Local state (same as .gitignore): cached prompts and completions, diagnoses,
+    # telemetry, queued memories and the codemod journal must not be published.
+    "server/.cache/*",
+    ".codemod_journal.json",
+    MANIFEST_PATH,
+]
+
+
+def is_ignored(path, patterns):
+    # Same fnmatch semantics as upload_folder's ignore_patterns.
+    return any(fnmatch(path, pattern) for pattern in patterns)
+
+
+def scan_files(root, patterns):
+    """
+    Relative POSIX paths of every file to deploy, pruning ignored directories.
+    """
+    dir_patterns = [p[:-2] for p in patterns if p.endswith("/*")]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir + "/"
+        dirnames[:] = [d for d in dirnames if not any(fnmatch(rel_dir + d, p) for p in dir_patterns)]
+        for name in filenames:
+            path = rel_dir + name
+            if not is_ignored(path, patterns):
+                files.append(path)
+    return sorted(files)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(root, paths, previous, workers, rehash=False):
+    """
+    {path: {sha256, size, mtime_ns}} for paths. Entries whose size and mtime
+    match the previous manifest keep their hash unless rehash is set.
+    Returns (entries, number of files actually hashed).
+    """
+    entries, to_hash = {}, []
+    for path in paths:
+        st = os.stat(os.path.join(root, path))
+        old = previous.get(path)
+        if not rehash and old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            entries[path] = old
+        else:
+            entries[path] = {"sha256": None, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            to_hash.append(path)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # hashlib releases the GIL on large buffers, so threads hash in parallel.
+        for path, digest in zip(to_hash, pool.map(lambda p: file_sha256(os.path.join(root, p)), to_hash)):
+            entries[path]["sha256"] = digest
+    return entries, len(to_hash)
+
+
+def diff_manifest(current, previous):
+    changed = sorted(p for p, e in current.items() if previous.get(p, {}).get("sha256") != e["sha256"])
+    deleted = sorted(p for p in previous if p not in current)
+    return changed, deleted
+
+
+def load_manifest(path, endpoint):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("repo_id") != REPO_ID or manifest.get("endpoint") != endpoint:
+        return None
+    return manifest
+
+
+def save_manifest(path, endpoint, commit, files):
+    # Write-then-rename so an interrupted deploy never leaves a partial manifest.
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"repo_id": REPO_ID, "endpoint": endpoint, "commit": commit, "deployed_at": time.time(),
+                   "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def remote_head(api):
+    try:
+        return api.space_info(REPO_ID).sha
+    except RepositoryNotFoundError:
+        return None
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def create_space(api):
     print(f"\n📦 Creating Space: {REPO_ID}")
     try:
-        create_repo(
+        api.create_repo(
             repo_id=REPO_ID,
             repo_type="space",
             space_sdk="docker",
             private=False,
-            token=TOKEN,
             exist_ok=True
         )
         print("✅ Space created/verified successfully")
     except Exception as e:
         print(f"⚠️  Space creation: {e}")
-    
-    # Step 2: Upload files
+
+
+def deploy_full(api):
+    create_space(api)
+
     print(f"\n📤 Uploading files to {REPO_ID}...")
-    
-    # Files/folders to ignore
-    ignore_patterns = [
-        ".git/*",
-        ".github/*",
-        "node_modules/*",
-        "dist/*",
-        "*.log",
-        ".env*",
-        "__pycache__/*",
-        "*.pyc",
-        ".DS_Store",
-        "tmp/*",
-        "upload/*",
-    ]
-    
     try:
         upload_folder(
             folder_path=".",
             repo_id=REPO_ID,
             repo_type="space",
             token=TOKEN,
-            ignore_patterns=ignore_patterns,
-            commit_message="🎨 Deploy new design with Claude.ai style"
+            ignore_patterns=IGNORE_PATTERNS,
+            commit_message=COMMIT_MESSAGE
         )
         print("✅ Files uploaded successfully")
     except Exception as e:
         print(f"❌ Upload failed: {e}")
         return False
-    
-    # Step 3: Show Space URL
+    return True
+
+
+def deploy_incremental(api, args):
+    timings = {}
+
+    def phase(name, started):
+        timings[name] = time.perf_counter() - started
+        return time.perf_counter()
+
+    t = time.perf_counter()
+    manifest = load_manifest(args.manifest, api.endpoint)
+    previous = manifest["files"] if manifest else {}
+    paths = scan_files(".", IGNORE_PATTERNS)
+    t = phase("scan", t)
+
+    current, hashed = hash_files(".", paths, previous, args.workers, args.rehash)
+    t = phase("hash", t)
+
+    try:
+        head = remote_head(api)
+    except Exception as e:
+        if not args.dry_run:
+            print(f"❌ Could not reach {api.endpoint}: {e}")
+            return False
+        print(f"⚠️  Remote check skipped: {e}")
+        head = manifest["commit"] if manifest else None
+    if manifest and head != manifest["commit"]:
+        print(f"⚠️  {REPO_ID} is at {head or 'nothing'}, not the last deployed commit "
+              f"{manifest['commit']}; uploading every file")
+        previous = {}
+    t = phase("remote", t)
+
+    changed, deleted = diff_manifest(current, previous)
+    upload_bytes = sum(current[p]["size"] for p in changed)
+    t = phase("diff", t)
+
+    print(f"\n🔍 {len(paths)} files scanned, {hashed} hashed: "
+          f"{len(changed)} to upload ({format_bytes(upload_bytes)}), {len(deleted)} to delete")
+
+    def report(sent_bytes):
+        print("⏱️  " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+              + f" | sent {format_bytes(sent_bytes)}")
+
+    if args.dry_run:
+        for path in changed:
+            print(f"  + {path} ({format_bytes(current[path]['size'])})")
+        for path in deleted:
+            print(f"  - {path}")
+        print("🧪 Dry run: nothing uploaded, manifest unchanged")
+        report(0)
+        return True
+
+    if not changed and not deleted:
+        print("✅ Nothing changed since the last deploy, skipping upload")
+        report(0)
+        return True
+
+    if head is None:
+        create_space(api)
+
+    print(f"\n📤 Uploading {len(changed)} files, deleting {len(deleted)} on {REPO_ID}...")
+    operations = [CommitOperationAdd(path_in_repo=p, path_or_fileobj=p) for p in changed]
+    operations += [CommitOperationDelete(path_in_repo=p) for p in deleted]
+    try:
+        info = api.create_commit(
+            repo_id=REPO_ID,
+            repo_type="space",
+            operations=operations,
+            commit_message=COMMIT_MESSAGE,
+            # Parallel LFS uploads; small text files travel inline in the commit.
+            num_threads=args.workers,
+        )
+    except Exception as e:
+        print(f"❌ Upload failed: {e}")
+        return False
+    t = phase("upload", t)
+
+    save_manifest(args.manifest, api.endpoint, info.oid, current)
+    phase("manifest", t)
+    print(f"✅ Committed {info.oid}")
+    report(upload_bytes)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Deploy to the {REPO_ID} Space")
+    parser.add_argument("--incremental", action="store_true",
+                        help="upload only files changed since the last successful deploy")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the incremental plan without committing or updating the manifest")
+    parser.add_argument("--workers", type=int, default=min(8, (os.cpu_count() or 1) + 4),
+                        help="threads for hashing and uploads")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="manifest of the last deploy")
+    parser.add_argument("--rehash", action="store_true",
+                        help="hash every file, even those whose size and mtime are unchanged")
+    args = parser.parse_args()
+
+    print("🚀 Starting deployment to Hugging Face Spaces...")
+
+    # Initialize API
+    api = HfApi(token=TOKEN)
+
+    ok = deploy_incremental(api, args) if args.incremental or args.dry_run else deploy_full(api)
+    if not ok or args.dry_run:
+        return ok
+
+    # Show Space URL
     space_url = f"https://huggingface.co/spaces/{REPO_ID}"
     print(f"\n🎉 Deployment complete!")
     print(f"🌐 Space URL: {space_url}")
     print(f"⏳ Please wait 2-3 minutes for the Space to build and start...")
-    
+
     return True
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main() else 1)
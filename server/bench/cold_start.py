@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Python engines under server/src.
+
+For each engine this runs a few short-lived invocations that return early
+(usage error, missing API key, plain import) and records:
+  - wall-clock time per run (median / min / max)
+  - a `python -X importtime` breakdown of the slowest imports
+
+Results are written as JSON (one file per run) and appended to a history
+file so per-engine startup time can be compared across commits.
+
+Usage:
+    python3 server/bench/cold_start.py [--runs N] [--top N] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+HISTORY_PATH = os.path.join(RESULTS_DIR, "cold_start_history.jsonl")
+
+# name -> argv run from server/src. Every scenario must return without network access.
+SCENARIOS = {
+    "llm_code_generator:no_key": ["llm_code_generator.py", "Developer", "echo hello", "ctx"],
+    "llm_error_diagnoser:usage": ["llm_error_diagnoser.py"],
+    "llm_error_diagnoser:no_key": ["llm_error_diagnoser.py", "bash: foo: command not found", "ctx"],
+    "llm_arbitrator:usage": ["llm_arbitrator.py"],
+    "llm_arbitrator:no_key": ["llm_arbitrator.py", "conflict", "ctx"],
+    "llm_repair:usage": ["llm_repair.py"],
+    "memory_engine:retrieve_no_key": ["memory_engine.py", "retrieve", "deploy"],
+    "llm_worker:import": ["-c", "import llm_worker"],
+}
+
+
+def scenario_env():
+    env = dict(os.environ)
+    for key in ("NVIDIA_API_KEY", "OPENAI_API_KEY"):
+        env.pop(key, None)
+    # Keep benchmark runs from touching the real caches and stores.
+    scratch = os.path.join(RESULTS_DIR, ".scratch")
+    env.update({
+        "LLM_DIAGNOSIS_STORE_PATH": os.path.join(scratch, "diagnoses.db"),
+        "LLM_CACHE_PATH": os.path.join(scratch, "llm_responses.db"),
+        "MEMORY_INDEX_DIR": os.path.join(scratch, "memory_index"),
+        "MEMORIZE_SPOOL_DIR": os.path.join(scratch, "memorize_spool"),
+        "LLM_TELEMETRY_PATH": os.path.join(scratch, "llm_telemetry.jsonl"),
+    })
+    return env
+
+
+def run_once(argv, env, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd + argv, cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    return time.perf_counter() - started, proc
+
+
+def parse_importtime(stderr, top):
+    """
+    Parse `-X importtime` lines ("import time: self [us] | cumulative | name")
+    into the top modules by cumulative and by self time.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        # Nested imports are indented two extra spaces per level in the name column.
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append({"module": name.strip(), "depth": depth,
+                     "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    top_level = [r for r in rows if r["depth"] == 0]
+    return {
+        "total_import_us": sum(r["cumulative_us"] for r in top_level),
+        "modules_imported": len(rows),
+        "top_cumulative": sorted(top_level, key=lambda r: -r["cumulative_us"])[:top],
+        "top_self": sorted(rows, key=lambda r: -r["self_us"])[:top],
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per scenario")
+    parser.add_argument("--top", type=int, default=10, help="modules to keep in each importtime ranking")
+    parser.add_argument("--output", help="result JSON path (default: results/cold_start-<commit>.json)")
+    parser.add_argument("--only", help="comma-separated scenario names to run")
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    env = scenario_env()
+    selected = args.only.split(",") if args.only else list(SCENARIOS)
+
+    # The interpreter alone, so engine numbers can be read as overhead on top of it.
+    baseline = [run_once(["-c", "pass"], env)[0] for _ in range(args.runs)]
+
+    results = {}
+    for name in selected:
+        argv = SCENARIOS[name]
+        timings = []
+        exit_code = None
+        for _ in range(args.runs):
+            elapsed, proc = run_once(argv, env)
+            timings.append(elapsed)
+            exit_code = proc.returncode
+        _, traced = run_once(argv, env, importtime=True)
+        results[name] = {
+            "median_ms": statistics.median(timings) * 1000,
+            "min_ms": min(timings) * 1000,
+            "max_ms": max(timings) * 1000,
+            "exit_code": exit_code,
+            "imports": parse_importtime(traced.stderr, args.top),
+        }
+        print(f"{name:40s} median {results[name]['median_ms']:8.1f} ms  "
+              f"imports {results[name]['imports']['total_import_us'] / 1000:8.1f} ms", file=sys.stderr)
+
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "interpreter_baseline_ms": statistics.median(baseline) * 1000,
+        "scenarios": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"cold_start-{commit or 'local'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(HISTORY_PATH, "a") as f:
+        summary = {name: round(r["median_ms"], 1) for name, r in results.items()}
+        f.write(json.dumps({"commit": commit, "timestamp": report["timestamp"], "median_ms": summary}) + "\n")
+    print(f"Wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Offline load benchmark for the Python engines.
+
+Starts fake_llm_server.py, points the engines at it through
+NVIDIA_API_BASE_URL and, for each engine, records:
+  - cold start: wall-clock time of one full CLI invocation (median of --cold-runs)
+  - per concurrency level: p50/p95/p99 latency, throughput, errors and peak RSS,
+    measured in a fresh child process so memory is per engine
+
+The executor.executeTask repair loop is driven the same way through
+execute_task_bench.ts when `npx tsx` is available (skipped otherwise).
+
+Results are written as JSON (one file per run) and appended to a history
+file so engine latency can be compared across commits.
+
+Usage:
+    python3 server/bench/engine_bench.py [--levels 1,4,16,64] [--requests 64]
+        [--latency-ms 300] [--latency-dist lognormal] [--tokens-per-sec 80] [--error-rate 0]
+        [--engines generate_code,diagnose_error,...] [--skip-execute-task] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from cold_start import RESULTS_DIR, SRC_DIR, current_commit, run_once, scenario_env
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, "..", ".."))
+HISTORY_PATH = os.path.join(RESULTS_DIR, "engine_bench_history.jsonl")
+
+# name -> (module, async function, kwargs for request i, CLI argv for the cold-start run)
+ENGINES = {
+    "generate_code": (
+        "llm_code_generator", "agenerate_code",
+        lambda i: {"role": "Developer", "goal": f"print a greeting {i}", "context": "benchmark run"},
+        ["llm_code_generator.py", "Developer", "print a greeting", "benchmark run"],
+    ),
+    "diagnose_error": (
+        "llm_error_diagnoser", "adiagnose_error",
+        lambda i: {"error_output": f"ls: cannot access '/tmp/bench-{i}': No such file or directory", "context": "benchmark run"},
+        ["llm_error_diagnoser.py", "ls: cannot access '/tmp/bench': No such file or directory", "benchmark run"],
+    ),
+    "arbitrate_conflict": (
+        "llm_arbitrator", "aarbitrate_conflict",
+        lambda i: {"conflict_description": f"SQLite or Postgres for service {i}", "context": "benchmark run"},
+        ["llm_arbitrator.py", "SQLite or Postgres", "benchmark run"],
+    ),
+    "repair": (
+        "llm_repair", "arepair",
+        lambda i: {"role": "Developer", "goal": f"list the bench directory {i}", "context": "benchmark run",
+                   "error_output": f"ls: cannot access '/tmp/bench-{i}': No such file or directory",
+                   "prev_command": f"ls /tmp/bench-{i}"},
+        ["llm_repair.py", "Developer", "list the bench directory", "benchmark run",
+         "ls: cannot access '/tmp/bench': No such file or directory", "ls /tmp/bench"],
+    ),
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    # Nearest-rank percentile.
+    ordered = sorted(values)
+    index = min(max(math.ceil(pct / 100 * len(ordered)) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+
+def latency_stats(latencies, wall, errors, max_rss_bytes):
+    ok = len(latencies) - errors
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+        "throughput_per_sec": ok / wall if wall else None,
+        "wall_s": wall,
+        "max_rss_mb": max_rss_bytes / (1024 * 1024) if max_rss_bytes else None,
+    }
+
+
+# -- child process: one engine at one concurrency level -------------------------
+
+def is_error(result) -> bool:
+    from candidate_checks import llm_error
+    if isinstance(result, dict):
+        return is_error(result.get("diagnosis", ""))
+    return isinstance(result, str) and llm_error(result)
+
+
+async def run_level(engine: str, concurrency: int, requests: int):
+    module, func_name, make_kwargs, _ = ENGINES[engine]
+    func = getattr(importlib.import_module(module), func_name)
+    await func(**make_kwargs(-1))  # warm the connection pool
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await func(**make_kwargs(i))
+                errors += is_error(result)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux.
+    return {"latencies": latencies, "errors": errors, "wall": wall,
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def child_main(engine, concurrency, requests):
+    sys.path.insert(0, SRC_DIR)
+    os.chdir(SRC_DIR)
+    print(json.dumps(asyncio.run(run_level(engine, concurrency, requests))))
+
+
+# -- parent ----------------------------------------------------------------------
+
+def start_fake_server(args):
+    cmd = [sys.executable, os.path.join(BENCH_DIR, "fake_llm_server.py"), "--port", "0",
+           "--latency-ms", str(args.latency_ms), "--latency-dist", args.latency_dist,
+           "--tokens-per-sec", str(args.tokens_per_sec), "--error-rate", str(args.error_rate),
+           "--error-status", str(args.error_status)]
+    if args.canned:
+        cmd += ["--canned", args.canned]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    port = json.loads(proc.stdout.readline())["port"]
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def server_stats(base):
+    from urllib.request import urlopen
+    with urlopen(f"{base}/stats") as response:
+        return json.loads(response.read())
+
+
+def bench_env(base):
+    env = scenario_env()
+    env.update({
+        "NVIDIA_API_BASE_URL": f"{base}/v1",
+        "NVIDIA_API_KEY": "bench",
+        "LLM_MODEL": "bench-model",
+        # Measure the engines, not the local caches in front of them.
+        "LLM_CACHE_ENGINES": "",
+        "LLM_DIAGNOSIS_CACHE": "0",
+        "LLM_CONTEXT_REPORT": "0",
+        "LLM_TELEMETRY_PATH": os.path.join(RESULTS_DIR, ".scratch", "llm_telemetry.jsonl"),
+    })
+    return env
+
+
+def run_child(engine, concurrency, requests, env):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", engine,
+         "--concurrency", str(concurrency), "--requests", str(requests)],
+        env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:] or ["child failed"]}
+    raw = json.loads(proc.stdout.strip().splitlines()[-1])
+    return latency_stats(raw["latencies"], raw["wall"], raw["errors"], raw["max_rss_bytes"])
+
+
+def run_execute_task(concurrency, requests, env):
+    cmd = ["npx", "--no-install", "tsx", os.path.join("server", "bench", "execute_task_bench.ts"),
+           str(concurrency), str(requests)]
+    try:
+        proc = subprocess.run(cmd, cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=1800)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return {"skipped": str(e)}
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("BENCH_RESULT ")]
+    if proc.returncode != 0 or not lines:
+        return {"skipped": (proc.stderr.strip().splitlines() or ["tsx unavailable"])[-1]}
+    raw = json.loads(lines[-1][len("BENCH_RESULT "):])
+    stats = latency_stats(raw["latencies"], raw["wall"], len(raw["latencies"]) - raw["succeeded"], raw["max_rss_bytes"])
+    stats["mean_attempts"] = statistics.mean(raw["attempts"]) if raw["attempts"] else None
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="requests per level (at least 2x the level)")
+    parser.add_argument("--cold-runs", type=int, default=3, help="CLI runs per engine for cold start")
+    parser.add_argument("--engines", help="comma-separated subset of: " + ",".join(ENGINES))
+    parser.add_argument("--skip-execute-task", action="store_true", help="do not drive the TS repair loop")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--canned", help="canned answers file passed to the fake server")
+    parser.add_argument("--output", help="result JSON path (default: results/engine_bench-<commit>.json)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--concurrency", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.concurrency, args.requests)
+        return
+
+    os.makedirs(os.path.join(RESULTS_DIR, ".scratch"), exist_ok=True)
+    levels = [int(l) for l in args.levels.split(",")]
+    engines = args.engines.split(",") if args.engines else list(ENGINES)
+
+    server, base = start_fake_server(args)
+    try:
+        env = bench_env(base)
+        results = {}
+        for engine in engines:
+            cold = [run_once(ENGINES[engine][3], env) for _ in range(args.cold_runs)]
+            results[engine] = {
+                "cold_start_ms": statistics.median(elapsed for elapsed, _ in cold) * 1000,
+                "cold_start_exit_code": cold[-1][1].returncode,
+                "levels": {},
+            }
+            for level in levels:
+                stats = run_child(engine, level, max(args.requests, level * 2), env)
+                results[engine]["levels"][str(level)] = stats
+                if "p50_ms" in stats:
+                    print(f"{engine:20s} c={level:<4d} p50 {stats['p50_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+                          f"{stats['throughput_per_sec']:7.1f} req/s  rss {stats['max_rss_mb']:6.1f} MB", file=sys.stderr)
+                else:
+                    print(f"{engine:20s} c={level:<4d} failed: {stats}", file=sys.stderr)
+
+        if not args.skip_execute_task:
+            results["execute_task"] = {"levels": {}}
+            for level in levels:
+                stats = run_execute_task(level, max(args.requests // 4, level * 2), env)
+                results["execute_task"]["levels"][str(level)] = stats
+                print(f"{'execute_task':20s} c={level:<4d} {json.dumps(stats)[:120]}", file=sys.stderr)
+                if "skipped" in stats:
+                    break
+
+        fake_stats = server_stats(base)
+    finally:
+        server.terminate()
+        server.wait()
+
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "fake_server": {
+            "latency_ms": args.latency_ms, "latency_dist": args.latency_dist,
+            "tokens_per_sec": args.tokens_per_sec, "error_rate": args.error_rate,
+            "stats": fake_stats,
+        },
+        "engines": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"engine_bench-{commit or 'local'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(HISTORY_PATH, "a") as f:
+        summary = {
+            engine: {level: round(s["p50_ms"], 1) for level, s in r["levels"].items() if s.get("p50_ms") is not None}
+            for engine, r in results.items()
+        }
+        f.write(json.dumps({"commit": commit, "timestamp": report["timestamp"], "p50_ms": summary}) + "\n")
+    print(f"Wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
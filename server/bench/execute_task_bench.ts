@@ -0,0 +1,56 @@
+/**
+ * Drives executor.executeTask (generate -> run -> diagnose/repair -> regenerate)
+ * against whatever NVIDIA_API_BASE_URL points at, normally fake_llm_server.py.
+ * Run by engine_bench.py:
+ *
+ *   npx tsx server/bench/execute_task_bench.ts <concurrency> <tasks>
+ *
+ * Half of the goals contain "bench-needs-repair", for which the fake server's
+ * first answer fails so the repair path is exercised. Application logs go to
+ * stdout as usual; the result is the line starting with BENCH_RESULT.
+ */
+import { executeTask } from '../src/executor';
+import { pythonWorkerPool } from '../src/python_worker_pool';
+
+async function main() {
+  const concurrency = parseInt(process.argv[2] || '1');
+  const tasks = parseInt(process.argv[3] || '8');
+
+  const latencies: number[] = [];
+  const attempts: number[] = [];
+  let succeeded = 0;
+  let next = 0;
+
+  const worker = async () => {
+    while (next < tasks) {
+      const i = next++;
+      const goal = i % 2 === 0 ? `print a greeting ${i}` : `list the bench directory ${i} bench-needs-repair`;
+      const started = process.hrtime.bigint();
+      const result = await executeTask({ role: 'Developer', goal, context: 'benchmark run' });
+      latencies.push(Number(process.hrtime.bigint() - started) / 1e9);
+      attempts.push(result.attempt || 0);
+      if (result.success) succeeded++;
+    }
+  };
+
+  // One untimed task so worker start-up is not counted against the first batch.
+  await executeTask({ role: 'Developer', goal: 'warm up', context: 'benchmark run' });
+
+  const started = process.hrtime.bigint();
+  await Promise.all(Array.from({ length: concurrency }, worker));
+  const wall = Number(process.hrtime.bigint() - started) / 1e9;
+
+  await pythonWorkerPool.shutdown();
+  console.log('BENCH_RESULT ' + JSON.stringify({
+    latencies,
+    attempts,
+    succeeded,
+    wall,
+    max_rss_bytes: process.resourceUsage().maxRSS * 1024,
+  }));
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
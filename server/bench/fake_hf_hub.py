@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the parts of the Hugging Face Hub API that deploy_to_hf.py
+uses, for testing deploys offline. Point the script at it with
+HF_ENDPOINT=http://127.0.0.1:<port> (any HF_TOKEN works).
+
+Serves POST /api/repos/create, POST /api/validate-yaml (accepts any README), GET /api/spaces/<repo>[/revision/<rev>],
+POST /api/spaces/<repo>/preupload/<rev> (every file is "regular", so contents
+travel inline in the commit) and POST /api/spaces/<repo>/commit/<rev>
+(ndjson header, file and deletedFile lines). Repos live in memory.
+
+GET /stats returns request counters, bytes received, and each repo's head,
+commit count and {path: sha256} of its files.
+
+Usage:
+    python3 server/bench/fake_hf_hub.py [--port 0] [--latency-ms 0]
+
+The first stdout line is {"port": <port>} once the server is listening.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_RE = re.compile(r"^/api/(models|datasets|spaces)/([^/]+/[^/]+)(?:/(revision|preupload|commit)/([^/]+))?$")
+
+
+class FakeHub:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.repos = {}
+        self.counters = {"requests": 0, "bytes_received": 0, "commits": 0, "files_added": 0, "files_deleted": 0}
+
+    def create(self, repo_id, repo_type):
+        with self.lock:
+            if repo_id in self.repos:
+                return False
+            self.repos[repo_id] = {"type": repo_type, "sha": None, "files": {}, "commits": 0}
+            return True
+
+    def commit(self, repo_id, lines):
+        with self.lock:
+            repo = self.repos[repo_id]
+            files = dict(repo["files"])
+            for line in lines:
+                value = line.get("value", {})
+                if line.get("key") == "file":
+                    content = base64.b64decode(value["content"]) if value.get("encoding") == "base64" else \
+                        value["content"].encode("utf-8")
+                    files[value["path"]] = hashlib.sha256(content).hexdigest()
+                    self.counters["files_added"] += 1
+                elif line.get("key") == "deletedFile":
+                    if value["path"] not in files:
+                        return None
+                    del files[value["path"]]
+                    self.counters["files_deleted"] += 1
+            repo["files"] = files
+            repo["commits"] += 1
+            repo["sha"] = hashlib.sha1(f"{repo_id}:{repo['commits']}:{time.time()}".encode()).hexdigest()
+            self.counters["commits"] += 1
+            return repo["sha"]
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "repos": {rid: {"sha": r["sha"], "commits": r["commits"], "files": dict(r["files"])}
+                                               for rid, r in self.repos.items()}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    hub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send_json(404, {"error": "Repository not found"}, {"X-Error-Code": "RepoNotFound"})
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        body = self.rfile.read(length) if length else b""
+        with self.hub.lock:
+            self.hub.counters["requests"] += 1
+            self.hub.counters["bytes_received"] += length
+        if self.hub.args.latency_ms:
+            time.sleep(self.hub.args.latency_ms / 1000)
+        return body
+
+    def do_GET(self):
+        self._body()
+        path = self.path.split("?", 1)[0]
+        if path == "/stats":
+            return self._send_json(200, self.hub.stats())
+        match = REPO_RE.match(path)
+        if not match or match.group(3) not in (None, "revision"):
+            return self._send_json(404, {"error": "not found"})
+        repo = self.hub.repos.get(match.group(2))
+        if repo is None:
+            return self._not_found()
+        self._send_json(200, {"id": match.group(2), "sha": repo["sha"], "sdk": "docker", "private": False,
+                              "siblings": [{"rfilename": p} for p in sorted(repo["files"])]})
+
+    def do_POST(self):
+        body = self._body()
+        path = self.path.split("?", 1)[0]
+        if path == "/api/repos/create":
+            payload = json.loads(body or b"{}")
+            repo_id = f"{payload['organization']}/{payload['name']}" if payload.get("organization") else payload["name"]
+            repo_type = payload.get("type") or "model"
+            if not self.hub.create(repo_id, repo_type):
+                return self._send_json(409, {"error": "You already created this repo"})
+            prefix = "" if repo_type == "model" else f"{repo_type}s/"
+            return self._send_json(200, {"url": f"http://{self.headers.get('Host')}/{prefix}{repo_id}"})
+        if path == "/api/validate-yaml":
+            return self._send_json(200, {"errors": [], "warnings": []})
+
+        match = REPO_RE.match(path)
+        if not match or match.group(3) not in ("preupload", "commit"):
+            return self._send_json(404, {"error": "not found"})
+        repo_id = match.group(2)
+        if repo_id not in self.hub.repos:
+            return self._not_found()
+        if match.group(3) == "preupload":
+            files = json.loads(body)["files"]
+            return self._send_json(200, {"files": [{"path": f["path"], "uploadMode": "regular", "shouldIgnore": False}
+                                                   for f in files]})
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        sha = self.hub.commit(repo_id, lines)
+        if sha is None:
+            return self._send_json(404, {"error": "A file with this name doesn't exist"},
+                                   {"X-Error-Code": "EntryNotFound"})
+        self._send_json(200, {"commitOid": sha, "commitUrl": f"http://{self.headers.get('Host')}/{match.group(1)}/"
+                                                             f"{repo_id}/commit/{sha}", "pullRequestUrl": None})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every request")
+    args = parser.parse_args()
+
+    Handler.hub = FakeHub(args)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(json.dumps({"port": server.server_address[1]}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OpenAI-compatible endpoint, for benchmarking the Python
+engines offline. Point the engines at it with
+NVIDIA_API_BASE_URL=http://127.0.0.1:<port>/v1 (any API key works).
+
+Serves POST /v1/chat/completions (plain and streaming, with usage and a
+simulated prompt-prefix cache), POST /v1/embeddings, GET /v1/models, and
+GET /stats with request counters.
+
+Answers are canned per engine, recognized from the system prompt: the
+diagnoser, arbitrator and repair prompts get valid JSON; the generator gets
+`echo bench-ok`, or a failing command when the goal contains
+"bench-needs-repair" on the first attempt. A --canned JSON file of
+[{"match": "<substring>", "content": "<answer>"}] is checked first.
+
+Usage:
+    python3 server/bench/fake_llm_server.py [--port 0] [--latency-ms 300] [--latency-dist lognormal]
+        [--tokens-per-sec 80] [--error-rate 0.05] [--error-status 429] [--canned answers.json]
+
+The first stdout line is {"port": <port>} once the server is listening.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIAGNOSIS_ANSWER = json.dumps({
+    "diagnosis": "The command referenced a path that does not exist.",
+    "isLogicError": False,
+    "suggestedFix": "Create the directory first or use an existing path.",
+})
+ARBITRATION_ANSWER = json.dumps({
+    "decision": "Adopt the lower-risk option.",
+    "reasoning": "It satisfies the requirements without widening the security surface.",
+    "impact": "No change to the public API.",
+    "constitutionalClause": "Article V: System Safety & Infrastructure Protection",
+})
+REPAIR_ANSWER = json.dumps({
+    "diagnosis": "The command referenced a path that does not exist.",
+    "isLogicError": False,
+    "suggestedFix": "Use a command that does not depend on the missing path.",
+    "command": "echo bench-repaired",
+})
+
+
+def builtin_answer(messages):
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    if "acting as both Tester and fixer" in system:
+        return REPAIR_ANSWER
+    if "You are the Tester" in system:
+        return DIAGNOSIS_ANSWER
+    if "Arbitration Expert" in system:
+        return ARBITRATION_ANSWER
+    if "bench-needs-repair" in user and "REPAIR MISSION" not in user:
+        return "ls /nonexistent-bench-path"
+    return "echo bench-ok"
+
+
+def count_tokens(text):
+    return max(math.ceil(len(text) / 4), 1) if text else 0
+
+
+class FakeLLM:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.random_lock = threading.Lock()
+        self.canned = []
+        if args.canned:
+            with open(args.canned) as f:
+                self.canned = json.load(f)
+        self.seen_prefixes = set()
+        self.stats = {"requests": 0, "streamed": 0, "errors_injected": 0, "embeddings": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        self.stats_lock = threading.Lock()
+
+    def bump(self, **counts):
+        with self.stats_lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def latency(self):
+        a = self.args
+        with self.random_lock:
+            if a.latency_dist == "fixed":
+                ms = a.latency_ms
+            elif a.latency_dist == "uniform":
+                ms = self.random.uniform(0, 2 * a.latency_ms)
+            else:
+                # Median latency_ms with a long right tail.
+                ms = a.latency_ms * math.exp(self.random.gauss(0, a.latency_sigma))
+        return ms / 1000
+
+    def inject_error(self):
+        with self.random_lock:
+            return self.random.random() < self.args.error_rate
+
+    def answer(self, messages):
+        text = "\n".join(m.get("content", "") or "" for m in messages)
+        for rule in self.canned:
+            if rule["match"] in text:
+                return rule["content"]
+        return builtin_answer(messages)
+
+    def usage(self, messages, content):
+        prompt_tokens = sum(count_tokens(m.get("content", "") or "") for m in messages)
+        # Providers cache identical prompt prefixes; the system message stands in for it.
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        digest = hashlib.sha1(system.encode("utf-8")).hexdigest()
+        with self.stats_lock:
+            cached = count_tokens(system) if digest in self.seen_prefixes else 0
+            self.seen_prefixes.add(digest)
+        completion_tokens = count_tokens(content)
+        self.bump(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeLLM/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.fake.args.verbose:
+            sys.stderr.write("fake_llm: " + format % args + "\n")
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        fake = self.server.fake
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "bench-model", "object": "model"}]})
+        elif self.path == "/stats":
+            with fake.stats_lock:
+                self.send_json(200, dict(fake.stats))
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        fake = self.server.fake
+        try:
+            request = self.read_json()
+        except ValueError:
+            self.send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        if self.path.endswith("/embeddings"):
+            self.embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            fake.bump(requests=1)
+            time.sleep(fake.latency())
+            if fake.inject_error():
+                fake.bump(errors_injected=1)
+                status = fake.args.error_status
+                headers = {"Retry-After": "1"} if status == 429 else None
+                self.send_json(status, {"error": {"message": "injected failure", "type": "server_error"}}, headers)
+                return
+            self.completion(request)
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def embeddings(self, request):
+        self.server.fake.bump(embeddings=1)
+        inputs = request.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        dim = int(request.get("dimensions") or 384)
+        data = []
+        for i, text in enumerate(inputs):
+            seed = int(hashlib.sha1(str(text).encode("utf-8")).hexdigest()[:8], 16)
+            rng = random.Random(seed)
+            vector = [rng.gauss(0, 1) for _ in range(dim)]
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            data.append({"object": "embedding", "index": i, "embedding": [v / norm for v in vector]})
+        self.send_json(200, {"object": "list", "data": data, "model": request.get("model"),
+                             "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+    def completion(self, request):
+        fake = self.server.fake
+        messages = request.get("messages", [])
+        content = fake.answer(messages)
+        usage = fake.usage(messages, content)
+        model = request.get("model", "bench-model")
+        created = int(time.time())
+        completion_id = f"chatcmpl-bench-{created}-{random.getrandbits(32):08x}"
+        per_token = 1 / fake.args.tokens_per_sec if fake.args.tokens_per_sec > 0 else 0
+
+        if not request.get("stream"):
+            time.sleep(per_token * usage["completion_tokens"])
+            self.send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        fake.bump(streamed=1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None, extra=None):
+            body = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            body.update(extra or {})
+            event(json.dumps(body))
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for i in range(0, len(content), 4):
+                time.sleep(per_token)
+                chunk({"content": content[i:i + 4]})
+            chunk({}, "stop")
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event(json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                  "model": model, "choices": [], "usage": usage}))
+            event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients stop reading once their JSON object is complete.
+            self.close_connection = True
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Pooled clients drop idle keep-alive connections; that is not an error here.
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(args):
+    server = FakeLLMServer((args.host, args.port), Handler)
+    server.fake = FakeLLM(args)
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--latency-ms", type=float, default=300, help="median time before the first byte")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal spread")
+    parser.add_argument("--tokens-per-sec", type=float, default=80, help="generation speed; 0 = instant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="status for injected failures (429 adds Retry-After)")
+    parser.add_argument("--canned", help="JSON file of [{\"match\", \"content\"}] answers")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main():
+    server = make_server(parse_args())
+    print(json.dumps({"port": server.server_address[1]}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
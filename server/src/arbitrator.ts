@@ -1,4 +1,4 @@
-import { spawn } from 'child_process';
+import { pythonWorkerPool } from './python_worker_pool';
 
 export interface ArbitrationDecision {
   decision: string; // 仲裁专家的最终决策
@@ -10,52 +10,16 @@ export interface ArbitrationDecision {
 export async function arbitrateConflict(conflictDescription: string, context: string, timeoutMs: number = 300000): Promise<ArbitrationDecision> {
   console.log(`[ArbitratorEngine] Requesting arbitration for conflict: ${conflictDescription}`);
 
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python3', [
-      './src/llm_arbitrator.py',
-      conflictDescription,
+  try {
+    const output = await pythonWorkerPool.call<string>('arbitrate_conflict', {
+      conflict_description: conflictDescription,
       context,
-    ], {
-      cwd: '/home/ubuntu/ai-team-frontend/server',
-    });
-
-    const timeout = setTimeout(() => {
-      pythonProcess.kill();
-      reject(new Error(`Arbitration timed out after ${timeoutMs}ms`));
     }, timeoutMs);
-
-    let output = '';
-    let errorOutputFromPython = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutputFromPython += data.toString();
-    });
-
-    pythonProcess.on('close', (code) => {
-      clearTimeout(timeout);
-      if (code !== 0) {
-        console.error(`[ArbitratorEngine] Python script exited with code ${code}: ${errorOutputFromPython}`);
-        reject(new Error(`Failed to arbitrate conflict: ${errorOutputFromPython}`));
-      } else {
-        try {
-          const decision = JSON.parse(output.trim()) as ArbitrationDecision;
-          console.log(`[ArbitratorEngine] Decision received: ${JSON.stringify(decision, null, 2)}`);
-          resolve(decision);
-        } catch (parseError: any) {
-          console.error(`[ArbitratorEngine] Failed to parse JSON from Python script: ${parseError.message}, Raw output: ${output}`);
-          reject(new Error(`Failed to parse arbitration decision: ${parseError.message}`));
-        }
-      }
-    });
-
-    pythonProcess.on('error', (err) => {
-      clearTimeout(timeout);
-      console.error(`[ArbitratorEngine] Failed to start Python subprocess: ${err.message}`);
-      reject(err);
-    });
-  });
+    const decision = JSON.parse(output.trim()) as ArbitrationDecision;
+    console.log(`[ArbitratorEngine] Decision received: ${JSON.stringify(decision, null, 2)}`);
+    return decision;
+  } catch (error: any) {
+    console.error(`[ArbitratorEngine] Failed to arbitrate conflict: ${error.message}`);
+    throw new Error(`Failed to arbitrate conflict: ${error.message}`);
+  }
 }
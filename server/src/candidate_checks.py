@@ -0,0 +1,113 @@
+import json
+import re
+import profiling
+
+# Cheap local checks for generated commands/workflows, run before the executor
+# spends a process spawn (and a diagnosis round-trip) on a candidate.
+# RED_LINES and the role/budget checks mirror validateAgainstConstitution in
+# governance_hook.ts; keep the two in sync.
+
+RED_LINES = [
+    (re.compile(r"rm\s+-rf\s+/"), "Attempted to delete root directory."),
+    (re.compile(r"rm\s+-rf\s+\./logs"), "Attempted to delete audit logs."),
+    (re.compile(r"curl|wget|nc|socat"), "Unauthorized external network utility detected."),
+    (re.compile(r"chmod\s+777"), "Attempted to set insecure file permissions."),
+    (re.compile(r"env|printenv|cat\s+\.env"), "Attempted to access sensitive environment variables."),
+]
+
+
+def red_line_violations(text: str):
+    return [reason for pattern, reason in RED_LINES if pattern.search(text)]
+
+
+def _argument_strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _argument_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _argument_strings(item)
+
+
+def check_workflow(candidate: str, tools_list):
+    """
+    Return (normalized, issues) for a workflow candidate. normalized is the JSON
+    re-serialized the way executor.ts recognizes workflows ('"type": "workflow"').
+    """
+    try:
+        data = json.loads(candidate)
+    except ValueError as e:
+        return candidate, [f"workflow JSON does not parse: {e}"]
+    if not isinstance(data, dict) or data.get("type") != "workflow":
+        return candidate, ["JSON output is not a workflow"]
+
+    steps = (data.get("plan") or {}).get("steps")
+    if not isinstance(steps, list) or not steps:
+        return json.dumps(data, ensure_ascii=False), ["workflow has no steps"]
+
+    known = {(t.get("server"), t.get("name")) for t in tools_list}
+    issues = []
+    for step in steps:
+        if not isinstance(step, dict):
+            issues.append("workflow step is not an object")
+            continue
+        if (step.get("server"), step.get("tool")) not in known:
+            issues.append(f"unknown tool {step.get('server')}:{step.get('tool')}")
+        for text in _argument_strings(step.get("arguments", {})):
+            issues.extend(red_line_violations(text))
+    return json.dumps(data, ensure_ascii=False), issues
+
+
+def check_command(candidate: str, role: str = "", context: str = ""):
+    issues = red_line_violations(candidate)
+    if "config" in candidate and role != "architect":
+        issues.append(f"Role '{role}' is not authorized to modify system configuration files.")
+    if "deploy" in candidate and "budget_exceeded" in context:
+        issues.append("Global project budget exceeded.")
+    return issues
+
+
+def llm_error(candidate: str) -> bool:
+    # call_llm reports failures as {"error": ..., "success": false}.
+    try:
+        data = json.loads(candidate)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("success") is False and "error" in data
+
+
+def check_candidate(candidate: str, tools_list, role: str = "", context: str = "") -> dict:
+    """
+    Run the local checks on one generated output.
+    Returns {"code", "ok", "issues"}; "code" is what the executor should run.
+    """
+    code = candidate.strip()
+    if not code:
+        return {"code": code, "ok": False, "issues": ["empty output"]}
+    if code.startswith("{"):
+        if llm_error(code):
+            return {"code": code, "ok": False, "issues": ["LLM call failed"]}
+        code, issues = check_workflow(code, tools_list)
+    else:
+        issues = check_command(code, role, context)
+    return {"code": code, "ok": not issues, "issues": issues}
+
+
+@profiling.span("rank")
+def rank_candidates(candidates, tools_list, role: str = "", context: str = ""):
+    """
+    Check, dedupe and order candidates: passing ones first, otherwise keeping
+    the generation order (lowest temperature first). Each result carries the
+    "index" of the candidate it came from.
+    """
+    seen = set()
+    checked = []
+    for index, candidate in enumerate(candidates):
+        result = check_candidate(candidate, tools_list, role, context)
+        if result["code"] in seen:
+            continue
+        seen.add(result["code"])
+        checked.append({**result, "index": index})
+    return sorted(checked, key=lambda r: not r["ok"])
@@ -0,0 +1,171 @@
+import math
+import os
+import re
+import sys
+import json
+
+# Token-budgeted prompt assembly for llm_code_generator.
+# Tokens are estimated locally; the budget is spread over sections in priority
+# order (goal > repair info > memories > context) and oversized sections are
+# trimmed keeping their head and tail.
+
+# Prompt-token budgets per model; LLM_PROMPT_BUDGET overrides for every model.
+MODEL_PROMPT_BUDGETS = {
+    "z-ai/glm-4": 6000,
+    "z-ai/glm-4-9b-chat": 6000,
+    "minimaxai/minimax-m2.1": 12000,
+}
+DEFAULT_PROMPT_BUDGET = 4000
+
+# Minimum share each section is guaranteed before higher priorities top up.
+SECTION_FLOORS = {
+    "goal": 400,
+    "prev_error": 300,
+    "suggested_fix": 300,
+    "memories": 300,
+    "context": 400,
+}
+MAX_MEMORY_TOKENS = 200
+
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_WS_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local estimate: roughly one token per CJK character and per four other characters.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def prompt_budget(model: str) -> int:
+    override = os.environ.get("LLM_PROMPT_BUDGET")
+    if override:
+        return int(override)
+    return MODEL_PROMPT_BUDGETS.get(model, DEFAULT_PROMPT_BUDGET)
+
+
+def trim_head_tail(text: str, max_tokens: int) -> str:
+    """
+    Keep the start and end of text within max_tokens, marking what was cut.
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    chars_per_token = len(text) / tokens
+    marker = f"\n...[trimmed ~{tokens - max_tokens} tokens]...\n"
+    keep = max(int((max_tokens - estimate_tokens(marker)) * chars_per_token), 0)
+    head = keep * 3 // 5
+    tail = keep - head
+    return text[:head] + marker + (text[-tail:] if tail else "")
+
+
+def _memory_text(memory) -> str:
+    if isinstance(memory, str):
+        return memory
+    return memory.get("content", "") or memory.get("summary", "")
+
+
+def _shingles(text: str):
+    words = _WS_RE.sub(" ", text.lower()).split(" ")
+    return {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+
+
+def rank_memories(memories, near_duplicate: float = 0.85):
+    """
+    Order memories by retrieval score and drop exact or near duplicates
+    (Jaccard similarity of word trigrams at or above `near_duplicate`).
+    """
+    ranked = sorted(
+        (m for m in memories if _memory_text(m).strip()),
+        key=lambda m: -(m.get("score", 0.0) if isinstance(m, dict) else 0.0),
+    )
+    kept, kept_shingles = [], []
+    for memory in ranked:
+        shingles = _shingles(_memory_text(memory))
+        duplicate = any(
+            len(shingles & other) / max(len(shingles | other), 1) >= near_duplicate
+            for other in kept_shingles
+        )
+        if not duplicate:
+            kept.append(memory)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _allocate(needs, order, budget):
+    """
+    Two passes over sections in priority order: first everyone gets up to its
+    floor, then remaining budget tops sections up to what they need.
+    """
+    allocation = {name: 0 for name in order}
+    remaining = budget
+    for name in order:
+        grant = min(needs[name], SECTION_FLOORS.get(name, 0), remaining)
+        allocation[name] = grant
+        remaining -= grant
+    for name in order:
+        grant = min(needs[name] - allocation[name], remaining)
+        allocation[name] += grant
+        remaining -= grant
+    return allocation
+
+
+def assemble_context(goal: str, context: str, memories, prev_error: str = "", suggested_fix: str = "",
+                     model: str = "", fixed_tokens: int = 0):
+    """
+    Fit the variable parts of the generator prompt into the model's budget.
+
+    fixed_tokens is what the caller's static prompt (instructions, tool list)
+    already uses. Returns (sections, report): sections holds the trimmed
+    "goal", "prev_error", "suggested_fix", "context" strings and the kept
+    "memories" list; report gives per-section token usage.
+    """
+    budget = max(prompt_budget(model) - fixed_tokens, 0)
+    memory_list = rank_memories(memories or [])
+    memory_texts = [trim_head_tail(_memory_text(m), MAX_MEMORY_TOKENS) for m in memory_list]
+
+    texts = {"goal": goal or "", "prev_error": prev_error or "", "suggested_fix": suggested_fix or "", "context": context or ""}
+    needs = {name: estimate_tokens(text) for name, text in texts.items()}
+    needs["memories"] = sum(estimate_tokens(t) + 2 for t in memory_texts)
+
+    order = ["goal", "prev_error", "suggested_fix", "memories", "context"]
+    allocation = _allocate(needs, order, budget)
+
+    sections = {name: trim_head_tail(texts[name], allocation[name]) for name in texts}
+
+    # Memories are kept whole, best first, until their allocation runs out.
+    kept_memories, used = [], 0
+    for text in memory_texts:
+        cost = estimate_tokens(text) + 2
+        if used + cost > allocation["memories"]:
+            break
+        kept_memories.append(text)
+        used += cost
+    sections["memories"] = kept_memories
+
+    report = {
+        "model": model,
+        "budget": prompt_budget(model),
+        "fixed": fixed_tokens,
+        "sections": {
+            name: {
+                "needed": needs[name],
+                "used": used if name == "memories" else estimate_tokens(sections[name]),
+            }
+            for name in order
+        },
+        "memories": {"received": len(memories or []), "unique": len(memory_list), "kept": len(kept_memories)},
+    }
+    report["total"] = fixed_tokens + sum(s["used"] for s in report["sections"].values())
+    return sections, report
+
+
+def log_report(report):
+    if os.environ.get("LLM_CONTEXT_REPORT", "1") != "0":
+        print(f"context_assembler: {json.dumps(report, ensure_ascii=False)}", file=sys.stderr)
@@ -1,3 +1,5 @@
+import * as fs from 'fs';
+import * as path from 'path';
 import { createLogger } from './logger';
 
 const logger = createLogger('CostTracker');
@@ -27,6 +29,15 @@ export interface ProviderCostSummary {
   trend: number; // 相比上期的变化百分比
 }
 
+/**
+ * 按模型或任务累计的成本
+ */
+export interface CostTotals {
+  calls: number;
+  tokens: number;
+  cost: number;
+}
+
 /**
  * 类别成本汇总
  */
@@ -36,12 +47,59 @@ export interface CategoryCostSummary {
   color: string;
 }
 
+/**
+ * llm_telemetry.py 写入的单次 LLM 调用记录 (JSONL)
+ */
+interface LlmTelemetryRecord {
+  ts: number;
+  engine: string;
+  model: string;
+  outcome: string;
+  prompt_tokens: number;
+  completion_tokens: number;
+  cached_tokens: number;
+  latency: number;
+  task_id?: string;
+}
+
+const LLM_TELEMETRY_PATH = process.env.LLM_TELEMETRY_PATH
+  || path.join(path.resolve(__dirname, '..'), '.cache', 'llm_telemetry.jsonl');
+
+// 每次最多读取 1 MiB，避免为积压的遥测数据一次性分配整块 Buffer
+const TELEMETRY_READ_CHUNK = 1024 * 1024;
+
+// 只保留最近的成本明细；汇总数据按天/供应商/类别/模型/任务累计，不受此上限影响
+const COST_HISTORY_MAX_ENTRIES = parseInt(process.env.COST_HISTORY_MAX_ENTRIES || '10000');
+const COST_TASK_TOTALS_MAX = parseInt(process.env.COST_TASK_TOTALS_MAX || '10000');
+const DAILY_COST_RETENTION_DAYS = 366;
+
+// 每 1K tokens 的价格 (美元)，可用 LLM_PRICE_PER_1K_PROMPT / LLM_PRICE_PER_1K_COMPLETION 覆盖
+const MODEL_PRICES_PER_1K: Record<string, { prompt: number; completion: number }> = {
+  'z-ai/glm-4': { prompt: 0.0014, completion: 0.0014 },
+  'z-ai/glm-4-9b-chat': { prompt: 0.0002, completion: 0.0002 },
+  'minimaxai/minimax-m2.1': { prompt: 0.0003, completion: 0.0012 },
+};
+
+// Python 引擎 -> 成本类别
+const ENGINE_CATEGORIES: Record<string, string> = {
+  generator: '代码实现',
+  repair: '代码实现',
+  diagnoser: '系统审计',
+  arbitrator: '元认知协商',
+};
+
 /**
  * 成本追踪器
  * 实现法典 Article III 的经济保障要求
  */
 export class CostTracker {
+  // 按时间顺序追加，超出上限时丢弃最旧的明细
   private costHistory: CostEntry[] = [];
+  private dailyCosts = new Map<string, number>();
+  private providerCosts = new Map<string, number>();
+  private categoryCosts = new Map<string, number>();
+  private modelTotals = new Map<string, CostTotals>();
+  private taskTotals = new Map<string, CostTotals>();
   private monthlyBudget: number = 20000;
 
   // 供应商配置
@@ -63,11 +121,129 @@ export class CostTracker {
     { name: '系统审计', color: '#10b981' }
   ];
 
+  private telemetryOffset = 0;
+  private telemetryInode = 0;
+  private telemetrySync: Promise<void> | null = null;
+
   constructor() {
-    this.initializeSampleData();
+    // 有真实遥测数据时不再生成示例数据；遥测在后台异步读取，不阻塞启动
+    if (fs.existsSync(LLM_TELEMETRY_PATH)) {
+      void this.syncLlmTelemetry();
+    } else {
+      this.initializeSampleData();
+    }
+    setInterval(() => void this.syncLlmTelemetry(), 10000).unref();
     logger.info('CostTracker initialized');
   }
 
+  /**
+   * 增量读取 llm_telemetry.jsonl 中新增的调用记录并计入成本 (同一时间只运行一次)
+   */
+  public syncLlmTelemetry(): Promise<void> {
+    if (!this.telemetrySync) {
+      this.telemetrySync = this.readNewTelemetry()
+        .catch((error: any) => logger.warn('LLM telemetry sync failed', { error: error.message }))
+        .finally(() => { this.telemetrySync = null; });
+    }
+    return this.telemetrySync;
+  }
+
+  private async readNewTelemetry(): Promise<void> {
+    let file: fs.promises.FileHandle;
+    try {
+      file = await fs.promises.open(LLM_TELEMETRY_PATH, 'r');
+    } catch {
+      return;
+    }
+    try {
+      const { ino, size } = await file.stat();
+      let ingested = 0;
+      if (this.telemetryInode && ino !== this.telemetryInode) {
+        // 文件被轮转: 先读完上一代 (.1) 的剩余部分，再从头读新文件
+        ingested += await this.readRotatedTelemetry();
+        this.telemetryOffset = 0;
+      } else if (size < this.telemetryOffset) {
+        this.telemetryOffset = 0; // 文件被截断
+      }
+      this.telemetryInode = ino;
+      ingested += await this.readTelemetry(file);
+      if (ingested > 0) logger.debug('LLM telemetry ingested', { records: ingested });
+    } finally {
+      await file.close();
+    }
+  }
+
+  private async readRotatedTelemetry(): Promise<number> {
+    let file: fs.promises.FileHandle;
+    try {
+      file = await fs.promises.open(`${LLM_TELEMETRY_PATH}.1`, 'r');
+    } catch {
+      return 0;
+    }
+    try {
+      return (await file.stat()).ino === this.telemetryInode ? await this.readTelemetry(file) : 0;
+    } finally {
+      await file.close();
+    }
+  }
+
+  /**
+   * 从 telemetryOffset 起按块读取到文件末尾，只处理完整的行
+   */
+  private async readTelemetry(file: fs.promises.FileHandle): Promise<number> {
+    const chunk = Buffer.alloc(TELEMETRY_READ_CHUNK);
+    let partial = Buffer.alloc(0);
+    let ingested = 0;
+    for (;;) {
+      const { bytesRead } = await file.read(chunk, 0, chunk.length, this.telemetryOffset + partial.length);
+      if (bytesRead === 0) break;
+      const data = Buffer.concat([partial, chunk.subarray(0, bytesRead)]);
+      const complete = data.lastIndexOf(0x0a) + 1;
+      for (const line of data.subarray(0, complete).toString('utf-8').split('\n')) {
+        if (line) ingested += this.ingestTelemetryLine(line);
+      }
+      this.telemetryOffset += complete;
+      partial = data.subarray(complete);
+    }
+    return ingested;
+  }
+
+  private ingestTelemetryLine(line: string): number {
+    try {
+      const record = JSON.parse(line) as LlmTelemetryRecord;
+      if (record.outcome === 'cache_hit' || record.outcome === 'coalesced' || record.outcome === 'no_key') return 0;
+      this.trackLlmCall(record);
+      return 1;
+    } catch {
+      return 0; // 跳过损坏的行
+    }
+  }
+
+  private trackLlmCall(record: LlmTelemetryRecord): void {
+    const prices = MODEL_PRICES_PER_1K[record.model] || { prompt: 0.001, completion: 0.002 };
+    const promptPrice = parseFloat(process.env.LLM_PRICE_PER_1K_PROMPT || '') || prices.prompt;
+    const completionPrice = parseFloat(process.env.LLM_PRICE_PER_1K_COMPLETION || '') || prices.completion;
+    const tokens = record.prompt_tokens + record.completion_tokens;
+
+    this.record({
+      id: `COST-LLM-${record.ts}-${Math.random().toString(36).substr(2, 9)}`,
+      timestamp: new Date(record.ts * 1000),
+      provider: this.providerForModel(record.model),
+      model: record.model,
+      category: ENGINE_CATEGORIES[record.engine] || record.engine,
+      tokens,
+      cost: (record.prompt_tokens * promptPrice + record.completion_tokens * completionPrice) / 1000,
+      taskId: record.task_id,
+    });
+  }
+
+  private providerForModel(model: string): string {
+    if (model.startsWith('z-ai/')) return 'Zhipu AI (GLM)';
+    if (model.startsWith('minimaxai/')) return 'MiniMax';
+    if (model.startsWith('gpt-')) return 'OpenAI (GPT-4o)';
+    return model.split('/')[0];
+  }
+
   /**
    * 记录成本
    */
@@ -92,12 +268,51 @@ export class CostTracker {
       negotiationId
     };
 
-    this.costHistory.unshift(entry);
+    this.record(entry);
     logger.info('Cost tracked', { provider, cost, category });
 
     return entry;
   }
 
+  /**
+   * 计入一条成本: 更新各项汇总，明细只保留最近 COST_HISTORY_MAX_ENTRIES 条
+   */
+  private record(entry: CostEntry): void {
+    const day = entry.timestamp.toISOString().split('T')[0];
+    this.dailyCosts.set(day, (this.dailyCosts.get(day) || 0) + entry.cost);
+    this.providerCosts.set(entry.provider, (this.providerCosts.get(entry.provider) || 0) + entry.cost);
+    this.categoryCosts.set(entry.category, (this.categoryCosts.get(entry.category) || 0) + entry.cost);
+    this.addTotals(this.modelTotals, entry.model, entry);
+    if (entry.taskId) {
+      // 重新插入以保持 Map 按最近使用排序，超出上限时淘汰最久未更新的任务
+      const totals = this.taskTotals.get(entry.taskId);
+      this.taskTotals.delete(entry.taskId);
+      if (totals) this.taskTotals.set(entry.taskId, totals);
+      this.addTotals(this.taskTotals, entry.taskId, entry);
+      if (this.taskTotals.size > COST_TASK_TOTALS_MAX) {
+        this.taskTotals.delete(this.taskTotals.keys().next().value as string);
+      }
+    }
+
+    this.costHistory.push(entry);
+    // 攒够 1/4 再批量裁剪，避免每条记录都搬移整个数组
+    if (this.costHistory.length > COST_HISTORY_MAX_ENTRIES * 1.25) {
+      this.costHistory.splice(0, this.costHistory.length - COST_HISTORY_MAX_ENTRIES);
+    }
+    if (this.dailyCosts.size > DAILY_COST_RETENTION_DAYS) {
+      const cutoff = new Date(Date.now() - DAILY_COST_RETENTION_DAYS * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
+      this.dailyCosts.forEach((_, date) => { if (date < cutoff) this.dailyCosts.delete(date); });
+    }
+  }
+
+  private addTotals(totals: Map<string, CostTotals>, key: string, entry: CostEntry): void {
+    const current = totals.get(key) || { calls: 0, tokens: 0, cost: 0 };
+    current.calls++;
+    current.tokens += entry.tokens;
+    current.cost += entry.cost;
+    totals.set(key, current);
+  }
+
   /**
    * 获取成本摘要
    */
@@ -128,10 +343,7 @@ export class CostTracker {
    * 获取总成本
    */
   private getTotalCost(): number {
-    const thirtyDaysAgo = new Date(Date.now() - 30 * 24 * 60 * 60 * 1000);
-    return this.costHistory
-      .filter(entry => entry.timestamp >= thirtyDaysAgo)
-      .reduce((sum, entry) => sum + entry.cost, 0);
+    return this.getCostHistory(30).reduce((sum, day) => sum + day.cost, 0);
   }
 
   /**
@@ -143,12 +355,7 @@ export class CostTracker {
 
     // 初始化所有供应商
     this.providers.forEach(p => providerCosts.set(p.name, 0));
-
-    // 汇总成本
-    this.costHistory.forEach(entry => {
-      const current = providerCosts.get(entry.provider) || 0;
-      providerCosts.set(entry.provider, current + entry.cost);
-    });
+    this.providerCosts.forEach((cost, provider) => providerCosts.set(provider, cost));
 
     // 转换为数组并计算百分比
     return Array.from(providerCosts.entries()).map(([provider, cost]) => ({
@@ -163,25 +370,34 @@ export class CostTracker {
    * 按类别获取成本
    */
   public getCostByCategory(): CategoryCostSummary[] {
-    const categoryCosts = new Map<string, number>();
-
-    // 初始化所有类别
-    this.categories.forEach(c => categoryCosts.set(c.name, 0));
-
-    // 汇总成本
-    this.costHistory.forEach(entry => {
-      const current = categoryCosts.get(entry.category) || 0;
-      categoryCosts.set(entry.category, current + entry.cost);
-    });
-
-    // 转换为数组
     return this.categories.map(category => ({
       name: category.name,
-      value: categoryCosts.get(category.name) || 0,
+      value: this.categoryCosts.get(category.name) || 0,
       color: category.color
     }));
   }
 
+  /**
+   * 按模型获取累计成本
+   */
+  public getCostByModel(): ({ model: string } & CostTotals)[] {
+    return Array.from(this.modelTotals.entries()).map(([model, totals]) => ({ model, ...totals }));
+  }
+
+  /**
+   * 获取最近的成本明细 (最新的在前)
+   */
+  public getRecentCosts(limit: number = 100): CostEntry[] {
+    return this.costHistory.slice(-limit).reverse();
+  }
+
+  /**
+   * 获取单个任务的累计成本 (LLM 遥测带有 task_id 时)
+   */
+  public getTaskCost(taskId: string): CostTotals | undefined {
+    return this.taskTotals.get(taskId);
+  }
+
   /**
    * 获取成本历史趋势
    */
@@ -193,11 +409,7 @@ export class CostTracker {
       const date = new Date(now.getTime() - i * 24 * 60 * 60 * 1000);
       const dateStr = date.toISOString().split('T')[0];
       
-      const dayCost = this.costHistory
-        .filter(entry => entry.timestamp.toISOString().split('T')[0] === dateStr)
-        .reduce((sum, entry) => sum + entry.cost, 0);
-
-      result.push({ date: dateStr, cost: dayCost });
+      result.push({ date: dateStr, cost: this.dailyCosts.get(dateStr) || 0 });
     }
 
     return result;
@@ -284,12 +496,12 @@ export class CostTracker {
           cost: Math.random() * 50 + 10
         };
 
-        this.costHistory.push(entry);
+        this.record(entry);
       }
     }
 
     // 按时间排序
-    this.costHistory.sort((a, b) => b.timestamp.getTime() - a.timestamp.getTime());
+    this.costHistory.sort((a, b) => a.timestamp.getTime() - b.timestamp.getTime());
 
     logger.info('Sample cost data initialized', { entries: this.costHistory.length });
   }
@@ -0,0 +1,195 @@
+import profiling
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+# Local store of diagnoses keyed by a normalized error fingerprint, so repeated
+# failures (same missing binary, same permission error, ...) are answered
+# without an LLM round-trip.
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "diagnoses.db")
+
+MAX_FINGERPRINT_LINES = 40
+
+_NORMALIZERS = [
+    (re.compile(r"\x1b\[[0-9;]*[A-Za-z]"), ""),  # ANSI colour codes
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:\.\d+)?\b"), "<ts>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<id>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.I), "<hex>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{8,}\b", re.I), "<hex>"),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.@+-]+)+[\\/]?"), "<path>"),
+    (re.compile(r"\b(?:tmp|temp)[\w.-]*", re.I), "<tmp>"),
+    (re.compile(r"\b[\w-]+\.(?:py|ts|js|tsx|json|sh|log|txt)\b"), "<file>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+    (re.compile(r"[ \t]+"), " "),
+]
+
+
+def normalize_error(error_output: str) -> str:
+    lines = []
+    for raw in error_output.splitlines():
+        line = raw
+        for pattern, replacement in _NORMALIZERS:
+            line = pattern.sub(replacement, line)
+        line = line.strip()
+        if line and (not lines or lines[-1] != line):
+            lines.append(line)
+        if len(lines) >= MAX_FINGERPRINT_LINES:
+            break
+    return "\n".join(lines)
+
+
+def fingerprint_error(error_output: str):
+    """
+    Return (fingerprint, normalized_text) for an error output.
+    """
+    normalized = normalize_error(error_output or "")
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16], normalized
+
+
+def is_valid_diagnosis(data) -> bool:
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("diagnosis"), str)
+        and isinstance(data.get("suggestedFix"), str)
+        and "isLogicError" in data
+        and data.get("success") is not False
+    )
+
+
+class DiagnosisStore:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("LLM_DIAGNOSIS_STORE_PATH", DEFAULT_STORE_PATH)
+        self.initial_confidence = float(os.environ.get("LLM_DIAGNOSIS_INITIAL_CONFIDENCE", "0.7"))
+        self.min_confidence = float(os.environ.get("LLM_DIAGNOSIS_MIN_CONFIDENCE", "0.4"))
+        # Confidence halves every half-life of age, so stale entries expire on their own.
+        self.half_life = float(os.environ.get("LLM_DIAGNOSIS_HALF_LIFE", str(7 * 86400)))
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "confirmations": 0, "invalidations": 0}
+        self.lock = threading.Lock()
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS diagnoses (
+                    fingerprint TEXT PRIMARY KEY,
+                    normalized TEXT,
+                    diagnosis TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._db.commit()
+        return self._db
+
+    def effective_confidence(self, confidence, updated_at, now=None):
+        age = (now or time.time()) - updated_at
+        return confidence * 0.5 ** (max(age, 0) / self.half_life)
+
+    def lookup(self, fingerprint):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT diagnosis, confidence, updated_at FROM diagnoses WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            confidence = self.effective_confidence(row[1], row[2], now)
+            if confidence < self.min_confidence:
+                self.db.execute("DELETE FROM diagnoses WHERE fingerprint = ?", (fingerprint,))
+                self.db.commit()
+                self.counters["misses"] += 1
+                return None
+            self.db.execute("UPDATE diagnoses SET hits = hits + 1 WHERE fingerprint = ?", (fingerprint,))
+            self.db.commit()
+            self.counters["hits"] += 1
+            return json.loads(row[0])
+
+    def record(self, fingerprint, normalized, diagnosis):
+        if not is_valid_diagnosis(diagnosis):
+            return
+        now = time.time()
+        stored = {k: diagnosis[k] for k in ("diagnosis", "isLogicError", "suggestedFix")}
+        with self.lock:
+            self.db.execute(
+                """INSERT OR REPLACE INTO diagnoses
+                   (fingerprint, normalized, diagnosis, confidence, hits, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, 0, ?, ?)""",
+                (fingerprint, normalized, json.dumps(stored), self.initial_confidence, now, now),
+            )
+            self.db.commit()
+            self.counters["stores"] += 1
+
+    def confirm(self, fingerprint):
+        """
+        The suggested fix worked on the next attempt: raise confidence and refresh its age.
+        """
+        with self.lock:
+            self.db.execute(
+                "UPDATE diagnoses SET confidence = MIN(1.0, confidence + 0.1), updated_at = ? WHERE fingerprint = ?",
+                (time.time(), fingerprint),
+            )
+            self.db.commit()
+            self.counters["confirmations"] += 1
+
+    def invalidate(self, fingerprint):
+        """
+        The suggested fix did not work: drop the entry so the next failure asks the LLM again.
+        """
+        with self.lock:
+            self.db.execute("DELETE FROM diagnoses WHERE fingerprint = ?", (fingerprint,))
+            self.db.commit()
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        with self.lock:
+            entries, total_hits = self.db.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM diagnoses").fetchone()
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": (self.counters["hits"] / lookups) if lookups else 0.0,
+                "entries": entries,
+                "lifetime_hits": total_hits,
+            }
+
+
+_store = None
+
+
+def is_enabled() -> bool:
+    return os.environ.get("LLM_DIAGNOSIS_CACHE", "1") != "0"
+
+
+def get_store() -> DiagnosisStore:
+    global _store
+    if _store is None:
+        _store = DiagnosisStore()
+    return _store
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        print(json.dumps(get_store().stats()))
+    elif command in ("confirm", "invalidate") and len(sys.argv) > 2:
+        getattr(get_store(), command)(sys.argv[2])
+        print(json.dumps({"status": "success"}))
+    elif command == "fingerprint" and len(sys.argv) > 2:
+        fingerprint, normalized = fingerprint_error(sys.argv[2])
+        print(json.dumps({"fingerprint": fingerprint, "normalized": normalized}))
+    else:
+        print("Usage: python3 diagnosis_store.py [stats | confirm <fp> | invalidate <fp> | fingerprint <error>]")
+        sys.exit(1)
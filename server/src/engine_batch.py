@@ -0,0 +1,91 @@
+import asyncio
+import inspect
+import json
+import os
+import sys
+
+# JSONL batch mode shared by the engine CLIs.
+# Each stdin line is one request: {"id": ..., <engine kwargs>}. Requests run
+# concurrently up to a limit and each result is written as soon as it finishes:
+# {"id": ..., "result": ...} or {"id": ..., "error": ...}.
+
+DEFAULT_CONCURRENCY = int(os.environ.get("LLM_BATCH_CONCURRENCY", "4"))
+
+
+def parse_concurrency(argv) -> int:
+    if "--concurrency" in argv:
+        index = argv.index("--concurrency")
+        if index + 1 < len(argv):
+            return max(1, int(argv[index + 1]))
+    return DEFAULT_CONCURRENCY
+
+
+async def run_batch(handler, concurrency: int = DEFAULT_CONCURRENCY, source=None, sink=None):
+    """
+    Stream JSONL requests from `source` (stdin) through the async `handler`
+    and write tagged JSONL results to `sink` (stdout) out of order.
+    Per-item failures are reported on that item and never abort the batch.
+    """
+    source = source or sys.stdin
+    sink = sink or sys.stdout
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency)
+    signature = inspect.signature(handler)
+    pending = set()
+    counts = {"ok": 0, "failed": 0}
+
+    def emit(record):
+        sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sink.flush()
+
+    async def process(line_no, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            counts["failed"] += 1
+            emit({"id": None, "line": line_no, "error": f"Invalid request: {e}"})
+            return
+
+        req_id = request.pop("id", line_no)
+        try:
+            signature.bind(**request)
+        except TypeError as e:
+            counts["failed"] += 1
+            emit({"id": req_id, "error": f"Invalid params: {e}"})
+            return
+
+        async with limit:
+            try:
+                result = await handler(**request)
+            except Exception as e:
+                counts["failed"] += 1
+                emit({"id": req_id, "error": str(e)})
+                return
+        counts["ok"] += 1
+        emit({"id": req_id, "result": result})
+
+    line_no = 0
+    while True:
+        line = await loop.run_in_executor(None, source.readline)
+        if not line:
+            break
+        line_no += 1
+        if not line.strip():
+            continue
+        # Keep at most a few windows of work queued so huge batches stay bounded in memory.
+        while len(pending) >= concurrency * 4:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        task = asyncio.ensure_future(process(line_no, line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+    print(f"batch complete: {counts['ok']} ok, {counts['failed']} failed", file=sys.stderr)
+    return counts
+
+
+def main_batch(handler, argv):
+    asyncio.run(run_batch(handler, parse_concurrency(argv)))
@@ -1,13 +1,14 @@
-import { exec, spawn } from 'child_process';
+import { exec } from 'child_process';
 import { promisify } from 'util';
 import { McpClient } from './mcp_client';
 import { ROLE_CAPABILITIES } from './role_registry';
-import { diagnoseAndSuggestFix, ErrorDiagnosis } from './tester_engine';
+import { diagnoseAndSuggestFix, reportFixOutcome, withErrorOutput, ErrorDiagnosis } from './tester_engine';
 import { arbitrateConflict, ArbitrationDecision } from './arbitrator';
 import { validateAgainstConstitution, GovernanceValidationResult } from './governance_hook';
 import { createLogger } from './logger';
 import { mcpDiscovery } from './mcp_discovery';
 import { workflowOrchestrator, WorkflowPlan } from './workflow_engine';
+import { pythonWorkerPool } from './python_worker_pool';
 
 const execAsync = promisify(exec);
 const logger = createLogger('Executor');
@@ -20,6 +21,7 @@ export interface ExecutionResult {
   arbitrationDecision?: ArbitrationDecision;
   governanceValidation?: GovernanceValidationResult;
   attempt?: number;
+  candidate?: number;
 }
 
 export interface TaskInstruction {
@@ -29,57 +31,107 @@ export interface TaskInstruction {
   attempt?: number;
   previousError?: string;
   suggestedFix?: string;
+  taskId?: string; // 计入 LLM 遥测，供成本追踪按任务归集
 }
 
 async function retrieveMemories(query: string): Promise<string> {
-  return new Promise((resolve) => {
-    const pythonProcess = spawn('python3', ['./src/memory_engine.py', 'retrieve', query], {
-      cwd: '/home/ubuntu/ai-team-frontend/server',
-    });
+  try {
+    const memories = await pythonWorkerPool.call<any[]>('memory.retrieve', { query });
+    return JSON.stringify(memories);
+  } catch (error: any) {
+    logger.warn('Memory retrieval failed', { error: error.message });
+    return '[]';
+  }
+}
 
-    let output = '';
-    pythonProcess.stdout.on('data', (data) => output += data.toString());
-    pythonProcess.on('close', (code) => {
-      if (code === 0) resolve(output.trim());
-      else resolve('[]');
-    });
-  });
+interface GeneratedCandidate {
+  code: string;
+  ok: boolean;
+  issues: string[];
+  temperature: number;
 }
 
-async function generateCodeWithLLM(instruction: TaskInstruction): Promise<string> {
+interface RepairOutput {
+  diagnosis: string;
+  candidates: GeneratedCandidate[];
+  fused: boolean;
+}
+
+// Set LLM_FUSED_REPAIR=0 to go back to separate diagnose and regenerate calls.
+const FUSED_REPAIR = process.env.LLM_FUSED_REPAIR !== '0';
+
+async function gatherGenerationInputs(goal: string): Promise<{ availableTools: string; memories: string }> {
   // Discover tools and memories before generation
   await mcpDiscovery.discoverAll();
   const availableTools = JSON.stringify(mcpDiscovery.getAvailableTools());
-  const memories = await retrieveMemories(instruction.goal);
-
-  return new Promise((resolve, reject) => {
-    const args = [
-      './src/llm_code_generator.py',
-      instruction.role,
-      instruction.goal,
-      instruction.context,
-      (instruction.attempt || 1).toString(),
-      instruction.previousError || '',
-      instruction.suggestedFix || '',
-      availableTools,
-      memories
-    ];
-
-    const pythonProcess = spawn('python3', args, {
-      cwd: '/home/ubuntu/ai-team-frontend/server',
-    });
+  const memories = await retrieveMemories(goal);
+  return { availableTools, memories };
+}
 
-    let output = '';
-    let errorOutput = '';
+/**
+ * Candidates come ranked by the worker's local checks. Those that failed the checks
+ * are dropped unless none passed, in which case the best one is still tried so
+ * governance and arbitration see it as before.
+ */
+function selectCandidates(candidates: GeneratedCandidate[]): string[] {
+  const passing = candidates.filter((c) => c.ok);
+  if (passing.length < candidates.length) {
+    logger.debug('Candidates rejected by local checks', {
+      issues: candidates.filter((c) => !c.ok).map((c) => c.issues),
+    });
+  }
+  return (passing.length > 0 ? passing : candidates.slice(0, 1)).map((c) => c.code.trim());
+}
 
-    pythonProcess.stdout.on('data', (data) => output += data.toString());
-    pythonProcess.stderr.on('data', (data) => errorOutput += data.toString());
+/**
+ * Generates LLM_CANDIDATES candidates in parallel (1 by default).
+ */
+async function generateCodeWithLLM(instruction: TaskInstruction): Promise<string[]> {
+  const { availableTools, memories } = await gatherGenerationInputs(instruction.goal);
 
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) reject(new Error(`LLM failed: ${errorOutput}`));
-      else resolve(output.trim());
+  try {
+    const candidates = await pythonWorkerPool.call<GeneratedCandidate[]>('generate_candidates', {
+      role: instruction.role,
+      goal: instruction.goal,
+      context: instruction.context,
+      attempt: instruction.attempt || 1,
+      prev_error: instruction.previousError || '',
+      suggested_fix: instruction.suggestedFix || '',
+      available_tools: availableTools,
+      memories,
+      task_id: instruction.taskId,
     });
-  });
+    return selectCandidates(candidates);
+  } catch (error: any) {
+    throw new Error(`LLM failed: ${error.message}`);
+  }
+}
+
+/**
+ * Diagnoses a failed attempt and generates the next attempt's candidates in one
+ * completion (the worker falls back to diagnoser + generator on its own).
+ */
+async function repairWithLLM(
+  instruction: TaskInstruction,
+  errorOutput: string,
+  prevCommand: string
+): Promise<{ diagnosis: ErrorDiagnosis; candidates: string[] }> {
+  const { availableTools, memories } = await gatherGenerationInputs(instruction.goal);
+  const output = await withErrorOutput(errorOutput, (errorParams) =>
+    pythonWorkerPool.call<RepairOutput>('repair', {
+      role: instruction.role,
+      goal: instruction.goal,
+      context: instruction.context,
+      ...errorParams,
+      prev_command: prevCommand,
+      attempt: instruction.attempt || 2,
+      available_tools: availableTools,
+      memories,
+      task_id: instruction.taskId,
+    })
+  );
+  logger.info('Repair generated', { fused: output.fused, candidates: output.candidates.length });
+  return { diagnosis: JSON.parse(output.diagnosis) as ErrorDiagnosis, candidates: selectCandidates(output.candidates) };
 }
 
 async function executeCommandOrWorkflow(input: string, role: string, context: string): Promise<ExecutionResult> {
@@ -113,21 +165,38 @@ export async function executeTask(instruction: TaskInstruction): Promise<Executi
   const MAX_ATTEMPTS = 3;
   let currentInstruction = { ...instruction };
   let lastResult: ExecutionResult = { success: false };
+  let lastDiagnosis: ErrorDiagnosis | undefined;
+
+  let nextCandidates: string[] | undefined;
 
   for (let attempt = 1; attempt <= MAX_ATTEMPTS; attempt++) {
     currentInstruction.attempt = attempt;
     
-    let generatedInput: string;
+    let candidates: string[];
     try {
-      generatedInput = await generateCodeWithLLM(currentInstruction);
+      candidates = nextCandidates ?? await generateCodeWithLLM(currentInstruction);
+      nextCandidates = undefined;
     } catch (llmError: any) {
       return { success: false, error: `LLM generation failed: ${llmError.message}`, attempt };
     }
 
-    const result = await executeCommandOrWorkflow(generatedInput, instruction.role, instruction.context);
-    result.attempt = attempt;
+    // Speculative candidates are tried in rank order before paying for a diagnosis round.
+    let result: ExecutionResult = { success: false };
+    let lastCommand = '';
+    for (let index = 0; index < candidates.length; index++) {
+      lastCommand = candidates[index];
+      result = await executeCommandOrWorkflow(lastCommand, instruction.role, instruction.context);
+      result.attempt = attempt;
+      result.candidate = index + 1;
+      if (result.success) break;
+    }
     lastResult = result;
 
+    if (lastDiagnosis?.fingerprint) {
+      reportFixOutcome(lastDiagnosis.fingerprint, result.success);
+      lastDiagnosis = undefined;
+    }
+
     if (result.success) return result;
 
     if (result.governanceValidation && !result.governanceValidation.isValid) {
@@ -136,8 +205,21 @@ export async function executeTask(instruction: TaskInstruction): Promise<Executi
     }
 
     if (attempt < MAX_ATTEMPTS) {
-      const diagnosis = await diagnoseAndSuggestFix(result.error || "Error", instruction.context);
+      let diagnosis: ErrorDiagnosis | undefined;
+      if (FUSED_REPAIR) {
+        try {
+          const repair = await repairWithLLM({ ...currentInstruction, attempt: attempt + 1 }, result.error || "Error", lastCommand);
+          diagnosis = repair.diagnosis;
+          nextCandidates = repair.candidates;
+        } catch (repairError: any) {
+          logger.warn('Fused repair failed, falling back to separate diagnosis', { error: repairError.message });
+        }
+      }
+      if (!diagnosis) {
+        diagnosis = await diagnoseAndSuggestFix(result.error || "Error", instruction.context, instruction.taskId);
+      }
       result.diagnosis = diagnosis;
+      lastDiagnosis = diagnosis;
       currentInstruction.previousError = result.error;
       currentInstruction.suggestedFix = diagnosis.suggestedFix;
     }
@@ -20,6 +20,7 @@ import { mcpDiscovery } from './mcp_discovery';
 import { McpClient } from './mcp_client';
 import { executeWorkflow } from './multi_agent_workflow';
 import { SmartChatService } from './smart_chat_service';
+import { pythonWorkerPool } from './python_worker_pool';
 
 // 创建 SmartChatService 实例
 const smartChatService = new SmartChatService();
@@ -298,10 +299,45 @@ app.get('/api/costs/history', (req, res) => {
   res.json({ success: true, data: costTracker.getCostHistory(days) });
 });
 
+app.get('/api/costs/by-model', (req, res) => {
+  res.json({ success: true, data: costTracker.getCostByModel() });
+});
+
+app.get('/api/costs/recent', (req, res) => {
+  const limit = parseInt(req.query.limit as string) || 100;
+  res.json({ success: true, data: costTracker.getRecentCosts(limit) });
+});
+
+app.get('/api/costs/task/:taskId', (req, res) => {
+  const totals = costTracker.getTaskCost(req.params.taskId);
+  if (!totals) {
+    return res.status(404).json({ success: false, error: 'No cost recorded for this task' });
+  }
+  res.json({ success: true, data: totals });
+});
+
 app.get('/api/costs/alerts', (req, res) => {
   res.json({ success: true, alerts: costTracker.getAlerts() });
 });
 
+// Prometheus text rendered from the Python engines' llm_telemetry.jsonl
+app.get('/api/llm/metrics', async (req, res) => {
+  try {
+    const metrics = await pythonWorkerPool.call<string>('telemetry.metrics', {}, 10000);
+    res.type('text/plain; version=0.0.4').send(metrics);
+  } catch (error: any) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
+app.get('/api/llm/usage', async (req, res) => {
+  try {
+    res.json({ success: true, data: await pythonWorkerPool.call('telemetry.summary', {}, 10000) });
+  } catch (error: any) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
 // ============================================
 // Health & Audit API Routes (Article IV)
 // ============================================
@@ -429,4 +465,13 @@ httpServer.listen(PORT, '0.0.0.0', () => {
   logger.info(`Server running on port ${PORT}`);
 });
 
+// Let the Python workers flush queued memories before the process exits
+const shutdown = async (signal: string) => {
+  logger.info(`Received ${signal}, shutting down Python workers`);
+  await pythonWorkerPool.shutdown();
+  process.exit(0);
+};
+process.once('SIGTERM', () => shutdown('SIGTERM'));
+process.once('SIGINT', () => shutdown('SIGINT'));
+
 export default app;
@@ -0,0 +1,66 @@
+import json
+
+
+class JsonObjectScanner:
+    """
+    Incrementally scans streamed text for the first complete top-level JSON object.
+
+    Text is fed chunk by chunk; feed() returns True as soon as a balanced object
+    that also parses as valid JSON has been seen, so the caller can close the
+    stream without waiting for whatever the model writes after it.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.result = None
+
+    @property
+    def complete(self) -> bool:
+        return self.result is not None
+
+    def feed(self, text: str) -> bool:
+        if self.complete:
+            return True
+        self.buffer += text
+
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            self.pos += 1
+
+            if self.start == -1:
+                if ch == "{":
+                    self.start = self.pos - 1
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = self.buffer[self.start:self.pos]
+                    try:
+                        json.loads(candidate)
+                    except ValueError:
+                        # Balanced but not JSON (e.g. "{x}" in prose); keep looking.
+                        self.start = -1
+                        continue
+                    self.result = candidate
+                    return True
+        return False
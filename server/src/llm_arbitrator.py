@@ -1,13 +1,12 @@
+import profiling
 import sys
 import os
 import json
-from llm_client import call_llm
+from llm_client import call_llm_json, acall_llm_json
+from prompt_templates import PromptTemplate
 
-def arbitrate_conflict(conflict_description: str, context: str) -> str:
-    """
-    Arbitrate technical conflicts based on the AI Team Constitution using NVIDIA hosted LLM.
-    """
-    system_prompt = """You are the Arbitration Expert. 
+ARBITRATOR_TEMPLATE = PromptTemplate(
+    """You are the Arbitration Expert.
 Your task is to resolve technical deadlocks within the AI team using the P.R.O.M.P.T. framework.
 Evaluate conflicts across 7 dimensions: Tech Stack, Architectural Patterns, Requirements Alignment, Data Flow, Internal Logic, Performance Metrics, and Security.
 
@@ -17,18 +16,17 @@ You must output a JSON object with the following fields:
 - impact: The impact of this decision on the system.
 - constitutionalClause: The specific clause from the Constitution being applied.
 
-Output format: ONLY a JSON object."""
+Output format: ONLY a JSON object.""",
+    default="Conflict: {conflict_description}\nContext: {context}",
+)
 
-    user_prompt = f"Conflict: {conflict_description}\nContext: {context}"
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    
-    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
-    result = call_llm(messages, model=model)
-    
+
+@profiling.span("prompt")
+def build_messages(conflict_description: str, context: str):
+    return ARBITRATOR_TEMPLATE.messages(conflict_description=conflict_description, context=context)
+
+@profiling.span("extract")
+def extract_decision(result: str) -> str:
     try:
         # Try to find JSON block if LLM included extra text
         start = result.find('{')
@@ -43,9 +41,33 @@ Output format: ONLY a JSON object."""
             "impact": "Manual intervention required"
         })
 
+def arbitrate_conflict(conflict_description: str, context: str) -> str:
+    """
+    Arbitrate technical conflicts based on the AI Team Constitution using NVIDIA hosted LLM.
+    """
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    result = call_llm_json(build_messages(conflict_description, context), model=model, engine="arbitrator")
+    return extract_decision(result["content"])
+
+async def aarbitrate_conflict(conflict_description: str, context: str) -> str:
+    """
+    Async variant of arbitrate_conflict for callers running many arbitrations in one process.
+    """
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    result = await acall_llm_json(build_messages(conflict_description, context), model=model, engine="arbitrator")
+    return extract_decision(result["content"])
+
 if __name__ == "__main__":
+    profiling.mark("import")
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # JSONL on stdin: {"id": ..., "conflict_description": ..., "context": ...}
+        from engine_batch import main_batch
+        main_batch(aarbitrate_conflict, sys.argv)
+        sys.exit(0)
+
     if len(sys.argv) < 3:
         print("Usage: python3 llm_arbitrator.py <conflict_description> <context>")
+        print("       python3 llm_arbitrator.py --batch [--concurrency N] < requests.jsonl")
         sys.exit(1)
         
     conflict_arg = sys.argv[1]
@@ -0,0 +1,180 @@
+import profiling
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Opt-in two-tier cache for LLM responses: an in-memory LRU in front of an
+# on-disk SQLite table. Enabled per engine via LLM_CACHE_ENGINES, e.g.
+# LLM_CACHE_ENGINES=diagnoser,arbitrator (or "*" for every engine).
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "llm_responses.db")
+
+
+def cache_key(request_args) -> str:
+    """
+    Canonical hash of the fields that determine a completion.
+    """
+    canonical = {
+        "model": request_args.get("model"),
+        "messages": request_args.get("messages"),
+        "temperature": request_args.get("temperature"),
+        "max_tokens": request_args.get("max_tokens"),
+        "response_format": request_args.get("response_format"),
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_error_response(content) -> bool:
+    if not content:
+        return True
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("success") is False and "error" in data
+
+
+class ResponseCache:
+    def __init__(self, path=None, ttl=None, memory_entries=None, max_entries=None):
+        self.path = path or os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else float(os.environ.get("LLM_CACHE_TTL", "86400"))
+        self.memory_entries = memory_entries or int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "256"))
+        self.max_entries = max_entries or int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+        self.memory = OrderedDict()
+        self.counters = {}
+        self.lock = threading.Lock()
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    engine TEXT,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._db.commit()
+        return self._db
+
+    def _count(self, engine, name):
+        stats = self.counters.setdefault(engine or "default", {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0})
+        stats[name] += 1
+
+    def get(self, key, engine=None):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                content, created_at = entry
+                if now - created_at <= self.ttl:
+                    self.memory.move_to_end(key)
+                    self._count(engine, "memory_hits")
+                    return content
+                del self.memory[key]
+
+            try:
+                row = self.db.execute(
+                    "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self.db.commit()
+                    self._remember(key, row[0], row[1])
+                    self._count(engine, "disk_hits")
+                    return row[0]
+            except sqlite3.Error as e:
+                print(f"LLM cache read error: {e}", file=sys.stderr)
+
+            self._count(engine, "misses")
+            return None
+
+    def put(self, key, content, engine=None):
+        if is_error_response(content):
+            return
+        now = time.time()
+        with self.lock:
+            self._remember(key, content, now)
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses (key, engine, content, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, engine, content, now, now),
+                )
+                self._evict(now)
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"LLM cache write error: {e}", file=sys.stderr)
+            self._count(engine, "stores")
+
+    def _remember(self, key, content, created_at):
+        self.memory[key] = (content, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self, now):
+        self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self.db.execute(
+            """DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            try:
+                disk_entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except sqlite3.Error:
+                disk_entries = None
+            return {
+                "memory_entries": len(self.memory),
+                "disk_entries": disk_entries,
+                "engines": {name: dict(stats) for name, stats in self.counters.items()},
+            }
+
+
+_cache = None
+
+
+def is_enabled(engine) -> bool:
+    engines = [e.strip() for e in os.environ.get("LLM_CACHE_ENGINES", "").split(",") if e.strip()]
+    return "*" in engines or (engine or "default") in engines
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "clear":
+        get_cache().clear()
+        print(json.dumps({"status": "cleared"}))
+    elif command == "stats":
+        print(json.dumps(get_cache().stats()))
+    else:
+        print("Usage: python3 llm_cache.py [stats | clear]")
+        sys.exit(1)
@@ -1,40 +1,465 @@
+import asyncio
 import os
 import json
-from openai import OpenAI
+import threading
+import time
+import weakref
+from json_stream import JsonObjectScanner
+import llm_cache
+import llm_coalesce
+import llm_telemetry
+import llm_routing
+import llm_scheduler
+import profiling
 
-def get_llm_client():
+# Process-wide clients, built once per endpoint and shared so repeated calls
+# reuse warm keep-alive connections instead of doing a fresh TLS handshake each
+# time. openai/httpx are imported on first use so paths that return early
+# (usage errors, missing API key, cache hits) never pay for them.
+# Retries are left to llm_routing, so the clients themselves never retry.
+# Async clients are cached per event loop: their connection pool is bound to
+# the loop that opened it, and each asyncio.run() starts a new one.
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+
+def _client_settings():
     # NVIDIA API usage typically follows OpenAI compatible format
     # Base URL for NVIDIA NIM or similar services
-    base_url = os.environ.get("NVIDIA_API_BASE_URL", "https://integrate.api.nvidia.com/v1")
+    base_url = llm_routing.endpoints()[0]
     api_key = os.environ.get("NVIDIA_API_KEY")
-    
+
     if not api_key:
         # Fallback to default OPENAI_API_KEY if NVIDIA specific one isn't set
         api_key = os.environ.get("OPENAI_API_KEY")
-        
-    client = OpenAI(base_url=base_url, api_key=api_key)
-    return client
 
-def call_llm(messages, model=None, temperature=0.2, max_tokens=1024):
+    return base_url, api_key
+
+
+def _missing_key_error():
+    if _client_settings()[1]:
+        return None
+    return json.dumps({"error": "API key not found (set NVIDIA_API_KEY or OPENAI_API_KEY)", "success": False})
+
+
+def _pool_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.environ.get("LLM_POOL_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def _pool_timeout():
+    import httpx
+    return httpx.Timeout(
+        float(os.environ.get("LLM_TIMEOUT", "120")),
+        connect=float(os.environ.get("LLM_CONNECT_TIMEOUT", "10")),
+    )
+
+
+def get_llm_client(base_url=None):
+    default_url, api_key = _client_settings()
+    base_url = base_url or default_url
+    if base_url not in _clients:
+        with _client_lock:
+            if base_url not in _clients:
+                with profiling.span("client"):
+                    import httpx
+                    from openai import OpenAI
+                    http_client = httpx.Client(limits=_pool_limits(), timeout=_pool_timeout(),
+                                               event_hooks={"request": [llm_telemetry.count_attempt],
+                                                            "response": [llm_scheduler.observe_response]})
+                    _clients[base_url] = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+    return _clients[base_url]
+
+
+def get_async_llm_client(base_url=None):
+    # AsyncOpenAI binds its connection pool to the running event loop, so this
+    # must be called from inside the loop that will use it.
+    default_url, api_key = _client_settings()
+    base_url = base_url or default_url
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if base_url not in clients:
+        with profiling.span("client"):
+            import httpx
+            from openai import AsyncOpenAI
+            http_client = httpx.AsyncClient(limits=_pool_limits(), timeout=_pool_timeout(),
+                                            event_hooks={"request": [llm_telemetry.acount_attempt],
+                                                         "response": [llm_scheduler.aobserve_response]})
+            clients[base_url] = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+    return clients[base_url]
+
+
+_sync_loops = threading.local()
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion for a sync caller, on an event loop owned by
+    the calling thread for its lifetime. Unlike asyncio.run(), repeated calls
+    reuse the loop and so keep its pooled async connections warm.
+    """
+    loop = getattr(_sync_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _sync_loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+# Completion budgets sized to what each engine is expected to produce.
+# Override per engine with LLM_MAX_TOKENS_<ENGINE>, e.g. LLM_MAX_TOKENS_DIAGNOSER=512.
+ENGINE_MAX_TOKENS = {
+    "generator": 1024,
+    "diagnoser": 384,
+    "arbitrator": 512,
+    "repair": 1024,
+}
+DEFAULT_MAX_TOKENS = 1024
+
+
+def max_tokens_for(engine=None):
+    if engine:
+        override = os.environ.get(f"LLM_MAX_TOKENS_{engine.upper()}")
+        if override:
+            return int(override)
+        return ENGINE_MAX_TOKENS.get(engine, DEFAULT_MAX_TOKENS)
+    return DEFAULT_MAX_TOKENS
+
+
+def _request_args(messages, model, temperature, max_tokens, engine=None):
+    if model is None:
+        model = os.environ.get("LLM_MODEL", "z-ai/glm-4")
+    if max_tokens is None:
+        max_tokens = max_tokens_for(engine)
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "response_format": {"type": "json_object"} if "json" in str(messages).lower() else None,
+    }
+
+
+@profiling.span("cache")
+def _cache_lookup(request_args, engine):
+    if not llm_cache.is_enabled(engine):
+        return None, None
+    key = llm_cache.cache_key(request_args)
+    return key, llm_cache.get_cache().get(key, engine)
+
+
+def _cache_store(key, content, engine):
+    # Error payloads are never cached (ResponseCache.put rejects them).
+    if key is not None:
+        llm_cache.get_cache().put(key, content, engine)
+
+
+# The async paths reach the cache from a worker thread: a disk hit commits its
+# access time and a store commits the response, and neither may stall the loop.
+async def _acache_lookup(request_args, engine):
+    if not llm_cache.is_enabled(engine):
+        return None, None
+    key = llm_cache.cache_key(request_args)
+    with profiling.span("cache"):
+        return key, await asyncio.get_running_loop().run_in_executor(None, llm_cache.get_cache().get, key, engine)
+
+
+async def _acache_store(key, content, engine):
+    if key is not None:
+        await asyncio.get_running_loop().run_in_executor(None, llm_cache.get_cache().put, key, content, engine)
+
+
+def _coalesce_key(request_args, mode):
+    # The json variants return a different shape, so they never share with plain calls.
+    return f"{mode}:{llm_cache.cache_key(request_args)}"
+
+
+def _shared_result(result, request_args, engine, started, stream):
+    llm_telemetry.record_call(request_args, engine, "coalesced", started, stream=stream)
+    if isinstance(result, dict):
+        return {**result, "coalesced": True, "latency": time.monotonic() - started}
+    return result
+
+
+def _coalesced(request_args, engine, started, mode, upstream):
+    """
+    Run upstream() unless an identical request is already in flight, in which
+    case wait for and share its result (see llm_coalesce).
+    """
+    if not llm_coalesce.is_enabled():
+        return upstream()
+    result, shared = llm_coalesce.get_flight().do(_coalesce_key(request_args, mode), engine, upstream)
+    return _shared_result(result, request_args, engine, started, mode == "json") if shared else result
+
+
+async def _acoalesced(request_args, engine, started, mode, upstream):
+    if not llm_coalesce.is_enabled():
+        return await upstream()
+    result, shared = await llm_coalesce.get_flight().ado(_coalesce_key(request_args, mode), engine, upstream)
+    return _shared_result(result, request_args, engine, started, mode == "json") if shared else result
+
+
+def call_llm(messages, model=None, temperature=0.2, max_tokens=None, engine=None):
     """
     Common function to call the LLM.
     Priority:
     1. model parameter passed to the function
     2. LLM_MODEL environment variable
     3. Default to 'z-ai/glm-4' as requested by user
+
+    max_tokens defaults to the budget of the calling engine (see ENGINE_MAX_TOKENS).
+    Responses are served from llm_cache when caching is enabled for the engine,
+    and identical requests already in flight are shared (llm_coalesce).
     """
-    if model is None:
-        model = os.environ.get("LLM_MODEL", "z-ai/glm-4")
-        
-    client = get_llm_client()
+    started = time.monotonic()
+    request_args = _request_args(messages, model, temperature, max_tokens, engine)
+    key, cached = _cache_lookup(request_args, engine)
+    if cached is not None:
+        llm_telemetry.record_call(request_args, engine, "cache_hit", started)
+        return cached
+    missing_key = _missing_key_error()
+    if missing_key:
+        llm_telemetry.record_call(request_args, engine, "no_key", started)
+        return missing_key
+
+    return _coalesced(request_args, engine, started, "text", lambda: _call_upstream(request_args, engine, key, started))
+
+
+def _call_upstream(request_args, engine, key, started):
+    counter = llm_telemetry.start_call()
+    route = {}
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"} if "json" in str(messages).lower() else None
-        )
-        return response.choices[0].message.content
+        with profiling.span("llm_call"):
+            response = llm_routing.create(get_llm_client, request_args, info=route, engine=engine)
+        content = response.choices[0].message.content
+        llm_telemetry.record_call(request_args, engine, "success", started, counter, usage=response.usage, completion_text=content, route=route)
+        _cache_store(key, content, engine)
+        return content
     except Exception as e:
+        llm_telemetry.record_call(request_args, engine, "error", started, counter, error=type(e).__name__, route=route)
         return json.dumps({"error": str(e), "success": False})
+
+
+async def acall_llm(messages, model=None, temperature=0.2, max_tokens=None, engine=None):
+    """
+    Asyncio-native counterpart of call_llm. It uses the async client pooled
+    for the running event loop (not call_llm's pool), so one process can keep
+    many requests in flight without threads.
+    """
+    started = time.monotonic()
+    request_args = _request_args(messages, model, temperature, max_tokens, engine)
+    key, cached = await _acache_lookup(request_args, engine)
+    if cached is not None:
+        llm_telemetry.record_call(request_args, engine, "cache_hit", started)
+        return cached
+    missing_key = _missing_key_error()
+    if missing_key:
+        llm_telemetry.record_call(request_args, engine, "no_key", started)
+        return missing_key
+
+    return await _acoalesced(request_args, engine, started, "text", lambda: _acall_upstream(request_args, engine, key, started))
+
+
+async def _acall_upstream(request_args, engine, key, started):
+    counter = llm_telemetry.start_call()
+    route = {}
+    try:
+        with profiling.span("llm_call"):
+            response = await llm_routing.acreate(get_async_llm_client, request_args, info=route, engine=engine)
+        content = response.choices[0].message.content
+        llm_telemetry.record_call(request_args, engine, "success", started, counter, usage=response.usage, completion_text=content, route=route)
+        await _acache_store(key, content, engine)
+        return content
+    except Exception as e:
+        llm_telemetry.record_call(request_args, engine, "error", started, counter, error=type(e).__name__, route=route)
+        return json.dumps({"error": str(e), "success": False})
+
+
+def stream_usage_enabled() -> bool:
+    # Ask for the provider's usage chunk on streams and read up to it after the
+    # JSON object completes: exact token and cached-token counts at the cost of
+    # the early stop.
+    return os.environ.get("LLM_STREAM_USAGE", "0") == "1"
+
+
+def _stream_args(messages, model, temperature, max_tokens, engine):
+    request_args = _request_args(messages, model, temperature, max_tokens, engine)
+    if stream_usage_enabled():
+        request_args["stream_options"] = {"include_usage": True}
+    return request_args
+
+
+def _delta_text(chunk):
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def stream_llm(messages, model=None, temperature=0.2, max_tokens=None, engine=None, route=None):
+    """
+    Streaming variant of call_llm that yields content deltas as they arrive.
+    Closing the generator early closes the underlying HTTP response.
+    Failover and retry apply until the stream is open; `route` receives the route
+    used, and the provider's usage under "usage" when it is sent.
+    """
+    stream = llm_routing.create(get_llm_client, _stream_args(messages, model, temperature, max_tokens, engine), stream=True, info=route, engine=engine)
+    try:
+        for chunk in stream:
+            if route is not None and getattr(chunk, "usage", None) is not None:
+                route["usage"] = chunk.usage
+            text = _delta_text(chunk)
+            if text:
+                yield text
+    finally:
+        stream.close()
+
+
+async def astream_llm(messages, model=None, temperature=0.2, max_tokens=None, engine=None, route=None):
+    """
+    Async counterpart of stream_llm; a slow stream open may be hedged.
+    """
+    stream = await llm_routing.acreate(get_async_llm_client, _stream_args(messages, model, temperature, max_tokens, engine), stream=True, info=route, engine=engine)
+    try:
+        async for chunk in stream:
+            if route is not None and getattr(chunk, "usage", None) is not None:
+                route["usage"] = chunk.usage
+            text = _delta_text(chunk)
+            if text:
+                yield text
+    finally:
+        await stream.close()
+
+
+def _json_result(scanner, parts, started, first_token_at, cached=False):
+    content = scanner.result if scanner.complete else "".join(parts)
+    return {
+        "content": content,
+        "complete": scanner.complete,
+        "cached": cached,
+        "ttft": (first_token_at - started) if first_token_at else None,
+        "latency": time.monotonic() - started,
+    }
+
+
+def _cached_json_result(content, started):
+    scanner = JsonObjectScanner()
+    scanner.feed(content)
+    return _json_result(scanner, [content], started, None, cached=True)
+
+
+def call_llm_json(messages, model=None, temperature=0.2, max_tokens=None, engine=None):
+    """
+    Stream a completion that is expected to be a single JSON object and stop
+    reading as soon as the top-level object is balanced and valid.
+
+    Returns a dict with the object text ("content"), whether a complete object
+    was found, time-to-first-token ("ttft") and total latency in seconds.
+    On failure "content" carries the same error JSON as call_llm.
+    Only complete objects are stored in llm_cache.
+    """
+    started = time.monotonic()
+    request_args = _request_args(messages, model, temperature, max_tokens, engine)
+    key, cached = _cache_lookup(request_args, engine)
+    if cached is not None:
+        llm_telemetry.record_call(request_args, engine, "cache_hit", started, stream=True)
+        return _cached_json_result(cached, started)
+    missing_key = _missing_key_error()
+    if missing_key:
+        llm_telemetry.record_call(request_args, engine, "no_key", started, stream=True)
+        return _json_result(JsonObjectScanner(), [missing_key], started, None)
+
+    return _coalesced(request_args, engine, started, "json",
+                      lambda: _call_upstream_json(request_args, engine, key, started))
+
+
+def _call_upstream_json(request_args, engine, key, started):
+    scanner = JsonObjectScanner()
+    parts = []
+    first_token_at = None
+    counter = llm_telemetry.start_call()
+    route = {}
+    drain = stream_usage_enabled()
+    with profiling.span("llm_call"):
+        try:
+            deltas = stream_llm(request_args["messages"], request_args["model"], request_args["temperature"],
+                                request_args["max_tokens"], engine, route=route)
+            try:
+                for text in deltas:
+                    if scanner.complete:
+                        continue  # reading on to the usage chunk
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    parts.append(text)
+                    if scanner.feed(text) and not drain:
+                        break
+            finally:
+                deltas.close()
+        except Exception as e:
+            if not parts:
+                llm_telemetry.record_call(request_args, engine, "error", started, counter, stream=True, error=type(e).__name__, route=route)
+                return _json_result(scanner, [json.dumps({"error": str(e), "success": False})], started, first_token_at)
+    llm_telemetry.record_call(
+        request_args, engine, "success" if scanner.complete else "incomplete", started, counter,
+        usage=route.get("usage"), completion_text="".join(parts), ttft=(first_token_at - started) if first_token_at else None,
+        stream=True, route=route,
+    )
+    if scanner.complete:
+        _cache_store(key, scanner.result, engine)
+    return _json_result(scanner, parts, started, first_token_at)
+
+
+async def acall_llm_json(messages, model=None, temperature=0.2, max_tokens=None, engine=None):
+    """
+    Async counterpart of call_llm_json.
+    """
+    started = time.monotonic()
+    request_args = _request_args(messages, model, temperature, max_tokens, engine)
+    key, cached = await _acache_lookup(request_args, engine)
+    if cached is not None:
+        llm_telemetry.record_call(request_args, engine, "cache_hit", started, stream=True)
+        return _cached_json_result(cached, started)
+    missing_key = _missing_key_error()
+    if missing_key:
+        llm_telemetry.record_call(request_args, engine, "no_key", started, stream=True)
+        return _json_result(JsonObjectScanner(), [missing_key], started, None)
+
+    return await _acoalesced(request_args, engine, started, "json",
+                             lambda: _acall_upstream_json(request_args, engine, key, started))
+
+
+async def _acall_upstream_json(request_args, engine, key, started):
+    scanner = JsonObjectScanner()
+    parts = []
+    first_token_at = None
+    counter = llm_telemetry.start_call()
+    route = {}
+    drain = stream_usage_enabled()
+    with profiling.span("llm_call"):
+        try:
+            deltas = astream_llm(request_args["messages"], request_args["model"], request_args["temperature"],
+                                request_args["max_tokens"], engine, route=route)
+            try:
+                async for text in deltas:
+                    if scanner.complete:
+                        continue  # reading on to the usage chunk
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    parts.append(text)
+                    if scanner.feed(text) and not drain:
+                        break
+            finally:
+                await deltas.aclose()
+        except Exception as e:
+            if not parts:
+                llm_telemetry.record_call(request_args, engine, "error", started, counter, stream=True, error=type(e).__name__, route=route)
+                return _json_result(scanner, [json.dumps({"error": str(e), "success": False})], started, first_token_at)
+    llm_telemetry.record_call(
+        request_args, engine, "success" if scanner.complete else "incomplete", started, counter,
+        usage=route.get("usage"), completion_text="".join(parts), ttft=(first_token_at - started) if first_token_at else None,
+        stream=True, route=route,
+    )
+    if scanner.complete:
+        await _acache_store(key, scanner.result, engine)
+    return _json_result(scanner, parts, started, first_token_at)
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Single-flight coalescing for llm_client: concurrent requests with the same
+# canonical key (llm_cache.cache_key plus the call mode) share one upstream
+# call and all receive its result. Nothing is kept once the call completes;
+# that is llm_cache's job. Coalescing is per process, so with several workers
+# only callers landing on the same worker are merged.
+#
+# A follower waits at most LLM_COALESCE_WAIT seconds for the leader, then
+# makes its own call. LLM_COALESCE=0 disables coalescing.
+
+
+def is_enabled() -> bool:
+    return os.environ.get("LLM_COALESCE", "1") != "0"
+
+
+def wait_timeout() -> float:
+    return float(os.environ.get("LLM_COALESCE_WAIT", "60"))
+
+
+class _SyncCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _AsyncCall:
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Tracks in-flight calls by key. `do`/`ado` return (result, shared): shared
+    is True when the result came from another caller's request.
+    """
+
+    def __init__(self, tracked_keys=None):
+        self.tracked_keys = tracked_keys or int(os.environ.get("LLM_COALESCE_TRACKED_KEYS", "256"))
+        self.lock = threading.Lock()
+        self.sync_calls = {}
+        self.async_calls = {}
+        self.totals = {"calls": 0, "leaders": 0, "merged": 0, "timeouts": 0, "max_waiters": 0}
+        self.keys = OrderedDict()
+
+    def _key_stats(self, key, engine):
+        # Caller holds self.lock. Only the most recent keys are kept.
+        stats = self.keys.pop(key, None) or {"engine": engine or "default", "leaders": 0, "merged": 0,
+                                             "timeouts": 0, "max_waiters": 0}
+        self.keys[key] = stats
+        while len(self.keys) > self.tracked_keys:
+            self.keys.popitem(last=False)
+        stats["last_seen"] = time.time()
+        return stats
+
+    def _lead(self, key, engine):
+        # Caller holds self.lock.
+        self.totals["calls"] += 1
+        self.totals["leaders"] += 1
+        self._key_stats(key, engine)["leaders"] += 1
+
+    def _join(self, key, engine, call):
+        # Caller holds self.lock.
+        call.waiters += 1
+        self.totals["calls"] += 1
+        self.totals["merged"] += 1
+        self.totals["max_waiters"] = max(self.totals["max_waiters"], call.waiters)
+        stats = self._key_stats(key, engine)
+        stats["merged"] += 1
+        stats["max_waiters"] = max(stats["max_waiters"], call.waiters)
+
+    def _timed_out(self, key, engine):
+        with self.lock:
+            self.totals["timeouts"] += 1
+            self._key_stats(key, engine)["timeouts"] += 1
+
+    def do(self, key, engine, fn):
+        with self.lock:
+            call = self.sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.sync_calls[key] = _SyncCall()
+                self._lead(key, engine)
+            else:
+                self._join(key, engine, call)
+
+        if not leader:
+            if call.done.wait(wait_timeout()):
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            self._timed_out(key, engine)
+            return fn(), False
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.sync_calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key, engine, fn):
+        """
+        Async counterpart of do; fn is a coroutine function.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self.lock:
+            call = self.async_calls.get(loop_key)
+            if call is not None:
+                self._join(key, engine, call)
+        if call is not None:
+            try:
+                # shield: a follower giving up must not cancel the leader's call.
+                return await asyncio.wait_for(asyncio.shield(call.future), wait_timeout()), True
+            except asyncio.TimeoutError:
+                self._timed_out(key, engine)
+                return await fn(), False
+            except asyncio.CancelledError:
+                if not call.future.cancelled():
+                    raise
+                # The leader was cancelled; this caller still wants an answer.
+                return await fn(), False
+
+        call = _AsyncCall()
+        with self.lock:
+            self.async_calls[loop_key] = call
+            self._lead(key, engine)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.future.cancel()
+            raise
+        except Exception as e:
+            call.future.set_exception(e)
+            # Followers retrieve it; keep asyncio from logging it as unretrieved.
+            call.future.exception()
+            raise
+        else:
+            call.future.set_result(result)
+            return result, False
+        finally:
+            with self.lock:
+                self.async_calls.pop(loop_key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.totals,
+                "in_flight": len(self.sync_calls) + len(self.async_calls),
+                "keys": {key[:24]: dict(stats) for key, stats in reversed(self.keys.items())},
+            }
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_flight() -> SingleFlight:
+    global _flight
+    if _flight is None:
+        with _flight_lock:
+            if _flight is None:
+                _flight = SingleFlight()
+    return _flight
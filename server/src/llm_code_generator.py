@@ -1,32 +1,22 @@
+import profiling
+import asyncio
 import sys
 import os
 import json
-from llm_client import call_llm
+from llm_client import call_llm, acall_llm, run_sync
+from context_assembler import assemble_context, log_report
+from prompt_templates import PromptTemplate, render_memories
+from candidate_checks import rank_candidates
+from tool_index import get_retriever
 
-def generate_code(role: str, goal: str, context: str, attempt: int = 1, prev_error: str = "", suggested_fix: str = "", available_tools: str = "[]", memories: str = "[]") -> str:
-    """
-    Generate code or MCP workflow based on feedback loop and available tools.
-    """
-    tools_list = json.loads(available_tools)
-    tools_context = ""
-    if tools_list:
-        tools_context = "\n### AVAILABLE MCP TOOLS\n"
-        for t in tools_list:
-            tools_context += f"- {t['server']}:{t['name']}: {t['description']}\n"
-
-    memory_context = ""
-    mem_list = json.loads(memories)
-    if mem_list:
-        memory_context = "\n### RELEVANT PAST MEMORIES\n"
-        for m in mem_list:
-            content = m.get('content', '') or m.get('summary', '')
-            memory_context += f"- {content}\n"
-
-    system_prompt = f"""You are a professional {role} in an AI Team. 
-Your task is to generate either a single executable shell command OR a structured MCP Workflow JSON to achieve the goal.
+# Speculative mode: LLM_CANDIDATES > 1 asks for that many candidates in parallel,
+# one request per temperature, so a failed candidate can be replaced without
+# another diagnose/regenerate round-trip.
+CANDIDATE_TEMPERATURES = [float(t) for t in os.environ.get("LLM_CANDIDATE_TEMPERATURES", "0.2,0.5,0.8").split(",")]
 
-{tools_context}
-{memory_context}
+GENERATOR_TEMPLATE = PromptTemplate(
+    """You are a professional {role} in an AI Team.
+Your task is to generate either a single executable shell command OR a structured MCP Workflow JSON to achieve the goal.
 
 RULES for Output:
 1. If using standard shell: Output ONLY the command.
@@ -42,30 +32,95 @@ RULES for Output:
    }}
 3. NO markdown code blocks (```).
 4. NO explanations.
-"""
-
-    if attempt > 1:
-        user_prompt = f"""
-### REPAIR MISSION (Attempt {attempt})
+""",
+    first="{memory_context}Goal: {goal}\nContext: {context}",
+    repair="""{memory_context}### REPAIR MISSION (Attempt {attempt})
 Goal: {goal}
 Previous Error: {prev_error}
 Diagnosis & Suggested Fix: {suggested_fix}
 Context: {context}
 Please generate a NEW command or workflow that fixes the previous error.
-"""
-    else:
-        user_prompt = f"Goal: {goal}\nContext: {context}"
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    
+""",
+)
+
+
+@profiling.span("prompt")
+def build_messages(role: str, goal: str, context: str, attempt: int = 1, prev_error: str = "", suggested_fix: str = "", available_tools: str = "[]", memories: str = "[]", model: str = None):
+    model = model or os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    user = "repair" if attempt > 1 else "first"
+    if attempt <= 1:
+        prev_error, suggested_fix = "", ""
+
+    # Everything but the variable sections counts as fixed overhead for the budget.
+    empty = {"attempt": attempt, "memory_context": "", "goal": "", "prev_error": "", "suggested_fix": "", "context": ""}
+    fixed_tokens = GENERATOR_TEMPLATE.fixed_tokens(user, role, available_tools, goal, **empty)
+    sections, report = assemble_context(
+        goal, context, json.loads(memories), prev_error, suggested_fix, model=model, fixed_tokens=fixed_tokens
+    )
+    log_report(report)
+
+    return GENERATOR_TEMPLATE.messages(
+        user, role, available_tools, goal,
+        attempt=attempt,
+        memory_context=render_memories(sections["memories"]),
+        goal=sections["goal"],
+        prev_error=sections["prev_error"],
+        suggested_fix=sections["suggested_fix"],
+        context=sections["context"],
+    )
+
+def generate_code(role: str, goal: str, context: str, attempt: int = 1, prev_error: str = "", suggested_fix: str = "", available_tools: str = "[]", memories: str = "[]") -> str:
+    """
+    Generate code or MCP workflow based on feedback loop and available tools.
+    """
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    messages = build_messages(role, goal, context, attempt, prev_error, suggested_fix, available_tools, memories, model=model)
+    result = call_llm(messages, model=model, engine="generator")
+    return result.strip()
+
+async def agenerate_code(role: str, goal: str, context: str, attempt: int = 1, prev_error: str = "", suggested_fix: str = "", available_tools: str = "[]", memories: str = "[]") -> str:
+    """
+    Async variant of generate_code for callers running many generations in one process.
+    """
     model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
-    result = call_llm(messages, model=model)
+    messages = build_messages(role, goal, context, attempt, prev_error, suggested_fix, available_tools, memories, model=model)
+    result = await acall_llm(messages, model=model, engine="generator")
     return result.strip()
 
+def candidate_count(n=None) -> int:
+    return max(int(n or os.environ.get("LLM_CANDIDATES", "1")), 1)
+
+
+async def agenerate_candidates(role: str, goal: str, context: str, attempt: int = 1, prev_error: str = "", suggested_fix: str = "", available_tools: str = "[]", memories: str = "[]", n: int = None) -> list:
+    """
+    Generate up to n diverse candidates concurrently and return them ranked by the
+    local checks in candidate_checks: [{"code", "ok", "issues", "temperature"}, ...].
+    """
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    messages = build_messages(role, goal, context, attempt, prev_error, suggested_fix, available_tools, memories, model=model)
+    temperatures = [CANDIDATE_TEMPERATURES[i % len(CANDIDATE_TEMPERATURES)] for i in range(candidate_count(n))]
+    outputs = await asyncio.gather(*(
+        acall_llm(messages, model=model, temperature=t, engine="generator") for t in temperatures
+    ))
+    get_retriever().observe_usage(available_tools, goal, outputs)
+    ranked = rank_candidates(outputs, json.loads(available_tools), role, context)
+    for candidate in ranked:
+        candidate["temperature"] = temperatures[candidate.pop("index")]
+    return ranked
+
+
+def generate_candidates(*args, **kwargs) -> list:
+    return run_sync(agenerate_candidates(*args, **kwargs))
+
+
 if __name__ == "__main__":
+    profiling.mark("import")
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # JSONL on stdin: {"id": ..., "role": ..., "goal": ..., "context": ..., "attempt": ..., ...}
+        from engine_batch import main_batch
+        main_batch(agenerate_code, sys.argv)
+        sys.exit(0)
+
     # Extended arguments for tools
     role_arg = sys.argv[1] if len(sys.argv) > 1 else "Developer"
     goal_arg = sys.argv[2] if len(sys.argv) > 2 else ""
@@ -1,13 +1,15 @@
+import profiling
+import asyncio
 import sys
 import os
 import json
-from llm_client import call_llm
+from llm_client import call_llm_json, acall_llm_json
+import diagnosis_store
+from log_condenser import condense_file, condense_text, log_stats
+from prompt_templates import PromptTemplate
 
-def diagnose_error(error_output: str, context: str) -> str:
-    """
-    Diagnose execution errors and suggest fixes using NVIDIA hosted LLM.
-    """
-    system_prompt = """You are the Tester in an AI Team. 
+DIAGNOSER_TEMPLATE = PromptTemplate(
+    """You are the Tester in an AI Team.
 Your task is to analyze execution failures and suggest concrete fixes based on the P.R.O.M.P.T. framework.
 Adopt a "zero-trust" mindset and look for evidence in the context.
 
@@ -16,18 +18,17 @@ You must output a JSON object with the following fields:
 - isLogicError: Boolean, true if it's a logic flaw rather than a simple syntax/env error.
 - suggestedFix: A concrete suggestion or piece of code to fix the issue.
 
-Output format: ONLY a JSON object."""
+Output format: ONLY a JSON object.""",
+    default="Error: {error_output}\nContext: {context}",
+)
 
-    user_prompt = f"Error: {error_output}\nContext: {context}"
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    
-    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
-    result = call_llm(messages, model=model)
-    
+
+@profiling.span("prompt")
+def build_messages(error_output: str, context: str):
+    return DIAGNOSER_TEMPLATE.messages(error_output=error_output, context=context)
+
+@profiling.span("extract")
+def extract_diagnosis(result: str) -> str:
     try:
         start = result.find('{')
         end = result.rfind('}') + 1
@@ -41,9 +42,139 @@ Output format: ONLY a JSON object."""
             "suggestedFix": "Check logs manually"
         })
 
+def condense_error_output(error_output: str = "", error_path: str = None):
+    """
+    (text, stats): the error output condensed to LLM_ERROR_BUDGET tokens,
+    streamed from error_path ("-" for stdin) when given. stats is None when
+    the output was small enough to pass through unchanged.
+    """
+    with profiling.span("condense"):
+        return _condense(error_output, error_path)
+
+async def acondense_error_output(error_output: str = "", error_path: str = None):
+    """
+    condense_error_output in the default executor: a large log takes seconds
+    and would otherwise stall every request on the worker's event loop.
+    """
+    with profiling.span("condense"):
+        return await asyncio.get_running_loop().run_in_executor(None, _condense, error_output, error_path)
+
+def _condense(error_output, error_path):
+    text, stats = condense_file(error_path) if error_path else condense_text(error_output)
+    log_stats(stats)
+    return text, stats
+
+def with_condensation(result_json: str, stats) -> str:
+    # Tell the caller how much of its log the diagnosis was based on.
+    if stats is None:
+        return result_json
+    try:
+        data = json.loads(result_json)
+    except ValueError:
+        return result_json
+    return json.dumps({**data, "condensed": stats}) if isinstance(data, dict) else result_json
+
+@profiling.span("known_error")
+def lookup_known_error(error_output: str):
+    """
+    Return (fingerprint, normalized, cached_json) for an error; cached_json is None
+    when the fingerprint is unknown or its stored diagnosis has expired.
+    """
+    fingerprint, normalized = diagnosis_store.fingerprint_error(error_output)
+    if not diagnosis_store.is_enabled():
+        return fingerprint, normalized, None
+    cached = diagnosis_store.get_store().lookup(fingerprint)
+    if cached is None:
+        return fingerprint, normalized, None
+    return fingerprint, normalized, json.dumps({**cached, "fingerprint": fingerprint, "cached": True})
+
+def remember_diagnosis(fingerprint: str, normalized: str, diagnosis_json: str) -> str:
+    """
+    Store a fresh diagnosis under its fingerprint and tag the output with it.
+    """
+    try:
+        data = json.loads(diagnosis_json)
+    except ValueError:
+        return diagnosis_json
+    if not diagnosis_store.is_valid_diagnosis(data):
+        return diagnosis_json
+    if diagnosis_store.is_enabled():
+        diagnosis_store.get_store().record(fingerprint, normalized, data)
+    return json.dumps({**data, "fingerprint": fingerprint, "cached": False})
+
+async def alookup_known_error(error_output: str):
+    """
+    lookup_known_error run off the event loop: the store is SQLite and a lookup may write.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, lookup_known_error, error_output)
+
+async def aremember_diagnosis(fingerprint: str, normalized: str, diagnosis_json: str) -> str:
+    """
+    remember_diagnosis run off the event loop, so its commit does not stall other requests.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, remember_diagnosis, fingerprint, normalized, diagnosis_json)
+
+def diagnose_error(error_output: str, context: str, error_path: str = None) -> str:
+    """
+    Diagnose execution errors and suggest fixes using NVIDIA hosted LLM.
+    Known error fingerprints are answered from the local diagnosis store.
+    Large logs are condensed first (see log_condenser); pass error_path to
+    stream one from a file instead of holding it in memory.
+    """
+    error_output, condensed = condense_error_output(error_output, error_path)
+    fingerprint, normalized, cached = lookup_known_error(error_output)
+    if cached is not None:
+        return with_condensation(cached, condensed)
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    result = call_llm_json(build_messages(error_output, context), model=model, engine="diagnoser")
+    return with_condensation(remember_diagnosis(fingerprint, normalized, extract_diagnosis(result["content"])), condensed)
+
+async def adiagnose_error(error_output: str, context: str, error_path: str = None) -> str:
+    """
+    Async variant of diagnose_error for callers running many diagnoses in one process.
+    """
+    error_output, condensed = await acondense_error_output(error_output, error_path)
+    fingerprint, normalized, cached = await alookup_known_error(error_output)
+    if cached is not None:
+        return with_condensation(cached, condensed)
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    result = await acall_llm_json(build_messages(error_output, context), model=model, engine="diagnoser")
+    return with_condensation(await aremember_diagnosis(fingerprint, normalized, extract_diagnosis(result["content"])), condensed)
+
+def report_fix_outcome(fingerprint: str, worked: bool) -> dict:
+    """
+    Feed back whether the stored fix for a fingerprint worked on the next attempt.
+    """
+    store = diagnosis_store.get_store()
+    if worked:
+        store.confirm(fingerprint)
+    else:
+        store.invalidate(fingerprint)
+    return {"status": "success", "fingerprint": fingerprint, "worked": worked}
+
+async def areport_fix_outcome(fingerprint: str, worked: bool) -> dict:
+    """
+    report_fix_outcome run off the event loop, like aremember_diagnosis.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, report_fix_outcome, fingerprint, worked)
+
 if __name__ == "__main__":
+    profiling.mark("import")
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # JSONL on stdin: {"id": ..., "error_output": ..., "context": ...}
+        from engine_batch import main_batch
+        main_batch(adiagnose_error, sys.argv)
+        sys.exit(0)
+
+    if len(sys.argv) > 3 and sys.argv[1] == "--error-file":
+        # Logs too large for argv: read from a file, or from stdin with "-".
+        print(diagnose_error("", sys.argv[3], error_path=sys.argv[2]))
+        sys.exit(0)
+
     if len(sys.argv) < 3:
         print("Usage: python3 llm_error_diagnoser.py <error_output> <context>")
+        print("       python3 llm_error_diagnoser.py --error-file <path | -> <context>")
+        print("       python3 llm_error_diagnoser.py --batch [--concurrency N] < requests.jsonl")
         sys.exit(1)
         
     error_arg = sys.argv[1]
@@ -0,0 +1,188 @@
+import profiling
+import asyncio
+import sys
+import os
+import json
+from llm_client import acall_llm_json, run_sync
+from context_assembler import assemble_context, log_report, trim_head_tail
+from prompt_templates import PromptTemplate, render_memories
+from candidate_checks import rank_candidates
+from tool_index import get_retriever
+from llm_code_generator import CANDIDATE_TEMPERATURES, candidate_count, agenerate_candidates
+from llm_error_diagnoser import (
+    extract_diagnosis, alookup_known_error, aremember_diagnosis, adiagnose_error, acondense_error_output, with_condensation,
+)
+
+# Fused diagnose-and-repair: one completion returns the Tester's diagnosis fields
+# together with the replacement command/workflow, instead of a diagnoser call
+# followed by a generator call that re-sends the same context.
+# If the fused output is unusable the separate engines are used as before.
+
+MAX_PREV_COMMAND_TOKENS = 500
+
+
+REPAIR_TEMPLATE = PromptTemplate(
+    """You are a professional {role} in an AI Team, acting as both Tester and fixer.
+The previous command or workflow failed. Analyze the failure with a "zero-trust" mindset, looking for evidence in the context, then produce a replacement that achieves the goal.
+
+You must output a JSON object with the following fields:
+- diagnosis: A clear explanation of what went wrong.
+- isLogicError: Boolean, true if it's a logic flaw rather than a simple syntax/env error.
+- suggestedFix: A concrete suggestion describing the fix.
+- command: EITHER a single executable shell command as a string, OR an MCP workflow object:
+   {{
+     "type": "workflow",
+     "plan": {{
+       "taskId": "dynamic-id",
+       "steps": [
+         {{ "id": "s1", "server": "server_name", "tool": "tool_name", "arguments": {{...}} }}
+       ]
+     }}
+   }}
+
+Output format: ONLY a JSON object. NO markdown code blocks (```). NO explanations outside the JSON.
+""",
+    default="""{memory_context}### REPAIR MISSION (Attempt {attempt})
+Goal: {goal}
+Previous Command: {prev_command}
+Error: {error_output}
+Context: {context}
+""",
+)
+
+
+@profiling.span("prompt")
+def build_messages(role: str, goal: str, context: str, error_output: str, prev_command: str = "", attempt: int = 2, available_tools: str = "[]", memories: str = "[]", model: str = None):
+    model = model or os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    prev_command = trim_head_tail(prev_command or "", MAX_PREV_COMMAND_TOKENS)
+    empty = {"attempt": attempt, "memory_context": "", "goal": "", "prev_command": prev_command, "error_output": "", "context": ""}
+    fixed_tokens = REPAIR_TEMPLATE.fixed_tokens("default", role, available_tools, goal, **empty)
+    sections, report = assemble_context(
+        goal, context, json.loads(memories), prev_error=error_output, model=model, fixed_tokens=fixed_tokens
+    )
+    log_report(report)
+
+    return REPAIR_TEMPLATE.messages(
+        "default", role, available_tools, goal,
+        attempt=attempt,
+        memory_context=render_memories(sections["memories"]),
+        goal=sections["goal"],
+        prev_command=prev_command,
+        error_output=sections["prev_error"],
+        context=sections["context"],
+    )
+
+
+@profiling.span("extract")
+def parse_repair(content: str):
+    """
+    Split a fused completion into (diagnosis_json, command); either is None when
+    missing or malformed.
+    """
+    try:
+        data = json.loads(extract_diagnosis(content))
+    except ValueError:
+        return None, None
+    if not isinstance(data, dict):
+        return None, None
+
+    command = data.pop("command", None)
+    if isinstance(command, dict):
+        command = json.dumps(command, ensure_ascii=False)
+    elif not isinstance(command, str) or not command.strip():
+        command = None
+
+    if "diagnosis" not in data or "suggestedFix" not in data:
+        return None, command
+    return json.dumps(data, ensure_ascii=False), command
+
+
+async def _fallback(role, goal, context, error_output, attempt, available_tools, memories, n, diagnosis_json=None):
+    """
+    The two-call path: diagnoser (unless a diagnosis is already known), then generator.
+    """
+    if diagnosis_json is None:
+        diagnosis_json = await adiagnose_error(error_output, context)
+    try:
+        suggested_fix = json.loads(diagnosis_json).get("suggestedFix", "")
+    except (ValueError, AttributeError):
+        suggested_fix = ""
+    candidates = await agenerate_candidates(
+        role, goal, context, attempt, error_output, suggested_fix, available_tools, memories, n=n
+    )
+    return {"diagnosis": diagnosis_json, "candidates": candidates, "fused": False}
+
+
+def _condensed(result, stats):
+    result["diagnosis"] = with_condensation(result["diagnosis"], stats)
+    return result
+
+
+async def arepair(role: str, goal: str, context: str, error_output: str, prev_command: str = "", attempt: int = 2, available_tools: str = "[]", memories: str = "[]", n: int = None, error_path: str = None) -> dict:
+    """
+    Diagnose a failed attempt and generate its replacement in one completion.
+
+    Returns {"diagnosis": <diagnoser-style JSON string>, "candidates": [...], "fused": bool};
+    candidates have the same shape as llm_code_generator.agenerate_candidates.
+    A diagnosis already in the store skips straight to the generator.
+    Large error output is condensed first, as for the diagnoser; error_path
+    streams it from a file instead.
+    """
+    error_output, condensed = await acondense_error_output(error_output, error_path)
+    fingerprint, normalized, cached = await alookup_known_error(error_output)
+    if cached is not None:
+        return _condensed(await _fallback(role, goal, context, error_output, attempt, available_tools, memories, n, cached), condensed)
+
+    model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
+    messages = build_messages(role, goal, context, error_output, prev_command, attempt, available_tools, memories, model=model)
+    temperatures = [CANDIDATE_TEMPERATURES[i % len(CANDIDATE_TEMPERATURES)] for i in range(candidate_count(n))]
+    results = await asyncio.gather(*(
+        acall_llm_json(messages, model=model, temperature=t, engine="repair") for t in temperatures
+    ))
+
+    diagnosis_json, commands = None, []
+    for result in results:
+        diagnosis, command = parse_repair(result["content"])
+        if diagnosis_json is None and diagnosis is not None:
+            diagnosis_json = diagnosis
+        commands.append(command or "")
+
+    if diagnosis_json is None or not any(commands):
+        print("Fused repair output unusable, falling back to diagnoser + generator", file=sys.stderr)
+        return _condensed(await _fallback(role, goal, context, error_output, attempt, available_tools, memories, n), condensed)
+
+    get_retriever().observe_usage(available_tools, goal, commands)
+    ranked = rank_candidates(commands, json.loads(available_tools), role, context)
+    for candidate in ranked:
+        candidate["temperature"] = temperatures[candidate.pop("index")]
+    return {
+        "diagnosis": with_condensation(await aremember_diagnosis(fingerprint, normalized, diagnosis_json), condensed),
+        "candidates": ranked,
+        "fused": True,
+    }
+
+
+def repair(*args, **kwargs) -> dict:
+    return run_sync(arepair(*args, **kwargs))
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # JSONL on stdin: {"id": ..., "role": ..., "goal": ..., "context": ..., "error_output": ..., "prev_command": ..., ...}
+        from engine_batch import main_batch
+        main_batch(arepair, sys.argv)
+        sys.exit(0)
+
+    if len(sys.argv) < 5:
+        print("Usage: python3 llm_repair.py <role> <goal> <context> <error_output> [prev_command] [attempt] [available_tools] [memories]")
+        print("       python3 llm_repair.py --batch [--concurrency N] < requests.jsonl")
+        sys.exit(1)
+
+    role_arg, goal_arg, context_arg, error_arg = sys.argv[1:5]
+    prev_arg = sys.argv[5] if len(sys.argv) > 5 else ""
+    attempt_arg = int(sys.argv[6]) if len(sys.argv) > 6 and sys.argv[6] else 2
+    tools_arg = sys.argv[7] if len(sys.argv) > 7 else "[]"
+    mem_arg = sys.argv[8] if len(sys.argv) > 8 else "[]"
+
+    print(json.dumps(repair(role_arg, goal_arg, context_arg, error_arg, prev_arg, attempt_arg, tools_arg, mem_arg), ensure_ascii=False))
@@ -0,0 +1,359 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+import llm_scheduler
+
+# Request routing for llm_client: endpoint/model failover, per-attempt
+# deadlines, jittered exponential retry, hedged requests and per-endpoint
+# circuit breakers. The OpenAI clients are built with max_retries=0 so this
+# module is the only retry policy.
+#
+# Routes are (endpoint, model) pairs: the requested model on every endpoint in
+# LLM_ENDPOINTS (default NVIDIA_API_BASE_URL), then each LLM_FALLBACK_MODELS
+# entry the same way. Hedging is async-only; the sync path (CLI mode) retries
+# and fails over but never runs two requests at once.
+#
+# Every attempt, hedges included, first takes its slot from llm_scheduler for
+# the (endpoint, model) it is about to hit; a shed request is not retried.
+
+DEFAULT_BASE_URL = "https://integrate.api.nvidia.com/v1"
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "TimeoutError", "ConnectionError"}
+
+
+def _env_list(name):
+    return [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+
+
+def endpoints():
+    return _env_list("LLM_ENDPOINTS") or [os.environ.get("NVIDIA_API_BASE_URL", DEFAULT_BASE_URL)]
+
+
+def routes_for(model):
+    models = [model] + [m for m in _env_list("LLM_FALLBACK_MODELS") if m != model]
+    return [(base_url, m) for m in models for base_url in endpoints()]
+
+
+def settings():
+    return {
+        "max_attempts": int(os.environ.get("LLM_MAX_ATTEMPTS", "3")),
+        "attempt_timeout": float(os.environ.get("LLM_ATTEMPT_TIMEOUT", "60")),
+        "backoff_base": float(os.environ.get("LLM_BACKOFF_BASE", "0.5")),
+        "backoff_max": float(os.environ.get("LLM_BACKOFF_MAX", "8")),
+        "hedge_percentile": float(os.environ.get("LLM_HEDGE_PERCENTILE", "95")),
+        "hedge_min_delay": float(os.environ.get("LLM_HEDGE_MIN_DELAY", "1")),
+        "hedge_min_samples": int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20")),
+        "hedging": os.environ.get("LLM_HEDGING", "1") != "0",
+    }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failures; after `cooldown` seconds one
+    trial request is let through (half-open) and its outcome closes or reopens it.
+    """
+
+    def __init__(self, failures=None, cooldown=None):
+        self.failures = failures or int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+        self.cooldown = cooldown or float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = "closed"
+            self.consecutive = 0
+
+    def release(self):
+        # A half-open trial that was cancelled: let the next request try again.
+        with self.lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def failure(self):
+        with self.lock:
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    Recent successful attempt latencies, used to decide when to hedge.
+    """
+
+    def __init__(self, size=200):
+        self.samples = {}
+        self.size = size
+        self.lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self.lock:
+            self.samples.setdefault(key, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, key, pct, min_samples):
+        with self.lock:
+            samples = sorted(self.samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(len(samples) * pct / 100), len(samples) - 1)]
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_latencies = LatencyTracker()
+_counters = {"calls": 0, "attempts": 0, "retries": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0,
+             "deadline_exceeded": 0, "breaker_skips": 0, "exhausted": 0}
+_endpoint_counters = {}
+_counters_lock = threading.Lock()
+
+
+def breaker(base_url) -> CircuitBreaker:
+    with _breakers_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker()
+        return _breakers[base_url]
+
+
+def _count(name, base_url=None, amount=1):
+    with _counters_lock:
+        _counters[name] = _counters.get(name, 0) + amount
+        if base_url is not None:
+            per = _endpoint_counters.setdefault(base_url, {"attempts": 0, "failures": 0, "hedges": 0})
+            if name in per:
+                per[name] += amount
+
+
+def stats():
+    with _counters_lock:
+        result = {**_counters, "endpoints": {url: dict(c) for url, c in _endpoint_counters.items()}}
+    for url, b in list(_breakers.items()):
+        result["endpoints"].setdefault(url, {}).update({"breaker": b.state, "breaker_trips": b.trips})
+    return result
+
+
+def is_retryable(exc) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__) or isinstance(exc, asyncio.TimeoutError)
+
+
+def backoff_delay(attempt, exc, conf) -> float:
+    """
+    Full-jitter exponential backoff; a Retry-After header wins when it is longer.
+    """
+    delay = random.uniform(0, min(conf["backoff_max"], conf["backoff_base"] * (2 ** attempt)))
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, min(float(retry_after), conf["backoff_max"])) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+class NoRouteAvailable(Exception):
+    pass
+
+
+def _next_route(routes, start, exclude=None):
+    """
+    First route at or after `start` (wrapping) whose endpoint breaker allows a request.
+    """
+    for offset in range(len(routes)):
+        index = (start + offset) % len(routes)
+        if routes[index] == exclude:
+            continue
+        if breaker(routes[index][0]).allow():
+            return index
+        _count("breaker_skips")
+    return None
+
+
+def _request(request_args, model, stream, timeout):
+    return {**request_args, "model": model, "stream": stream, "timeout": timeout}
+
+
+def _latency_key(request_args, stream):
+    return (request_args.get("model"), stream)
+
+
+def create(get_client, request_args, stream=False, info=None, engine=None):
+    """
+    chat.completions.create with failover, per-attempt deadlines and retry.
+    `info` (a dict) is filled with the route used, attempts and failovers;
+    `engine` picks the llm_scheduler priority class.
+    """
+    conf = settings()
+    routes = routes_for(request_args["model"])
+    info = info if info is not None else {}
+    info.update({"attempts": 0, "failovers": 0, "hedged": False})
+    _count("calls")
+    index, last_route, last_exc = 0, None, None
+    for attempt in range(conf["max_attempts"]):
+        found = _next_route(routes, index)
+        if found is None:
+            break
+        if last_route is not None and routes[found] != last_route:
+            info["failovers"] += 1
+            _count("failovers")
+        index = found
+        last_route = routes[index]
+        base_url, model = routes[index]
+        info.update({"endpoint": base_url, "model": model})
+        info["attempts"] += 1
+        _count("attempts", base_url)
+        if attempt:
+            _count("retries")
+        llm_scheduler.acquire_sync(engine, base_url, model, llm_scheduler.request_tokens(request_args))
+        started = time.monotonic()
+        try:
+            response = get_client(base_url).chat.completions.create(**_request(request_args, model, stream, conf["attempt_timeout"]))
+            breaker(base_url).success()
+            _latencies.observe(_latency_key(request_args, stream), time.monotonic() - started)
+            return response
+        except Exception as e:
+            last_exc = e
+            if not is_retryable(e):
+                # Client errors (bad request, auth) say nothing about endpoint health.
+                raise
+            breaker(base_url).failure()
+            _count("failures", base_url)
+            if type(e).__name__ == "APITimeoutError":
+                _count("deadline_exceeded")
+            index += 1
+            if attempt + 1 < conf["max_attempts"]:
+                time.sleep(backoff_delay(attempt, e, conf))
+    _count("exhausted")
+    raise last_exc or NoRouteAvailable("All LLM endpoints are unavailable (circuit breakers open)")
+
+
+async def _attempt(get_client, request_args, route, stream, conf, engine):
+    base_url, model = route
+    await llm_scheduler.acquire(engine, base_url, model, llm_scheduler.request_tokens(request_args))
+    _count("attempts", base_url)
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            get_client(base_url).chat.completions.create(**_request(request_args, model, stream, conf["attempt_timeout"])),
+            timeout=conf["attempt_timeout"],
+        )
+    except asyncio.CancelledError:
+        # Lost a hedge race: not the endpoint's fault.
+        breaker(base_url).release()
+        raise
+    except Exception as e:
+        if not is_retryable(e):
+            raise
+        breaker(base_url).failure()
+        _count("failures", base_url)
+        if isinstance(e, asyncio.TimeoutError) or type(e).__name__ == "APITimeoutError":
+            _count("deadline_exceeded")
+        raise
+    breaker(base_url).success()
+    _latencies.observe(_latency_key(request_args, stream), time.monotonic() - started)
+    return response
+
+
+async def _discard(task, stream):
+    # A hedge loser that finished anyway still holds an open stream.
+    if stream and not task.cancelled() and task.exception() is None:
+        await task.result().close()
+
+
+async def _hedged(get_client, request_args, routes, index, stream, conf, info, engine):
+    """
+    Run one attempt on routes[index]; if it is slower than the recent latency
+    percentile, race a duplicate on the next available route.
+    """
+    primary = asyncio.ensure_future(_attempt(get_client, request_args, routes[index], stream, conf, engine))
+    delay = None
+    if conf["hedging"]:
+        delay = _latencies.percentile(_latency_key(request_args, stream), conf["hedge_percentile"], conf["hedge_min_samples"])
+    if delay is None or len(routes) < 2:
+        return await primary, routes[index]
+
+    done, _ = await asyncio.wait({primary}, timeout=max(delay, conf["hedge_min_delay"]))
+    if done:
+        return primary.result(), routes[index]
+    # Only now consult the breakers: allow() may move one to half-open.
+    hedge_index = _next_route(routes, index + 1, exclude=routes[index])
+    if hedge_index is None:
+        return await primary, routes[index]
+
+    hedge = asyncio.ensure_future(_attempt(get_client, request_args, routes[hedge_index], stream, conf, engine))
+    info["hedged"] = True
+    info["attempts"] += 1
+    _count("hedges", routes[hedge_index][0])
+    owners = {primary: routes[index], hedge: routes[hedge_index]}
+    pending = {primary, hedge}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        winners = [t for t in done if t.exception() is None]
+        if winners:
+            winner = winners[0]
+            for task in pending:
+                task.cancel()
+            for task in done:
+                if task is not winner:
+                    await _discard(task, stream)
+            if winner is hedge:
+                _count("hedge_wins")
+            return winner.result(), owners[winner]
+    raise primary.exception() or hedge.exception()
+
+
+async def acreate(get_client, request_args, stream=False, info=None, engine=None):
+    """
+    Async counterpart of create, with hedged requests.
+    """
+    conf = settings()
+    routes = routes_for(request_args["model"])
+    info = info if info is not None else {}
+    info.update({"attempts": 0, "failovers": 0, "hedged": False})
+    _count("calls")
+    index, last_route, last_exc = 0, None, None
+    for attempt in range(conf["max_attempts"]):
+        found = _next_route(routes, index)
+        if found is None:
+            break
+        if last_route is not None and routes[found] != last_route:
+            info["failovers"] += 1
+            _count("failovers")
+        index = found
+        last_route = routes[index]
+        info["attempts"] += 1
+        if attempt:
+            _count("retries")
+        try:
+            response, (base_url, model) = await _hedged(get_client, request_args, routes, index, stream, conf, info, engine)
+            info.update({"endpoint": base_url, "model": model})
+            return response
+        except Exception as e:
+            last_exc = e
+            info.update({"endpoint": routes[index][0], "model": routes[index][1]})
+            if not is_retryable(e):
+                raise
+            index += 1
+            if attempt + 1 < conf["max_attempts"]:
+                await asyncio.sleep(backoff_delay(attempt, e, conf))
+    _count("exhausted")
+    raise last_exc or NoRouteAvailable("All LLM endpoints are unavailable (circuit breakers open)")
@@ -0,0 +1,337 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+# Outbound rate scheduling for every LLM request a Python process makes.
+# Each (endpoint, model) pair gets a request/s and a token/s bucket; callers
+# that cannot be served at once wait in a priority queue (arbitration >
+# diagnosis > generation > memorize), bounded per class and shed once their
+# deadline passes. Provider rate-limit headers (x-ratelimit-*, Retry-After)
+# pause or drain the buckets so the local view never runs ahead of the
+# provider's.
+#
+# Limits come from LLM_RATE_RPS / LLM_RATE_TPS (0 = unlimited), with per-model
+# overrides in LLM_RATE_LIMITS ("model=rps:tps,..."). They describe the whole
+# provider quota; each resident worker takes 1/LLM_WORKER_POOL_SIZE of it.
+
+PRIORITIES = {"arbitration": 0, "diagnosis": 1, "generation": 2, "memorize": 3}
+ENGINE_CLASSES = {
+    "arbitrator": "arbitration",
+    "diagnoser": "diagnosis",
+    "repair": "diagnosis",
+    "generator": "generation",
+    "memorize": "memorize",
+}
+DEFAULT_MAX_WAIT = {"arbitration": 60, "diagnosis": 30, "generation": 30, "memorize": 300}
+
+# The limiter serving the request running in the current context, so the
+# httpx response hooks can feed its headers back.
+_current = contextvars.ContextVar("llm_rate_limiter", default=None)
+_share = 1
+
+
+class SchedulerRejected(Exception):
+    """
+    Raised when a request is shed: its class queue is full or it waited past its deadline.
+    """
+
+
+def set_share(processes):
+    """
+    Split the configured limits across `processes` processes drawing on the
+    same quota. Call before the first request.
+    """
+    global _share
+    _share = max(int(processes), 1)
+
+
+def priority_class(engine) -> str:
+    return ENGINE_CLASSES.get(engine or "", "generation")
+
+
+def max_wait(cls) -> float:
+    override = os.environ.get(f"LLM_SCHEDULER_MAX_WAIT_{cls.upper()}")
+    return float(override) if override else DEFAULT_MAX_WAIT[cls]
+
+
+def _limits_for(model):
+    rps = float(os.environ.get("LLM_RATE_RPS", "0"))
+    tps = float(os.environ.get("LLM_RATE_TPS", "0"))
+    for item in os.environ.get("LLM_RATE_LIMITS", "").split(","):
+        name, _, spec = item.strip().rpartition("=")
+        if name and name == model:
+            rps_s, _, tps_s = spec.partition(":")
+            rps = float(rps_s or rps)
+            tps = float(tps_s or tps)
+    return rps / _share, tps / _share
+
+
+def _parse_duration(value):
+    """
+    Seconds from a header value: "12", "1.5", "20ms", "6m0s" or "1h2m3s".
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """
+    Refills at `rate` per second up to `burst`; rate 0 means unlimited.
+    """
+
+    def __init__(self, rate, burst_seconds):
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        if self.rate <= 0:
+            return 0.0
+        # Requests larger than the bucket go through once it is full.
+        needed = min(amount, self.capacity) - self.level
+        return max(needed / self.rate, 0.0)
+
+    def take(self, amount):
+        if self.rate > 0:
+            self.level -= amount
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "tokens", "deadline", "cls", "enqueued")
+
+    def __init__(self, priority, seq, future, tokens, deadline, cls, enqueued):
+        self.priority, self.seq, self.future = priority, seq, future
+        self.tokens, self.deadline, self.cls, self.enqueued = tokens, deadline, cls, enqueued
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RateLimiter:
+    """
+    Buckets and priority queue for one (endpoint, model) pair.
+    """
+
+    def __init__(self, endpoint, model):
+        self.endpoint, self.model = endpoint, model
+        rps, tps = _limits_for(model)
+        burst = float(os.environ.get("LLM_RATE_BURST_SECONDS", "1"))
+        self.requests = TokenBucket(rps, burst)
+        self.tokens = TokenBucket(tps, burst)
+        self.paused_until = 0.0
+        self.queue_limit = int(os.environ.get("LLM_SCHEDULER_QUEUE_LIMIT", "64"))
+        self.waiters = []
+        self.seq = itertools.count()
+        self.pump = None
+        self.lock = threading.Lock()
+        self.counters = {cls: {"granted": 0, "shed_deadline": 0, "shed_queue_full": 0, "queued": 0,
+                               "wait_sum": 0.0, "wait_max": 0.0} for cls in PRIORITIES}
+        self.pauses = 0
+
+    def _wait_time(self, tokens, now):
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.paused_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _grant(self, cls, tokens, waited):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        c = self.counters[cls]
+        c["granted"] += 1
+        c["wait_sum"] += waited
+        c["wait_max"] = max(c["wait_max"], waited)
+
+    def _shed(self, cls, reason):
+        self.counters[cls][f"shed_{reason}"] += 1
+        return SchedulerRejected(f"LLM request shed ({reason}) for {self.model} at {self.endpoint}")
+
+    def _depth(self, cls):
+        return sum(1 for w in self.waiters if w.cls == cls)
+
+    def _drop_expired(self, now):
+        # Caller holds self.lock.
+        kept = []
+        for w in self.waiters:
+            if w.future.done():
+                continue
+            if w.deadline <= now:
+                w.future.get_loop().call_soon_threadsafe(_reject, w.future, self._shed(w.cls, "deadline"))
+                continue
+            kept.append(w)
+        if len(kept) != len(self.waiters):
+            heapq.heapify(kept)
+            self.waiters = kept
+
+    async def _run_pump(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._drop_expired(now)
+                if not self.waiters:
+                    self.pump = None
+                    return
+                head = self.waiters[0]
+                wait = self._wait_time(head.tokens, now)
+                if wait <= 0:
+                    heapq.heappop(self.waiters)
+                    self._grant(head.cls, head.tokens, now - head.enqueued)
+                    head.future.get_loop().call_soon_threadsafe(_resolve, head.future)
+                    continue
+                sleep = min(wait, min(w.deadline for w in self.waiters) - now)
+            await asyncio.sleep(max(sleep, 0.001))
+
+    async def acquire(self, cls, tokens):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            now = time.monotonic()
+            if not self.waiters and self._wait_time(tokens, now) <= 0:
+                self._grant(cls, tokens, 0.0)
+                return
+            if self._depth(cls) >= self.queue_limit:
+                raise self._shed(cls, "queue_full")
+            waiter = _Waiter(PRIORITIES[cls], next(self.seq), loop.create_future(), tokens, now + max_wait(cls), cls, now)
+            heapq.heappush(self.waiters, waiter)
+            self.counters[cls]["queued"] += 1
+            if self.pump is None or self.pump.done():
+                self.pump = asyncio.ensure_future(self._run_pump())
+        await waiter.future
+
+    def acquire_sync(self, cls, tokens):
+        """
+        Blocking acquire for threads and the CLI path. It waits behind queued
+        async callers but is not itself ordered by priority.
+        """
+        started = time.monotonic()
+        deadline = started + max_wait(cls)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self._wait_time(tokens, now)
+                if wait <= 0 and not self.waiters:
+                    self._grant(cls, tokens, now - started)
+                    return
+                if now + wait > deadline:
+                    raise self._shed(cls, "deadline")
+            time.sleep(max(wait, 0.01))
+
+    def observe(self, status, headers):
+        """
+        Fold a provider response's rate-limit headers into the buckets.
+        """
+        now = time.monotonic()
+        with self.lock:
+            pause = None
+            if status == 429:
+                pause = _parse_duration(headers.get("retry-after")) or 1.0
+            if headers.get("x-ratelimit-remaining-requests") == "0":
+                pause = max(pause or 0, _parse_duration(headers.get("x-ratelimit-reset-requests")) or 1.0)
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None and self.tokens.rate > 0:
+                try:
+                    self.tokens.refill(now)
+                    self.tokens.level = min(self.tokens.level, float(remaining_tokens))
+                except ValueError:
+                    pass
+            if pause:
+                self.paused_until = max(self.paused_until, now + pause)
+                self.pauses += 1
+
+    def stats(self):
+        with self.lock:
+            classes = {}
+            for cls, c in self.counters.items():
+                classes[cls] = {
+                    "depth": self._depth(cls),
+                    "granted": c["granted"],
+                    "queued": c["queued"],
+                    "shed_deadline": c["shed_deadline"],
+                    "shed_queue_full": c["shed_queue_full"],
+                    "mean_wait": c["wait_sum"] / c["granted"] if c["granted"] else 0.0,
+                    "max_wait": c["wait_max"],
+                }
+            return {
+                "rps": self.requests.rate,
+                "tps": self.tokens.rate,
+                "paused_for": max(self.paused_until - time.monotonic(), 0.0),
+                "pauses": self.pauses,
+                "classes": classes,
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _reject(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(endpoint, model) -> RateLimiter:
+    key = (endpoint, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(endpoint, model)
+        return _limiters[key]
+
+
+def request_tokens(request_args) -> int:
+    # Providers charge the token bucket for max_tokens up front, so do the same.
+    from context_assembler import estimate_tokens
+    prompt = "".join(m.get("content", "") or "" for m in request_args.get("messages", []))
+    return estimate_tokens(prompt) + (request_args.get("max_tokens") or 0)
+
+
+async def acquire(engine, endpoint, model, tokens):
+    rate_limiter = limiter(endpoint, model)
+    await rate_limiter.acquire(priority_class(engine), tokens)
+    _current.set(rate_limiter)
+
+
+def acquire_sync(engine, endpoint, model, tokens):
+    rate_limiter = limiter(endpoint, model)
+    rate_limiter.acquire_sync(priority_class(engine), tokens)
+    _current.set(rate_limiter)
+
+
+def observe_response(response):
+    # httpx response event hook; headers are available before the body is read.
+    rate_limiter = _current.get()
+    if rate_limiter is not None and response.request.url.path.endswith("/chat/completions"):
+        rate_limiter.observe(response.status_code, response.headers)
+
+
+async def aobserve_response(response):
+    observe_response(response)
+
+
+def stats():
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {f"{endpoint}|{model}": rl.stats() for (endpoint, model), rl in items}
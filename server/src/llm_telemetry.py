@@ -0,0 +1,383 @@
+import profiling
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from context_assembler import estimate_tokens
+
+# Per-call telemetry for llm_client: one JSON line per LLM call (model, engine,
+# token counts, latency, time-to-first-token, retries, outcome) appended to
+# LLM_TELEMETRY_PATH. The JSONL file is the source of truth; Prometheus text is
+# rendered from it incrementally (worker RPC or the `prom` CLI action), so
+# every worker process contributes to one set of counters. Past
+# LLM_TELEMETRY_MAX_BYTES the file is rotated to <path>.1 (one generation kept).
+
+DEFAULT_TELEMETRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "llm_telemetry.jsonl")
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 5, 10, 30, 60, 120]
+
+# HTTP attempts of the call running in the current context; the httpx event
+# hooks installed by llm_client bump it, so retries = attempts - 1.
+_attempts = contextvars.ContextVar("llm_attempts", default=None)
+# Task the calls in the current context are made for (see task()).
+_task = contextvars.ContextVar("llm_task", default=None)
+
+
+def is_enabled() -> bool:
+    return os.environ.get("LLM_TELEMETRY", "1") != "0"
+
+
+def telemetry_path() -> str:
+    return os.environ.get("LLM_TELEMETRY_PATH", DEFAULT_TELEMETRY_PATH)
+
+
+def max_bytes() -> int:
+    return int(os.environ.get("LLM_TELEMETRY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+@contextlib.contextmanager
+def task(task_id):
+    """
+    Attribute the LLM calls made in this context (and the tasks it spawns) to task_id.
+    """
+    token = _task.set(task_id)
+    try:
+        yield
+    finally:
+        _task.reset(token)
+
+
+def start_call():
+    counter = [0]
+    _attempts.set(counter)
+    return counter
+
+
+def count_attempt(request=None):
+    counter = _attempts.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+async def acount_attempt(request=None):
+    count_attempt(request)
+
+
+def _usage_fields(usage):
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "tokens_estimated": False,
+    }
+
+
+def _prefix_tokens(request_args):
+    messages = request_args.get("messages") or []
+    if messages and messages[0].get("role") == "system":
+        return estimate_tokens(messages[0].get("content", "") or "")
+    return 0
+
+
+def _estimated_fields(request_args, completion_text):
+    # Streams stop as soon as the JSON object is complete, before the provider's
+    # usage chunk, so token counts are estimated locally (unless LLM_STREAM_USAGE=1).
+    prompt = "".join(m.get("content", "") or "" for m in request_args.get("messages", []))
+    return {
+        "prompt_tokens": estimate_tokens(prompt),
+        "completion_tokens": estimate_tokens(completion_text or ""),
+        "cached_tokens": 0,
+        "tokens_estimated": True,
+    }
+
+
+def _open_for_append(path):
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+    fd = os.open(path, flags, 0o644)
+    limit = max_bytes()
+    if not limit or os.fstat(fd).st_size < limit:
+        return fd
+    try:
+        # Another worker may have rotated already: only move the file this fd still names.
+        if os.stat(path).st_ino == os.fstat(fd).st_ino:
+            os.replace(path, path + ".1")
+    except FileNotFoundError:
+        pass
+    finally:
+        os.close(fd)
+    return os.open(path, flags, 0o644)
+
+
+def record_call(request_args, engine, outcome, started, counter=None, usage=None, completion_text=None,
+                ttft=None, stream=False, error=None, route=None, task_id=None):
+    """
+    Append one call record. outcome is one of success, incomplete, error,
+    cache_hit, coalesced or no_key. route is the info dict filled by llm_routing.
+    task_id defaults to the one set by task().
+    Never raises: telemetry must not fail an LLM call.
+    """
+    if not is_enabled():
+        return
+    record = {
+        "ts": time.time(),
+        "engine": engine or "default",
+        "model": request_args.get("model"),
+        "outcome": outcome,
+        "stream": stream,
+        "latency": round(time.monotonic() - started, 4),
+        "ttft": round(ttft, 4) if ttft is not None else None,
+        "retries": max(counter[0] - 1, 0) if counter else 0,
+        # The system message is the cacheable prefix (see prompt_templates).
+        "prefix_tokens": _prefix_tokens(request_args),
+    }
+    if route:
+        record.update({
+            "model": route.get("model", record["model"]),
+            "endpoint": route.get("endpoint"),
+            "hedged": route.get("hedged", False),
+            "failovers": route.get("failovers", 0),
+            # Attempts made by llm_routing, not counting the hedge duplicate.
+            "retries": max(route.get("attempts", 1) - 1 - int(route.get("hedged", False)), 0),
+        })
+    if outcome in ("cache_hit", "coalesced", "no_key"):
+        record.update({"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "tokens_estimated": False})
+    elif usage is not None:
+        record.update(_usage_fields(usage))
+    else:
+        record.update(_estimated_fields(request_args, completion_text))
+    if error:
+        record["error"] = error
+    task_id = task_id or _task.get()
+    if task_id:
+        record["task_id"] = task_id
+    try:
+        path = telemetry_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # A single O_APPEND write keeps lines from concurrent workers intact.
+        fd = _open_for_append(path)
+        try:
+            os.write(fd, (json.dumps(record) + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"Telemetry write error: {e}", file=sys.stderr)
+
+
+class TelemetryAggregator:
+    """
+    Folds the telemetry JSONL into counters, reading only lines appended since
+    the last refresh. The counters and the byte-offset watermark are saved next
+    to the file (<path>.state.json), so a new process carries on from there.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or telemetry_path()
+        self.state_path = f"{self.path}.state.json"
+        self.offset = 0
+        self.inode = None
+        self.series = {}
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.offset, self.inode = state["offset"], state["inode"]
+            self.series = {(engine, model): s for engine, model, s in state["series"]}
+        except (OSError, ValueError, KeyError, TypeError):
+            self.offset, self.inode, self.series = 0, None, {}
+        return self
+
+    def save(self):
+        state = {"offset": self.offset, "inode": self.inode,
+                 "series": [[engine, model, s] for (engine, model), s in self.series.items()]}
+        # Per-process temp name: several workers may save at once; the last rename wins.
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            print(f"Telemetry state write error: {e}", file=sys.stderr)
+
+    def _series(self, engine, model):
+        key = (engine, model)
+        if key not in self.series:
+            self.series[key] = {
+                "calls": {}, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "retries": 0,
+                "hedges": 0, "failovers": 0, "prefix_tokens": 0,
+                "prefix_hits": 0, "prefix_hit_latency": 0.0, "prefix_misses": 0, "prefix_miss_latency": 0.0,
+                "latency": [0] * (len(LATENCY_BUCKETS) + 1), "latency_sum": 0.0,
+                "ttft": [0] * (len(LATENCY_BUCKETS) + 1), "ttft_sum": 0.0, "ttft_count": 0,
+            }
+        return self.series[key]
+
+    @staticmethod
+    def _observe(buckets, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+                return
+        buckets[-1] += 1
+
+    def add(self, record):
+        s = self._series(record.get("engine", "default"), record.get("model") or "unknown")
+        s["calls"][record["outcome"]] = s["calls"].get(record["outcome"], 0) + 1
+        for field in ("prompt_tokens", "completion_tokens", "cached_tokens", "retries", "failovers", "prefix_tokens"):
+            s[field] += record.get(field) or 0
+        s["hedges"] += int(bool(record.get("hedged")))
+        if record.get("outcome") == "success" and not record.get("tokens_estimated"):
+            # Provider-reported usage only: did the prompt prefix hit the cache?
+            if record.get("cached_tokens"):
+                s["prefix_hits"] += 1
+                s["prefix_hit_latency"] += record.get("latency", 0)
+            else:
+                s["prefix_misses"] += 1
+                s["prefix_miss_latency"] += record.get("latency", 0)
+        self._observe(s["latency"], record.get("latency", 0))
+        s["latency_sum"] += record.get("latency", 0)
+        if record.get("ttft") is not None:
+            self._observe(s["ttft"], record["ttft"])
+            s["ttft_sum"] += record["ttft"]
+            s["ttft_count"] += 1
+
+    def _read(self, f):
+        f.seek(self.offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            self.offset += len(line)
+            try:
+                self.add(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+
+    def _read_rotated(self):
+        try:
+            with open(self.path + ".1", "rb") as f:
+                if os.fstat(f.fileno()).st_ino == self.inode:
+                    self._read(f)
+        except FileNotFoundError:
+            pass
+
+    def refresh(self):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return self
+        with f:
+            stat = os.fstat(f.fileno())
+            watermark = (self.inode, self.offset)
+            if self.inode is not None and stat.st_ino != self.inode:
+                # Rotated: finish the previous generation, then read the new file from the start.
+                self._read_rotated()
+                self.offset = 0
+            elif stat.st_size < self.offset:
+                # Truncated: start over.
+                self.offset, self.series = 0, {}
+            self.inode = stat.st_ino
+            self._read(f)
+        if (self.inode, self.offset) != watermark:
+            self.save()
+        return self
+
+    def summary(self):
+        engines = {}
+        for (engine, model), s in sorted(self.series.items()):
+            calls = sum(s["calls"].values())
+            engines[f"{engine}:{model}"] = {
+                "calls": s["calls"],
+                "prompt_tokens": s["prompt_tokens"],
+                "completion_tokens": s["completion_tokens"],
+                "cached_tokens": s["cached_tokens"],
+                "retries": s["retries"],
+                "hedges": s["hedges"],
+                "failovers": s["failovers"],
+                "prefix_tokens": s["prefix_tokens"],
+                "cached_ratio": s["cached_tokens"] / s["prompt_tokens"] if s["prompt_tokens"] else None,
+                "mean_latency_prefix_hit": s["prefix_hit_latency"] / s["prefix_hits"] if s["prefix_hits"] else None,
+                "mean_latency_prefix_miss": s["prefix_miss_latency"] / s["prefix_misses"] if s["prefix_misses"] else None,
+                "mean_latency": s["latency_sum"] / calls if calls else None,
+                "mean_ttft": s["ttft_sum"] / s["ttft_count"] if s["ttft_count"] else None,
+            }
+        return engines
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        header("llm_calls_total", "counter", "LLM calls by outcome.")
+        for (engine, model), s in sorted(self.series.items()):
+            for outcome, count in sorted(s["calls"].items()):
+                lines.append(f'llm_calls_total{{engine="{engine}",model="{model}",outcome="{outcome}"}} {count}')
+        for field, text in (("prompt_tokens", "Prompt tokens sent."), ("completion_tokens", "Completion tokens received."),
+                            ("cached_tokens", "Prompt tokens served from the provider's prefix cache."),
+                            ("prefix_tokens", "Estimated tokens of the cacheable system-message prefix."),
+                            ("retries", "Retried attempts after retryable errors."),
+                            ("hedges", "Calls that sent a hedged duplicate request."),
+                            ("failovers", "Switches to another endpoint or fallback model.")):
+            header(f"llm_{field}_total", "counter", text)
+            for (engine, model), s in sorted(self.series.items()):
+                lines.append(f'llm_{field}_total{{engine="{engine}",model="{model}"}} {s[field]}')
+        for name, text in (("latency", "Total call latency."), ("ttft", "Time to first streamed token.")):
+            header(f"llm_{name}_seconds", "histogram", text)
+            for (engine, model), s in sorted(self.series.items()):
+                labels = f'engine="{engine}",model="{model}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ["+Inf"], s[name]):
+                    cumulative += count
+                    lines.append(f'llm_{name}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                count = s["ttft_count"] if name == "ttft" else sum(s["calls"].values())
+                lines.append(f"llm_{name}_seconds_sum{{{labels}}} {s[name + '_sum']:.4f}")
+                lines.append(f"llm_{name}_seconds_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+_aggregator = None
+# The worker refreshes from executor threads.
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator() -> TelemetryAggregator:
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = TelemetryAggregator().load()
+    return _aggregator.refresh()
+
+
+def render_metrics() -> str:
+    with _aggregator_lock:
+        return get_aggregator().render_prometheus()
+
+
+def render_summary() -> dict:
+    with _aggregator_lock:
+        return get_aggregator().summary()
+
+
+def write_prometheus(output: str):
+    # Write-then-rename so a textfile collector never reads a partial file.
+    tmp = f"{output}.tmp"
+    with open(tmp, "w") as f:
+        f.write(get_aggregator().render_prometheus())
+    os.replace(tmp, output)
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    action = sys.argv[1] if len(sys.argv) > 1 else "summary"
+    if action == "prom":
+        if len(sys.argv) > 2:
+            write_prometheus(sys.argv[2])
+        else:
+            sys.stdout.write(get_aggregator().render_prometheus())
+    elif action == "summary":
+        print(json.dumps(get_aggregator().summary(), indent=2))
+    else:
+        print("Usage: python3 llm_telemetry.py [summary|prom [output.prom]]")
+        sys.exit(1)
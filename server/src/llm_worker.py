@@ -0,0 +1,279 @@
+import profiling
+import asyncio
+import inspect
+import json
+import os
+import sys
+
+from llm_code_generator import agenerate_code, agenerate_candidates
+from llm_error_diagnoser import adiagnose_error, areport_fix_outcome
+from llm_arbitrator import aarbitrate_conflict
+from llm_repair import arepair
+import llm_scheduler
+import llm_telemetry
+
+# Resident worker for the Python engines.
+# Speaks JSON-RPC 2.0 with one message per line (stdio or a Unix socket), so the
+# TS side can keep a few of these alive instead of spawning python3 per call.
+
+MAX_FRAME_BYTES = int(os.environ.get("LLM_WORKER_MAX_FRAME", str(16 * 1024 * 1024)))
+
+
+async def _memory_retrieve(query: str = ""):
+    from memory_engine import retrieve_memories
+    return await retrieve_memories(query)
+
+
+async def _memory_memorize(id: str, goal: str, result: str = ""):
+    from memory_engine import memorize_task
+    return await memorize_task(id, goal, result)
+
+
+async def _memory_flush():
+    from memory_engine import flush_memories
+    return await flush_memories()
+
+
+async def _memory_compact(max_entries: int = 0):
+    from memory_engine import compact_memories
+    return await asyncio.get_running_loop().run_in_executor(None, compact_memories, max_entries or None)
+
+
+async def _memory_stats():
+    from memory_engine import memory_stats
+    return memory_stats()
+
+
+async def _cache_stats():
+    from llm_cache import get_cache
+    return get_cache().stats()
+
+
+async def _diagnosis_feedback(fingerprint: str, worked: bool):
+    return await areport_fix_outcome(fingerprint, worked)
+
+
+async def _diagnosis_stats():
+    from diagnosis_store import get_store
+    return get_store().stats()
+
+
+async def _telemetry_metrics():
+    from llm_telemetry import render_metrics
+    return await asyncio.get_running_loop().run_in_executor(None, render_metrics)
+
+
+async def _telemetry_summary():
+    from llm_telemetry import render_summary
+    return await asyncio.get_running_loop().run_in_executor(None, render_summary)
+
+
+async def _routing_stats():
+    from llm_routing import stats
+    return stats()
+
+
+async def _coalesce_stats():
+    from llm_coalesce import get_flight
+    return get_flight().stats()
+
+
+async def _scheduler_stats():
+    from llm_scheduler import stats
+    return stats()
+
+
+async def _tools_stats():
+    from tool_index import get_retriever
+    return get_retriever().stats()
+
+
+async def _ping():
+    return "pong"
+
+
+# All handlers are coroutines sharing the process-wide async LLM client,
+# so concurrent requests multiplex over one connection pool without threads.
+METHODS = {
+    "generate_code": agenerate_code,
+    "generate_candidates": agenerate_candidates,
+    "diagnose_error": adiagnose_error,
+    "arbitrate_conflict": aarbitrate_conflict,
+    "repair": arepair,
+    "memory.retrieve": _memory_retrieve,
+    "memory.memorize": _memory_memorize,
+    "memory.flush": _memory_flush,
+    "memory.stats": _memory_stats,
+    "memory.compact": _memory_compact,
+    "cache.stats": _cache_stats,
+    "diagnosis.feedback": _diagnosis_feedback,
+    "diagnosis.stats": _diagnosis_stats,
+    "telemetry.metrics": _telemetry_metrics,
+    "telemetry.summary": _telemetry_summary,
+    "routing.stats": _routing_stats,
+    "coalesce.stats": _coalesce_stats,
+    "scheduler.stats": _scheduler_stats,
+    "tools.stats": _tools_stats,
+    "ping": _ping,
+}
+
+
+def _error(req_id, code, message):
+    return {"jsonrpc": "2.0", "id": req_id, "error": {"code": code, "message": message}}
+
+
+async def dispatch(line: bytes):
+    """
+    Handle one framed request and return the response dict (None for notifications).
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return _error(None, -32700, f"Parse error: {e}")
+    if not isinstance(request, dict):
+        return _error(None, -32600, "Invalid Request: expected a JSON object")
+
+    req_id = request.get("id")
+    method = request.get("method")
+    params = request.get("params") or {}
+    # Reserved for every method: attributes the request's LLM calls in telemetry.
+    task_id = params.pop("task_id", None) if isinstance(params, dict) else None
+
+    if method not in METHODS:
+        return _error(req_id, -32601, f"Method not found: {method}")
+
+    func = METHODS[method]
+    try:
+        inspect.signature(func).bind(**params)
+    except TypeError as e:
+        return _error(req_id, -32602, f"Invalid params: {e}")
+
+    try:
+        with profiling.session(f"llm_worker.{method}"), llm_telemetry.task(task_id):
+            result = await func(**params)
+    except Exception as e:
+        return _error(req_id, -32000, str(e))
+
+    if req_id is None:
+        return None
+    return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+
+async def serve_stream(readline, write):
+    """
+    Read requests until EOF, running each one concurrently and writing
+    responses back as soon as they complete (out of order, matched by id).
+    """
+    write_lock = asyncio.Lock()
+    pending = set()
+
+    async def send(response):
+        data = (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+        async with write_lock:
+            await write(data)
+
+    async def handle(line):
+        response = await dispatch(line)
+        if response is not None:
+            await send(response)
+
+    while True:
+        line = await readline()
+        if not line:
+            break
+        if len(line) > MAX_FRAME_BYTES:
+            await send(_error(None, -32700, "Frame too large"))
+            continue
+        if not line.strip():
+            continue
+        task = asyncio.ensure_future(handle(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run_with_memory_flusher(serve):
+    """
+    Run `serve` alongside the write-behind memorize flusher and the periodic
+    memory compactor, and drain the memorize spool once serving ends so
+    queued tasks are not left behind.
+    """
+    try:
+        import memory_engine
+    except ImportError as e:
+        print(f"Memory engine unavailable, memorize flusher disabled: {e}", file=sys.stderr)
+        await serve()
+        return
+
+    flusher = asyncio.ensure_future(memory_engine.run_flusher())
+    compactor = asyncio.ensure_future(memory_engine.run_compactor())
+    try:
+        await serve()
+    finally:
+        flusher.cancel()
+        compactor.cancel()
+        try:
+            await memory_engine.flush_memories()
+        except Exception as e:
+            print(f"Final memorize flush failed: {e}", file=sys.stderr)
+
+
+async def serve_stdio():
+    loop = asyncio.get_running_loop()
+
+    # The channel owns the real stdout; anything else printed goes to stderr.
+    channel = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    stdin = sys.stdin.buffer
+
+    async def readline():
+        return await loop.run_in_executor(None, stdin.readline)
+
+    async def write(data):
+        channel.write(data)
+        channel.flush()
+
+    await serve_stream(readline, write)
+
+
+async def serve_unix(socket_path: str):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    async def on_connect(reader, writer):
+        async def readline():
+            try:
+                return await reader.readline()
+            except ValueError:
+                # Frame exceeded the stream limit; the connection cannot resync.
+                return b""
+
+        async def write(data):
+            writer.write(data)
+            await writer.drain()
+
+        try:
+            await serve_stream(readline, write)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(on_connect, path=socket_path, limit=MAX_FRAME_BYTES)
+    print(f"llm_worker listening on {socket_path}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    # The provider quota in LLM_RATE_* is shared by every worker in the pool.
+    llm_scheduler.set_share(os.environ.get("LLM_WORKER_POOL_SIZE", "2"))
+    if len(sys.argv) > 2 and sys.argv[1] == "--socket":
+        asyncio.run(run_with_memory_flusher(lambda: serve_unix(sys.argv[2])))
+    elif len(sys.argv) == 1 or sys.argv[1] == "--stdio":
+        asyncio.run(run_with_memory_flusher(serve_stdio))
+    else:
+        print("Usage: python3 llm_worker.py [--stdio | --socket <path>]")
+        sys.exit(1)
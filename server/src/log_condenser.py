@@ -0,0 +1,388 @@
+import profiling
+import io
+import json
+import os
+import re
+import sys
+from collections import deque
+from context_assembler import estimate_tokens, trim_head_tail
+
+# Local condensation of failure output before it reaches the diagnoser or the
+# fused repair prompt. Build and test logs can run to megabytes; the text is
+# read line by line with bounded memory and reduced to:
+#   - a header counting what was dropped,
+#   - the head and tail of the log,
+#   - stack traces and the first and last error blocks, wherever they occur.
+# On the way, ANSI codes and carriage-return redraws are stripped, progress
+# lines are dropped, runs of lines that differ only in numbers collapse to one
+# line and a count, and repeated lines outside error blocks are dropped.
+# Output that already fits LLM_ERROR_BUDGET is passed through unchanged.
+
+HEAD_LINES = 30
+TAIL_LINES = 60
+# Lines kept per error block: the start and end, the middle is cut.
+BLOCK_HEAD_LINES = 15
+BLOCK_TAIL_LINES = 25
+MAX_SEEN_LINES = 50000
+MAX_LINE_CHARS = 2000
+
+# Shares of the budget each section is guaranteed before the others top up,
+# in priority order.
+SECTION_SHARES = (("errors", 0.5), ("tail", 0.3), ("head", 0.2))
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|\x1b\][^\x07]*\x07")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_WS_RE = re.compile(r"\s+")
+_PROGRESS_RE = re.compile(
+    r"\d{1,3}(?:\.\d+)?\s?%"                 # 42%, 42.5 %
+    r"|\[[#=>\-.*\s]{8,}\]"                  # [=====>     ]
+    r"|\d+(?:\.\d+)?\s?[kKMG]i?B/s"          # 1.2 MB/s
+    r"|\bETA\b|\beta \d"
+    r"|[⠀-⣿]"                      # braille spinners
+    r"|[█▉▊▋▌▍▎▏░▒▓]{3,}"  # block-character bars
+)
+_ERROR_RE = re.compile(
+    r"\b(?:error|errors|exception|fatal|failed|failure|fail|panic|traceback|denied|cannot|unable to"
+    r"|not found|segmentation fault|assertion)\b|ERR!|\bE\s{2,}",
+    re.I,
+)
+_FRAME_RE = re.compile(r"^\s+(?:at\s|File \"|from\s)|^\s+\S+\.(?:py|js|ts|tsx|go|rs|java|rb):\d+")
+_CHAIN_RE = re.compile(
+    r"^(?:During handling of the above exception|The above exception was the direct cause|Caused by:"
+    r"|\s*\.\.\. \d+ more)"
+)
+
+
+# Cheap substring screens run before the regexes; most log lines match neither.
+_ERROR_WORDS = ("err", "exception", "fatal", "fail", "panic", "traceback", "denied", "cannot", "unable",
+                "not found", "segmentation", "assert", "e  ")
+
+
+def _is_error(line: str) -> bool:
+    low = line.lower()
+    return any(word in low for word in _ERROR_WORDS) and _ERROR_RE.search(line) is not None
+
+
+def _is_progress(line: str) -> bool:
+    screened = "%" in line or "]" in line or "/s" in line or "ET" in line or "eta" in line or not line.isascii()
+    return screened and _PROGRESS_RE.search(line) is not None and not _is_error(line)
+
+
+def error_budget() -> int:
+    return int(os.environ.get("LLM_ERROR_BUDGET", "1500"))
+
+
+def _clean(line: str) -> str:
+    line = _ANSI_RE.sub("", line.rstrip("\r\n"))
+    # A carriage-return redraw: only the last frame was visible on the terminal.
+    line = line.rsplit("\r", 1)[-1]
+    if len(line) > MAX_LINE_CHARS:
+        line = line[:MAX_LINE_CHARS] + f" ...[{len(line) - MAX_LINE_CHARS} chars]"
+    return line
+
+
+def _line_tokens(line: str) -> int:
+    return estimate_tokens(line) + 1
+
+
+def _shape(line: str) -> str:
+    return _WS_RE.sub(" ", _NUMBER_RE.sub("#", line)).strip()
+
+
+class _Block:
+    """
+    One error block: the line that matched, plus its indented continuation
+    (stack frames, chained exceptions). Keeps its start and end only.
+    """
+
+    def __init__(self, index, lineno, line):
+        self.start, self.end, self.lineno = index, index, lineno
+        self.head = [line]
+        self.tail = deque(maxlen=BLOCK_TAIL_LINES)
+        self.cut = 0
+        self.frames = 0
+        self.awaiting_exception = line.lstrip().startswith("Traceback")
+        self.seen = 1
+
+    def add(self, index, line):
+        self.end = index
+        if _FRAME_RE.match(line):
+            self.frames += 1
+        if len(self.head) < BLOCK_HEAD_LINES:
+            self.head.append(line)
+            return
+        if len(self.tail) == self.tail.maxlen:
+            self.cut += 1
+        self.tail.append(line)
+
+    def lines(self):
+        cut = [f"    ...[{self.cut} lines cut]..."] if self.cut else []
+        return self.head + cut + list(self.tail)
+
+    def signature(self):
+        return hash(tuple(_shape(line) for line in self.lines()))
+
+    def is_trace(self):
+        return self.frames >= 2
+
+
+class LogCondenser:
+    """
+    Feed lines one at a time, then call result().
+    """
+
+    def __init__(self, budget=None):
+        self.budget = error_budget() if budget is None else budget
+        # The raw text is kept until it could not fit the budget anyway.
+        self.raw_limit = self.budget * 4
+        self.raw = []
+        self.raw_chars = 0
+        self.lines = 0
+        self.bytes = 0
+        self.dropped = {"progress": 0, "repeated": 0, "duplicate": 0, "omitted": 0}
+        self.kept = 0
+        self.head = []
+        self.tail = deque()
+        self.seen = set()
+        self.run_shape = None
+        self.run_line = None
+        self.run_count = 0
+        self.block = None
+        self.blocks = 0
+        self.first_block = None
+        self.last_block = None
+        self.traces = {}  # signature -> block; the first and last distinct traces are reported
+
+    # -- input ---------------------------------------------------------------
+
+    def feed(self, raw_line: str):
+        self.lines += 1
+        self.bytes += len(raw_line.encode("utf-8", "replace"))
+        if self.raw is not None:
+            self.raw.append(raw_line)
+            self.raw_chars += len(raw_line)
+            if self.raw_chars > self.raw_limit:
+                self.raw = None
+
+        if "\r" in raw_line:
+            self.dropped["progress"] += raw_line.rstrip("\r\n").count("\r")
+        line = _clean(raw_line)
+        if _is_progress(line):
+            self.dropped["progress"] += 1
+            return
+        shape = _shape(line)
+        if shape == self.run_shape:
+            self.run_count += 1
+            self.run_line = line
+            self.dropped["repeated"] += 1
+            return
+        self._end_run()
+        self.run_shape = shape
+        self._take(line, self.lines)
+
+    def _end_run(self):
+        if self.run_count > 1 and self.run_line.strip():
+            # The last of a run often carries the final counter value.
+            self._take(f"    [repeated {self.run_count} more times, last: {self.run_line.strip()}]", self.lines, marker=True)
+        self.run_count = 0
+
+    def _take(self, line, lineno, marker=False):
+        block = self.block
+        continues = block is not None and (
+            marker or _CHAIN_RE.match(line) or (line[:1].isspace() and line.strip())
+            or (block.awaiting_exception and line.strip())
+        )
+        if continues:
+            if block.awaiting_exception and not line[:1].isspace() and not _CHAIN_RE.match(line):
+                block.awaiting_exception = False
+            block.add(self.kept, line)
+        elif _is_error(line):
+            self._close_block()
+            self.block = _Block(self.kept, lineno, line)
+        else:
+            self._close_block()
+            if not marker and line.strip():
+                shape = _shape(line)
+                if shape in self.seen:
+                    self.dropped["duplicate"] += 1
+                    return
+                if len(self.seen) < MAX_SEEN_LINES:
+                    self.seen.add(shape)
+        self._keep(line)
+
+    def _keep(self, line):
+        if len(self.head) < HEAD_LINES:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+            if len(self.tail) > TAIL_LINES:
+                self.tail.popleft()
+        self.kept += 1
+
+    def _close_block(self):
+        block, self.block = self.block, None
+        if block is None:
+            return
+        self.blocks += 1
+        if self.first_block is None:
+            self.first_block = block
+        else:
+            self.last_block = block
+        if block.is_trace():
+            signature = block.signature()
+            if signature in self.traces:
+                self.traces[signature].seen += 1
+            elif len(self.traces) < 2:
+                self.traces[signature] = block
+            else:
+                # Keep the first distinct trace and the latest one.
+                last = list(self.traces)[-1]
+                del self.traces[last]
+                self.traces[signature] = block
+
+    # -- output --------------------------------------------------------------
+
+    def _sections(self):
+        """
+        [(label, block)] for the blocks that are not already inside the head or tail.
+        """
+        tail_start = self.kept - len(self.tail)
+        shown = []
+        candidates = [("first error", self.first_block)]
+        candidates += [("stack trace", b) for b in self.traces.values()]
+        candidates += [("last error", self.last_block)]
+        for label, block in candidates:
+            if block is None or any(block is b for _, b in shown):
+                continue
+            if block.end < len(self.head) or block.start >= tail_start:
+                continue
+            shown.append((label, block))
+        return shown
+
+    def result(self):
+        """
+        (text, stats). stats is None when the input was passed through unchanged.
+        """
+        self._end_run()
+        self._close_block()
+        if self.raw is not None:
+            text = "".join(self.raw)
+            if estimate_tokens(text) <= self.budget:
+                return text, None
+
+        blocks = self._sections()
+        # A block that runs into the head or the tail is shown once, as a block.
+        head, tail = list(self.head), list(self.tail)
+        tail_start = self.kept - len(tail)
+        for _, block in blocks:
+            head = head[:min(block.start, len(head))]
+            if block.end >= tail_start:
+                tail = list(self.tail)[block.end + 1 - tail_start:]
+        errors = "\n\n".join(
+            f"--- {label} (line {block.lineno}" + (f", seen {block.seen}x" if block.seen > 1 else "") + ") ---\n"
+            + "\n".join(block.lines())
+            for label, block in blocks
+        )
+        needs = {
+            "errors": estimate_tokens(errors),
+            "tail": sum(_line_tokens(line) for line in tail),
+            "head": sum(_line_tokens(line) for line in head),
+        }
+        middle = self.kept - len(head) - len(tail) - sum(b.end - b.start + 1 for _, b in blocks)
+        self.dropped["omitted"] += max(middle, 0)
+        allocation = self._allocate(needs, self.budget - estimate_tokens(self._header()) - 20)
+
+        head = self._fit(head, allocation["head"], keep_end=False)
+        tail = self._fit(tail, allocation["tail"], keep_end=True)
+        errors = trim_head_tail(errors, allocation["errors"])
+        parts = [self._header()]
+        if head:
+            parts.append("--- head ---\n" + "\n".join(head))
+        if errors:
+            parts.append(errors)
+        if tail:
+            parts.append("--- tail ---\n" + "\n".join(tail))
+        text = "\n\n".join(parts) + "\n"
+        return text, {
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "tokens": estimate_tokens(text),
+            "dropped": {kind: count for kind, count in self.dropped.items() if count},
+            "error_blocks": self.blocks,
+            "stack_traces": len(self.traces),
+        }
+
+    def _header(self):
+        dropped = ", ".join(f"{count} {kind}" for kind, count in self.dropped.items() if count)
+        return (f"[log condensed: {self.lines} lines, {self.bytes} bytes"
+                + (f"; dropped {dropped}" if dropped else "")
+                + f"; {self.blocks} error blocks, {len(self.traces)} distinct stack traces]")
+
+    @staticmethod
+    def _allocate(needs, budget):
+        # Same two passes as context_assembler: floors first, then top-ups in priority order.
+        allocation, remaining = {}, max(budget, 0)
+        for name, share in SECTION_SHARES:
+            allocation[name] = min(needs[name], int(budget * share), remaining)
+            remaining -= allocation[name]
+        for name, _ in SECTION_SHARES:
+            grant = min(needs[name] - allocation[name], remaining)
+            allocation[name] += grant
+            remaining -= grant
+        return allocation
+
+    def _fit(self, lines, budget, keep_end):
+        """
+        Whole lines from the start (or the end) of lines within budget tokens.
+        """
+        kept, used = [], 0
+        for line in (reversed(lines) if keep_end else lines):
+            cost = _line_tokens(line)
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        self.dropped["omitted"] += len(lines) - len(kept)
+        return list(reversed(kept)) if keep_end else kept
+
+
+def condense_lines(lines, budget=None):
+    """
+    Condense an iterable of lines (a file, stdin, ...). Returns (text, stats).
+    """
+    condenser = LogCondenser(budget)
+    for line in lines:
+        condenser.feed(line)
+    return condenser.result()
+
+
+def condense_text(text: str, budget=None):
+    budget = error_budget() if budget is None else budget
+    if not text or (estimate_tokens(text) <= budget and "\r" not in text):
+        return text or "", None
+    return condense_lines(io.StringIO(text), budget)
+
+
+def condense_file(path: str, budget=None):
+    """
+    Stream a log from path ("-" for stdin) through the condenser.
+    """
+    if path == "-":
+        return condense_lines(sys.stdin, budget)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return condense_lines(f, budget)
+
+
+def log_stats(stats):
+    if stats and os.environ.get("LLM_CONTEXT_REPORT", "1") != "0":
+        print(f"log_condenser: {json.dumps(stats)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    # python3 log_condenser.py [<path> | -] [budget]
+    source = sys.argv[1] if len(sys.argv) > 1 else "-"
+    with profiling.span("condense"):
+        text, stats = condense_file(source, int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    log_stats(stats)
+    sys.stdout.write(text)
@@ -0,0 +1,251 @@
+import asyncio
+import fcntl
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Write-behind queue for memory_engine.memorize_task.
+# Completed tasks are appended to a durable JSONL spool; a flusher ingests them
+# in batches (by size or time window) with retry, and dedupes by task id.
+# Ingestion is a list of independent steps (e.g. local index, memu): each one
+# is retried on its own and its progress is kept per task id, so a retry never
+# redoes a step that already succeeded. The committed spool offset, per-step
+# progress and fully ingested ids live in a small SQLite file.
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "memorize_spool")
+
+
+class MemorizeQueue:
+    def __init__(self, steps, spool_dir=None, batch_size=None, flush_interval=None, max_retries=None):
+        """
+        steps: ordered list of (name, ingest, per_record). ingest is an async
+        callable taking a list of {"id", "goal", "result"} records and must raise
+        on failure so the step is retried; per_record steps are called with one
+        record at a time and their progress is kept record by record.
+        """
+        self.steps = steps
+        self.spool_dir = spool_dir or os.environ.get("MEMORIZE_SPOOL_DIR", DEFAULT_SPOOL_DIR)
+        self.batch_size = batch_size or int(os.environ.get("MEMORIZE_BATCH_SIZE", "20"))
+        self.flush_interval = flush_interval or float(os.environ.get("MEMORIZE_FLUSH_INTERVAL", "5"))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("MEMORIZE_MAX_RETRIES", "3"))
+        self.spool_path = os.path.join(self.spool_dir, "spool.jsonl")
+        self.dead_letter_path = os.path.join(self.spool_dir, "dead_letter.jsonl")
+        self.spool_lock_path = os.path.join(self.spool_dir, ".spool.lock")
+        self.flush_lock_path = os.path.join(self.spool_dir, ".flush.lock")
+        self.counters = {"enqueued": 0, "ingested": 0, "duplicates": 0, "batches": 0, "retries": 0,
+                         "dead_lettered": 0, "ingest_seconds": 0.0, "last_error": None}
+        self.wakeup = None
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.spool_dir, "state.db"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS ingested (task_id TEXT PRIMARY KEY, ingested_at REAL NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS steps (task_id TEXT NOT NULL, step TEXT NOT NULL, "
+                        "done_at REAL NOT NULL, PRIMARY KEY (task_id, step))")
+        self.db.commit()
+
+    # -- spool ---------------------------------------------------------------
+
+    def _offset(self) -> int:
+        row = self.db.execute("SELECT value FROM state WHERE key = 'offset'").fetchone()
+        return row[0] if row else 0
+
+    def _set_offset(self, offset: int):
+        self.db.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('offset', ?)", (offset,))
+        self.db.commit()
+
+    def _append(self, line: str, offset: int) -> int:
+        # Blocking (flock + fsync): runs in the executor, returns the depth after offset.
+        with open(self.spool_lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.spool_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return self._count_lines(offset)
+
+    async def enqueue(self, task_id: str, goal: str, result: str) -> int:
+        record = {"id": task_id, "goal": goal, "result": result, "enqueued_at": time.time()}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        depth = await asyncio.get_running_loop().run_in_executor(None, self._append, line, self._offset())
+        self.counters["enqueued"] += 1
+        if self.wakeup is not None and depth >= self.batch_size:
+            self.wakeup.set()
+        return depth
+
+    def _read_batch(self, offset: int):
+        """
+        Return (records, next_offset) for up to batch_size complete lines after offset.
+        """
+        records = []
+        if not os.path.exists(self.spool_path):
+            return records, offset
+        with open(self.spool_path, "rb") as f:
+            f.seek(offset)
+            while len(records) < self.batch_size:
+                line = f.readline()
+                if not line or not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"Skipping corrupt spool line at offset {offset}", file=sys.stderr)
+        return records, offset
+
+    def _count_lines(self, offset: int) -> int:
+        if not os.path.exists(self.spool_path):
+            return 0
+        with open(self.spool_path, "rb") as f:
+            f.seek(offset)
+            return sum(1 for line in f if line.endswith(b"\n"))
+
+    def depth(self) -> int:
+        return self._count_lines(self._offset())
+
+    def _truncate_if_drained(self):
+        with open(self.spool_lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) == self._offset():
+                    open(self.spool_path, "w").close()
+                    self._set_offset(0)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -- flushing ------------------------------------------------------------
+
+    def _dedupe(self, records):
+        latest = {}
+        for record in records:
+            latest[record["id"]] = record
+        fresh = []
+        for task_id, record in latest.items():
+            if self.db.execute("SELECT 1 FROM ingested WHERE task_id = ?", (task_id,)).fetchone():
+                continue
+            fresh.append(record)
+        self.counters["duplicates"] += len(records) - len(fresh)
+        return fresh
+
+    def _steps_done(self, records, step) -> set:
+        ids = [r["id"] for r in records]
+        rows = self.db.execute(
+            f"SELECT task_id FROM steps WHERE step = ? AND task_id IN ({','.join('?' * len(ids))})", [step, *ids]
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def _mark_step(self, records, step):
+        now = time.time()
+        self.db.executemany("INSERT OR REPLACE INTO steps (task_id, step, done_at) VALUES (?, ?, ?)",
+                            [(r["id"], step, now) for r in records])
+        self.db.commit()
+
+    async def _run_step(self, name, ingest, per_record, records) -> bool:
+        """
+        Run one step with retry over the records that have not completed it yet.
+        """
+        for attempt in range(self.max_retries + 1):
+            done = self._steps_done(records, name)
+            pending = [r for r in records if r["id"] not in done]
+            if not pending:
+                return True
+            started = time.monotonic()
+            try:
+                for batch in ([r] for r in pending) if per_record else [pending]:
+                    await ingest(batch)
+                    self._mark_step(batch, name)
+                self.counters["ingest_seconds"] += time.monotonic() - started
+                return True
+            except Exception as e:
+                self.counters["ingest_seconds"] += time.monotonic() - started
+                self.counters["last_error"] = f"{name}: {e}"
+                if attempt < self.max_retries:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(min(2 ** attempt, 30))
+        return False
+
+    async def _ingest(self, records):
+        """
+        Run every step over the batch and return the names of those that failed.
+        """
+        failed = []
+        for name, ingest, per_record in self.steps:
+            if not await self._run_step(name, ingest, per_record, records):
+                failed.append(name)
+        return failed
+
+    async def flush(self) -> dict:
+        """
+        Ingest everything currently in the spool. Only one process flushes at a time;
+        if another holds the flush lock this returns immediately.
+        """
+        flushed = 0
+        with open(self.flush_lock_path, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {"status": "busy", "flushed": 0, "depth": self.depth()}
+            try:
+                while True:
+                    offset = self._offset()
+                    records, next_offset = self._read_batch(offset)
+                    if next_offset == offset:
+                        break
+                    fresh = self._dedupe(records)
+                    if fresh:
+                        failed = await self._ingest(fresh)
+                        if not failed:
+                            now = time.time()
+                            self.db.executemany(
+                                "INSERT OR REPLACE INTO ingested (task_id, ingested_at) VALUES (?, ?)",
+                                [(r["id"], now) for r in fresh],
+                            )
+                            self.db.executemany("DELETE FROM steps WHERE task_id = ?", [(r["id"],) for r in fresh])
+                            self.counters["ingested"] += len(fresh)
+                            flushed += len(fresh)
+                        else:
+                            # Completed steps stay recorded: a re-enqueued record only redoes the failed ones.
+                            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                                for record in fresh:
+                                    f.write(json.dumps({**record, "failed_steps": failed}, ensure_ascii=False) + "\n")
+                            self.counters["dead_lettered"] += len(fresh)
+                        self.counters["batches"] += 1
+                    self._set_offset(next_offset)
+                self._truncate_if_drained()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return {"status": "success", "flushed": flushed, "depth": self.depth()}
+
+    async def run_flusher(self):
+        """
+        Background loop: flush when a batch fills up or the time window elapses.
+        """
+        self.wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.counters["last_error"] = str(e)
+                print(f"Memorize flush error: {e}", file=sys.stderr)
+
+    def stats(self) -> dict:
+        seconds = self.counters["ingest_seconds"]
+        ingested_total = self.db.execute("SELECT COUNT(*) FROM ingested").fetchone()[0]
+        return {
+            **self.counters,
+            "depth": self.depth(),
+            "spool_bytes": os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0,
+            "ingested_total": ingested_total,
+            "throughput_per_sec": (self.counters["ingested"] / seconds) if seconds else None,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+        }
@@ -1,75 +1,488 @@
+import profiling
 import asyncio
+import fcntl
+import importlib.util
+import math
 import os
+import re
+import sqlite3
 import sys
 import json
-from memu.app import MemoryService
+import threading
+import time
+from memorize_queue import MemorizeQueue
+from context_assembler import estimate_tokens, trim_head_tail
+from llm_routing import endpoints
+import llm_scheduler
 
-# Initialize the Memory Service
 # We'll use the same LLM configuration as other engines
 api_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("NVIDIA_API_KEY")
 model = os.environ.get("LLM_MODEL", "z-ai/glm-4-9b-chat")
 
-service = MemoryService(
-    llm_profiles={
-        "default": {
-            "api_key": api_key,
-            "chat_model": model,
-        },
-    },
-)
+# The Memory Service (and memu itself) is only built when a call actually needs
+# it, so retrieve without an API key or a local-index hit never imports memu.
+# memu-py is optional: without it memories live in the local index only.
+_service = None
+
+
+def memu_enabled() -> bool:
+    return bool(api_key) and importlib.util.find_spec("memu") is not None
+
+
+def get_service():
+    global _service
+    if _service is None:
+        from memu.app import MemoryService
+        _service = MemoryService(
+            llm_profiles={
+                "default": {
+                    "api_key": api_key,
+                    "chat_model": model,
+                },
+            },
+        )
+    return _service
+
+# Local retrieval tier: memory-mapped embedding matrix searched before memu.
+# Works offline with the hashing embedder; disable with MEMORY_LOCAL_INDEX=0.
+LOCAL_INDEX_ENABLED = os.environ.get("MEMORY_LOCAL_INDEX", "1") != "0"
+LOCAL_TOP_K = int(os.environ.get("MEMORY_TOP_K", "5"))
+LOCAL_MIN_SCORE = float(os.environ.get("MEMORY_MIN_SCORE", "0.2"))
+# Local hits only stand in for memu when the best one scores at least this;
+# weaker ones are returned together with memu's results.
+LOCAL_CONFIDENT_SCORE = float(os.environ.get("MEMORY_CONFIDENT_SCORE", "0.6"))
+
+_local_index = None
+
+
+def get_local_index():
+    global _local_index
+    if _local_index is None:
+        from vector_index import VectorIndex
+        _local_index = VectorIndex()
+    return _local_index
+
+
+# Maintenance of the local index: a task that nearly duplicates a stored
+# memory (same goal, same kind of fix) only bumps that memory's hit count,
+# results are stored as head/tail summaries, and compaction merges leftover
+# duplicates and evicts the least valuable memories beyond MEMORY_MAX_ENTRIES.
+# Per-memory usage (hits, retrievals, last use) lives in usage.db next to the index.
+DEDUP_SCORE = float(os.environ.get("MEMORY_DEDUP_SCORE", "0.92"))
+DEDUP_GOAL_OVERLAP = float(os.environ.get("MEMORY_DEDUP_GOAL_OVERLAP", "0.8"))
+RESULT_MAX_TOKENS = int(os.environ.get("MEMORY_RESULT_MAX_TOKENS", "300"))
+MAX_ENTRIES = int(os.environ.get("MEMORY_MAX_ENTRIES", "2000"))
+MAX_AGE_DAYS = float(os.environ.get("MEMORY_MAX_AGE_DAYS", "0"))
+IDLE_HALF_LIFE_DAYS = float(os.environ.get("MEMORY_IDLE_HALF_LIFE_DAYS", "14"))
+COMPACT_INTERVAL = float(os.environ.get("MEMORY_COMPACT_INTERVAL", "3600"))
+
+
+class MemoryUsage:
+    """
+    Usage counters per memory id, shared by every worker through SQLite.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS usage (id TEXT PRIMARY KEY, hits INTEGER NOT NULL, "
+            "retrievals INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def add(self, memory_id):
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO usage VALUES (?, 1, 0, ?, ?)", (memory_id, now, now))
+            self.db.commit()
+
+    def hit(self, memory_id):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO usage VALUES (?, 2, 0, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET hits = hits + 1, last_used = excluded.last_used",
+                (memory_id, now, now),
+            )
+            self.db.commit()
+
+    def retrieved(self, memory_ids):
+        """
+        Count a retrieval of each id and return {id: hits}.
+        """
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO usage VALUES (?, 1, 1, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET retrievals = retrievals + 1, last_used = excluded.last_used",
+                [(memory_id, now, now) for memory_id in memory_ids],
+            )
+            self.db.commit()
+            rows = self.db.execute(
+                f"SELECT id, hits FROM usage WHERE id IN ({','.join('?' * len(memory_ids))})", list(memory_ids)
+            ).fetchall()
+        return dict(rows)
+
+    def load(self, metadata, now):
+        with self.lock:
+            rows = {row[0]: row for row in self.db.execute("SELECT * FROM usage")}
+        records = {}
+        for m in metadata:
+            row = rows.get(m["id"])
+            if row:
+                records[m["id"]] = {"hits": row[1], "retrievals": row[2], "created_at": row[3], "last_used": row[4]}
+            else:
+                created = m.get("created_at", now)
+                records[m["id"]] = {"hits": 1, "retrievals": 0, "created_at": created, "last_used": created}
+        return records
+
+    def replace(self, records, removed):
+        with self.lock:
+            self.db.executemany("DELETE FROM usage WHERE id = ?", [(memory_id,) for memory_id in removed])
+            self.db.executemany(
+                "INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?, ?)",
+                [(memory_id, r["hits"], r["retrievals"], r["created_at"], r["last_used"]) for memory_id, r in records.items()],
+            )
+            self.db.commit()
+
+
+_usage = None
+
+
+def get_usage():
+    global _usage
+    if _usage is None:
+        _usage = MemoryUsage(os.path.join(get_local_index().index_dir, "usage.db"))
+    return _usage
+
+
+def summarize_result(result: str) -> str:
+    return trim_head_tail(result or "", RESULT_MAX_TOKENS)
+
+
+def _goal_words(goal: str):
+    return set(re.findall(r"\w+", (goal or "").lower()))
+
+
+def same_goal(a: str, b: str) -> bool:
+    """
+    Word-set overlap of two goals: similar results alone do not make tasks duplicates.
+    """
+    words_a, words_b = _goal_words(a), _goal_words(b)
+    return len(words_a & words_b) / max(len(words_a | words_b), 1) >= DEDUP_GOAL_OVERLAP
+
+
+def retention_score(record, now) -> float:
+    """
+    How much a memory is worth keeping: grows with recurrences and retrievals,
+    halves every MEMORY_IDLE_HALF_LIFE_DAYS without use.
+    """
+    idle_days = max(now - record["last_used"], 0) / 86400
+    return (1 + math.log1p(record["hits"] - 1 + record["retrievals"])) * 0.5 ** (idle_days / IDLE_HALF_LIFE_DAYS)
+
+
+def index_task(task_id: str, goal: str, result: str):
+    """
+    Add a task to the local index, or count it against a near-duplicate
+    memory. Returns the id of the memory that now holds it.
+    """
+    content = f"Goal: {goal}\nResult: {summarize_result(result)}"
+    index = get_local_index()
+    for duplicate in index.search(content, k=3, min_score=DEDUP_SCORE):
+        if same_goal(goal, duplicate.get("summary", "")):
+            get_usage().hit(duplicate["id"])
+            return duplicate["id"]
+    index.add(content, {"id": task_id, "task_id": task_id, "content": content, "summary": goal, "created_at": time.time()})
+    get_usage().add(task_id)
+    return task_id
+
+
+async def index_records(records):
+    """
+    Queue step: add spooled tasks to the local index.
+    """
+    loop = asyncio.get_running_loop()
+    with profiling.span("local_index"):
+        for r in records:
+            await loop.run_in_executor(None, index_task, r["id"], r["goal"], r["result"])
+
+
+async def memu_memorize(records):
+    """
+    Queue step: one memu document for the whole batch. Raises on failure so
+    the queue retries it.
+    """
+    # memu-py's memorize takes a URL or local path, so the batch is written
+    # once next to the spool (not one /tmp file per task) and removed after.
+    document = json.dumps([{"task_id": r["id"], "goal": r["goal"], "result": summarize_result(r["result"])} for r in records])
+    # memu calls the provider itself; take a lowest-priority slot first.
+    # A shed batch raises and stays in the spool for the next round.
+    await llm_scheduler.acquire("memorize", endpoints()[0], model, estimate_tokens(document))
+    batch_file = os.path.join(get_queue().spool_dir, f"batch-{records[0]['id']}-{len(records)}.json")
+    with open(batch_file, "w") as f:
+        f.write(document)
+    try:
+        with profiling.span("memu_memorize"):
+            res = await get_service().memorize(resource_url=batch_file, modality="document")
+    finally:
+        os.remove(batch_file)
+    if isinstance(res, dict) and res.get("status") == "error":
+        raise RuntimeError(res.get("message", "memu memorize failed"))
+
+
+def ingest_steps():
+    # The local index goes first and does not depend on memu succeeding.
+    steps = []
+    if LOCAL_INDEX_ENABLED:
+        steps.append(("local_index", index_records, True))
+    if memu_enabled():
+        steps.append(("memu", memu_memorize, False))
+    elif api_key:
+        print("memu-py is not installed; memorizing to the local index only", file=sys.stderr)
+    return steps
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = MemorizeQueue(ingest_steps())
+    return _queue
+
 
 async def memorize_task(task_id: str, goal: str, result: str):
     """
     Store the result of a completed task into the long-term memory.
+    The task is appended to the durable spool and ingested in the next batch.
     """
-    if not api_key:
-        return {"status": "error", "message": "API key not found"}
+    if not get_queue().steps:
+        return {"status": "error", "message": "No memory backend: set an API key with memu-py installed, or enable the local index"}
 
-    # Create a temporary resource for the task
-    resource_content = {
-        "task_id": task_id,
-        "goal": goal,
-        "result": result
-    }
-    
-    # In a real scenario, we might write this to a file and pass the URL
-    # For now, we simulate a conversation modality
     try:
-        # memu-py's memorize usually takes a URL or local path
-        # We'll create a temporary file
-        temp_file = f"/tmp/task_{task_id}.json"
-        with open(temp_file, "w") as f:
-            json.dump(resource_content, f)
-            
-        res = await service.memorize(resource_url=temp_file, modality="document")
-        return {"status": "success", "data": res}
+        depth = await get_queue().enqueue(task_id, goal, result)
+        return {"status": "success", "queued": True, "depth": depth}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+
+async def flush_memories():
+    """
+    Ingest everything waiting in the spool (e.g. on shutdown).
+    """
+    return await get_queue().flush()
+
+
+async def run_flusher():
+    await get_queue().run_flusher()
+
+
+def _measure(index, queries):
+    stats = index.stats()
+    started = time.perf_counter()
+    for query in queries:
+        index.search(query, k=LOCAL_TOP_K, min_score=LOCAL_MIN_SCORE)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": stats["rows"],
+        "bytes": stats["matrix_bytes"] + stats["metadata_bytes"],
+        "search_ms": round(elapsed * 1000 / len(queries), 3) if queries else None,
+    }
+
+
+def _similar_predecessors(ordered, threshold, block_bytes=64 << 20):
+    """
+    For each row of `ordered`, the earlier rows whose cosine similarity reaches
+    threshold, in row order. Computed as a blocked matrix product so the
+    similarity matrix never has to fit in memory at once.
+    """
+    import numpy as np
+    rows = len(ordered)
+    neighbours = [[] for _ in range(rows)]
+    block = max(block_bytes // (4 * max(rows, 1)), 1)
+    for start in range(0, rows, block):
+        end = min(start + block, rows)
+        similarity = ordered[start:end] @ ordered[:end].T
+        for r, c in zip(*(a.tolist() for a in np.nonzero(similarity >= threshold))):
+            if c < start + r:
+                neighbours[start + r].append(c)
+    return neighbours
+
+
+def _compact(index, max_entries):
+    matrix, metadata = index.snapshot()
+    # Same queries before and after, so the latency numbers are comparable.
+    step = max(len(metadata) // 20, 1)
+    queries = [m.get("summary") or m.get("content", "") for m in metadata[::step][:20]]
+    before = _measure(index, queries)
+    now = time.time()
+    usage = get_usage()
+    records = usage.load(metadata, now)
+
+    # Walk memories from most to least valuable; each one close enough to an
+    # already kept memory is folded into the most valuable such memory.
+    scores = [retention_score(records[m["id"]], now) for m in metadata]
+    order = sorted(range(len(metadata)), key=lambda i: -scores[i])
+    neighbours = _similar_predecessors(matrix[order], DEDUP_SCORE)
+    kept, removed = [], set()
+    is_kept = [False] * len(order)
+    for rank, i in enumerate(order):
+        j = next((order[r] for r in neighbours[rank]
+                  if is_kept[r] and same_goal(metadata[order[r]].get("summary", ""), metadata[i].get("summary", ""))), None)
+        if j is not None:
+            target, source = records[metadata[j]["id"]], records[metadata[i]["id"]]
+            target["hits"] += source["hits"]
+            target["retrievals"] += source["retrievals"]
+            target["created_at"] = min(target["created_at"], source["created_at"])
+            target["last_used"] = max(target["last_used"], source["last_used"])
+            removed.add(metadata[i]["id"])
+            continue
+        is_kept[rank] = True
+        kept.append(i)
+    merged = len(removed)
+
+    if MAX_AGE_DAYS > 0:
+        stale = {i for i in kept if now - records[metadata[i]["id"]]["last_used"] > MAX_AGE_DAYS * 86400}
+        removed.update(metadata[i]["id"] for i in stale)
+        kept = [i for i in kept if i not in stale]
+    # kept is already ordered by score, so the cap keeps the most valuable.
+    removed.update(metadata[i]["id"] for i in kept[max_entries:])
+    kept = sorted(kept[:max_entries])
+    evicted = len(removed) - merged
+
+    truncated = 0
+    rows = []
+    for i in kept:
+        m = metadata[i]
+        goal_part, sep, result = m.get("content", "").partition("\nResult: ")
+        if sep and estimate_tokens(result) > RESULT_MAX_TOKENS:
+            m = {**m, "content": f"{goal_part}\nResult: {summarize_result(result)}"}
+            truncated += 1
+        rows.append((i, m))
+
+    if not removed and not truncated:
+        return {"status": "unchanged", "before": before, "after": before}
+    index.rewrite(rows, base_rows=len(metadata))
+    usage.replace({m["id"]: records[m["id"]] for _, m in rows}, removed)
+    return {"status": "compacted", "before": before, "after": _measure(index, queries),
+            "merged": merged, "evicted": evicted, "truncated": truncated}
+
+
+_last_compaction = None
+
+
+def compact_memories(max_entries=None):
+    """
+    One maintenance pass over the local index: merge near-duplicates, re-trim
+    oversized results and evict down to max_entries (MEMORY_MAX_ENTRIES).
+    Only one process compacts at a time; the others get {"status": "busy"}.
+    """
+    global _last_compaction
+    if not LOCAL_INDEX_ENABLED:
+        return {"status": "disabled"}
+    index = get_local_index()
+    with open(os.path.join(index.index_dir, ".compact.lock"), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return {"status": "busy"}
+        try:
+            started = time.monotonic()
+            result = _compact(index, max_entries or MAX_ENTRIES)
+            result["seconds"] = round(time.monotonic() - started, 3)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    _last_compaction = {**result, "at": time.time()}
+    return result
+
+
+async def run_compactor():
+    """
+    Compact every MEMORY_COMPACT_INTERVAL seconds while the index keeps growing.
+    """
+    if not LOCAL_INDEX_ENABLED or COMPACT_INTERVAL <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    compacted_rows = None
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL)
+        try:
+            rows = len(get_local_index())
+            if rows == compacted_rows:
+                continue
+            result = await loop.run_in_executor(None, compact_memories)
+            if result["status"] == "compacted":
+                before, after = result["before"], result["after"]
+                print(f"Memory compaction: {before['rows']} -> {after['rows']} rows, {before['bytes']} -> {after['bytes']} bytes, "
+                      f"search {before['search_ms']} -> {after['search_ms']} ms", file=sys.stderr)
+            compacted_rows = len(get_local_index())
+        except Exception as e:
+            print(f"Memory compaction failed: {e}", file=sys.stderr)
+
+
+def memory_stats():
+    return {
+        "queue": get_queue().stats(),
+        "index": get_local_index().stats() if LOCAL_INDEX_ENABLED else None,
+        "last_compaction": _last_compaction,
+    }
+
+
 async def retrieve_memories(query: str):
     """
     Retrieve relevant memories for a given query.
+    The local vector index answers first; memu is skipped only when the best
+    local hit reaches LOCAL_CONFIDENT_SCORE, otherwise its items follow the local ones.
     """
-    if not api_key:
-        return []
+    local = []
+    if LOCAL_INDEX_ENABLED:
+        try:
+            loop = asyncio.get_running_loop()
+            with profiling.span("local_search"):
+                items = await loop.run_in_executor(
+                    None, lambda: get_local_index().search(query, k=LOCAL_TOP_K, min_score=LOCAL_MIN_SCORE)
+                )
+            if items:
+                hits = await loop.run_in_executor(None, get_usage().retrieved, [item["id"] for item in items])
+                local = [{**item, "hits": hits.get(item["id"], 1)} for item in items]
+                if local[0]["score"] >= LOCAL_CONFIDENT_SCORE:
+                    return local
+        except Exception as e:
+            print(f"Local index error: {e}", file=sys.stderr)
+
+    if not memu_enabled():
+        return local
 
     try:
         # Search for relevant items
-        res = await service.retrieve(query=query)
-        return res.get("items", [])
+        with profiling.span("memu_retrieve"):
+            res = await get_service().retrieve(query=query)
+        return local + res.get("items", [])
     except Exception as e:
         print(f"Retrieval error: {e}", file=sys.stderr)
-        return []
+        return local
 
 if __name__ == "__main__":
+    profiling.mark("import")
     action = sys.argv[1] if len(sys.argv) > 1 else "retrieve"
     query_or_data = sys.argv[2] if len(sys.argv) > 2 else ""
-    
+
     if action == "memorize":
         # Expecting JSON string for data
         data = json.loads(query_or_data)
         result = asyncio.run(memorize_task(data['id'], data['goal'], data['result']))
+        # Without a resident flusher, ingest as soon as a full batch is waiting.
+        if result.get("depth", 0) >= get_queue().batch_size:
+            asyncio.run(flush_memories())
         print(json.dumps(result))
+    elif action == "flush":
+        print(json.dumps(asyncio.run(flush_memories())))
+    elif action == "stats":
+        print(json.dumps(memory_stats()))
+    elif action == "compact":
+        print(json.dumps(compact_memories()))
     else:
         memories = asyncio.run(retrieve_memories(query_or_data))
         print(json.dumps(memories))
@@ -0,0 +1,192 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import time
+
+# Opt-in profiling for the Python engines. AI_TEAM_PROFILE is a comma-separated
+# list of modes:
+#   spans        named phase timings: import, cache, prompt, client, llm_call, extract, ...
+#   cprofile     a pstats dump of the whole run
+#   tracemalloc  the top allocation sites and peak traced memory of the run
+# Any mode records spans. Each run appends one JSON line to spans.jsonl in
+# AI_TEAM_PROFILE_DIR, writes its dumps next to it and prints a one-line
+# summary to stderr. Nothing is written to stdout: the TS callers parse it.
+#
+# Scripts import this module before anything else, so the run started here
+# covers the interpreter's own imports. The resident worker also opens a span
+# session per request; cprofile and tracemalloc always cover the process.
+
+MODES = ("spans", "cprofile", "tracemalloc")
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "profiles")
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_session = contextvars.ContextVar("profile_session", default=None)
+_process = None
+_profiler = None
+
+
+def modes() -> set:
+    return {m.strip() for m in os.environ.get("AI_TEAM_PROFILE", "").split(",")} & set(MODES)
+
+
+def profile_dir() -> str:
+    return os.environ.get("AI_TEAM_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+
+
+def top_allocations() -> int:
+    return int(os.environ.get("AI_TEAM_PROFILE_TOP", "25"))
+
+
+class Session:
+    """
+    Spans of one run (a script invocation or one worker request).
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        self.marked = self.started
+        self.spans = []
+
+    def add(self, name, start, end):
+        self.spans.append((name, start - self.started, end - start))
+
+    def totals(self):
+        # Per-name total seconds and count, in order of first appearance.
+        totals = {}
+        for name, _, seconds in self.spans:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + seconds, count + 1)
+        return totals
+
+
+def _current():
+    # Threads do not inherit the context, so they report into the process run.
+    return _session.get() or _process
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Time a phase of the current run. Also usable as a decorator on sync functions.
+    """
+    session = _current()
+    if session is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.add(name, start, time.perf_counter())
+
+
+def mark(name):
+    """
+    Record a span from the previous mark (or the start of the run) to now.
+    """
+    session = _current()
+    if session is None:
+        return
+    now = time.perf_counter()
+    session.add(name, session.marked, now)
+    session.marked = now
+
+
+@contextlib.contextmanager
+def session(label):
+    """
+    A run of its own inside a profiled process. Runs that record no spans are not reported.
+    """
+    if _process is None:
+        yield
+        return
+    run = Session(label)
+    token = _session.set(run)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+        if run.spans:
+            _finish(run, time.perf_counter())
+
+
+def _prefix(run):
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(run.wall))
+    label = run.label.replace(os.sep, "_").replace(":", "_")
+    return os.path.join(profile_dir(), f"{label}-{stamp}-{os.getpid()}")
+
+
+def _write_tracemalloc(path, snapshot):
+    import tracemalloc
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    with open(path, "w") as f:
+        for stat in snapshot.statistics("lineno")[:top_allocations()]:
+            f.write(f"{stat}\n")
+
+
+def _finish(run, ended, dumps=False):
+    record = {
+        "label": run.label,
+        "pid": os.getpid(),
+        "started": run.wall,
+        "seconds": round(ended - run.started, 6),
+        "spans": [{"name": n, "start": round(s, 6), "seconds": round(d, 6)} for n, s, d in run.spans],
+    }
+    parts = [f"{name} {total * 1000:.1f}" + (f" x{count}" if count > 1 else "")
+             for name, (total, count) in run.totals().items()]
+    try:
+        os.makedirs(profile_dir(), exist_ok=True)
+        prefix = _prefix(run)
+        if dumps and "tracemalloc" in modes():
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                _, peak = tracemalloc.get_traced_memory()
+                _write_tracemalloc(prefix + ".tracemalloc.txt", tracemalloc.take_snapshot())
+                tracemalloc.stop()
+                record["peak_bytes"] = peak
+                record["tracemalloc"] = prefix + ".tracemalloc.txt"
+                parts.append(f"peak {peak / 1e6:.1f}MB")
+        if dumps and _profiler is not None:
+            _profiler.dump_stats(prefix + ".pstats")
+            record["pstats"] = prefix + ".pstats"
+        # One write per record, so concurrent processes append whole lines.
+        with open(os.path.join(profile_dir(), "spans.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+        where = f" -> {prefix}.*" if "pstats" in record or "tracemalloc" in record else ""
+    except OSError as e:
+        where = f" (profile not written: {e})"
+    print(f"profile {run.label} {record['seconds'] * 1000:.1f}ms | " + " | ".join(parts) + where, file=sys.stderr)
+
+
+def _finish_process():
+    ended = time.perf_counter()
+    if _profiler is not None:
+        _profiler.disable()
+    _finish(_process, ended, dumps=True)
+
+
+def _start_process(label):
+    global _process, _profiler
+    active = modes()
+    if "tracemalloc" in active:
+        import tracemalloc
+        tracemalloc.start(int(os.environ.get("AI_TEAM_PROFILE_FRAMES", "1")))
+    _process = Session(label)
+    if "cprofile" in active:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(_finish_process)
+
+
+_main_file = getattr(sys.modules.get("__main__"), "__file__", None)
+if modes() and _main_file and os.path.dirname(os.path.abspath(_main_file)) == _HERE:
+    _start_process(os.path.splitext(os.path.basename(_main_file))[0])
@@ -0,0 +1,94 @@
+import functools
+import json
+import re
+
+# Prompt layout shared by the engines, ordered for provider-side prefix caching:
+#   1. static instructions for the engine and role,
+#   2. the MCP tool catalog, sorted and serialized canonically,
+#   3. per-request data (memories, goal, errors, context), always in the user message.
+# 1 and 2 form the system message, so every call with the same role and tool
+# set starts with a byte-identical prefix. Both are built once per process.
+# When tool_index narrows a large catalog to the tools relevant to the goal,
+# that selection varies per request, so it moves to the top of the user
+# message and the system message keeps only the instructions.
+
+_WS_RE = re.compile(r"\s+")
+
+
+class PromptTemplate:
+    """
+    A system template with a {role} slot and one or more user templates.
+    """
+
+    def __init__(self, system: str, **user_templates):
+        self.system = system
+        self.user_templates = user_templates
+
+    @functools.lru_cache(maxsize=32)
+    def instructions(self, role: str = "") -> str:
+        return self.system.format(role=role) if "{role}" in self.system else self.system
+
+    def messages(self, user: str = "default", role: str = "", available_tools: str = "[]", tool_query: str = None,
+                 **fields):
+        """
+        tool_query (usually the goal) enables top-k tool retrieval for large catalogs.
+        """
+        system, relevant = self.instructions(role), ""
+        narrowed = False
+        if tool_query is not None:
+            from tool_index import get_retriever
+            tools, narrowed = get_retriever().select(available_tools, tool_query)
+            if narrowed:
+                relevant = render_relevant_tools(tools)
+        if not narrowed:
+            system += tool_catalog(available_tools)
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": relevant + self.user_templates[user].format(**fields)},
+        ]
+
+    def fixed_tokens(self, user: str = "default", role: str = "", available_tools: str = "[]", tool_query: str = None,
+                     **fields) -> int:
+        """
+        Tokens of everything but the fields, for context budgeting.
+        """
+        from context_assembler import estimate_tokens
+        messages = self.messages(user, role, available_tools, tool_query, **fields)
+        return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def _clean(text) -> str:
+    return _WS_RE.sub(" ", str(text or "")).strip()
+
+
+@functools.lru_cache(maxsize=32)
+def tool_catalog(available_tools: str) -> str:
+    """
+    Render the tools JSON (as sent by the TS side, in discovery order) sorted
+    by server and name, so the same tool set always renders the same bytes.
+    """
+    try:
+        tools = json.loads(available_tools or "[]")
+    except ValueError:
+        return ""
+    if not tools:
+        return ""
+    return "\n\n### AVAILABLE MCP TOOLS\n" + "\n".join(_tool_lines(tools)) + "\n"
+
+
+def _tool_lines(tools):
+    return sorted(
+        f"- {_clean(t.get('server'))}:{_clean(t.get('name'))}: {_clean(t.get('description'))}"
+        for t in tools
+        if isinstance(t, dict)
+    )
+
+
+def render_relevant_tools(tools) -> str:
+    return "### RELEVANT MCP TOOLS\n" + "\n".join(_tool_lines(tools)) + "\n\n"
+
+
+def render_memories(memory_texts) -> str:
+    if not memory_texts:
+        return ""
+    return "### RELEVANT PAST MEMORIES\n" + "".join(f"- {content}\n" for content in memory_texts) + "\n"
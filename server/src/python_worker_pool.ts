@@ -0,0 +1,161 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import * as path from 'path';
+import * as readline from 'readline';
+import { createLogger } from './logger';
+
+const logger = createLogger('PythonWorkerPool');
+const SERVER_ROOT = path.resolve(__dirname, '..');
+
+interface PendingCall {
+  resolve: (value: any) => void;
+  reject: (reason: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+/**
+ * A single resident `llm_worker.py` process speaking line-delimited JSON-RPC over stdio.
+ */
+class PythonWorker {
+  private proc: ChildProcessWithoutNullStreams;
+  private pending: Map<number, PendingCall> = new Map();
+  private nextId = 1;
+  public alive = true;
+
+  constructor(private index: number, private onExit: (worker: PythonWorker) => void) {
+    this.proc = spawn('python3', ['./src/llm_worker.py', '--stdio'], { cwd: SERVER_ROOT });
+
+    const lines = readline.createInterface({ input: this.proc.stdout });
+    lines.on('line', (line) => this.handleLine(line));
+
+    this.proc.stderr.on('data', (data) => {
+      logger.debug(`Worker ${this.index} stderr`, { output: data.toString().trim() });
+    });
+
+    this.proc.on('error', (err) => {
+      logger.error(`Worker ${this.index} failed to start`, { error: err.message });
+      this.shutdown(err);
+    });
+
+    // Writing to a worker that has already exited fails with EPIPE here, not in call().
+    this.proc.stdin.on('error', (err) => {
+      logger.error(`Worker ${this.index} stdin failed`, { error: err.message });
+      this.shutdown(err);
+      this.proc.kill();
+    });
+
+    this.proc.on('close', (code) => {
+      logger.warn(`Worker ${this.index} exited`, { code });
+      this.shutdown(new Error(`Python worker exited with code ${code}`));
+    });
+  }
+
+  public get load(): number {
+    return this.pending.size;
+  }
+
+  public call<T>(method: string, params: Record<string, any>, timeoutMs: number): Promise<T> {
+    if (!this.alive) return Promise.reject(new Error(`Python worker ${this.index} is not running`));
+    const id = this.nextId++;
+    return new Promise<T>((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Python worker call '${method}' timed out after ${timeoutMs}ms`));
+      }, timeoutMs);
+
+      this.pending.set(id, { resolve, reject, timer });
+      this.proc.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+    });
+  }
+
+  public kill() {
+    this.proc.kill();
+  }
+
+  /**
+   * Close stdin so the worker finishes in-flight calls and drains its memorize spool,
+   * killing it if it has not exited within graceMs.
+   */
+  public stop(graceMs: number): Promise<void> {
+    if (!this.alive) return Promise.resolve();
+    return new Promise((resolve) => {
+      const timer = setTimeout(() => {
+        this.proc.kill();
+        resolve();
+      }, graceMs);
+      this.proc.once('close', () => {
+        clearTimeout(timer);
+        resolve();
+      });
+      this.proc.stdin.end();
+    });
+  }
+
+  private handleLine(line: string) {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch (e: any) {
+      logger.error(`Worker ${this.index} sent malformed frame`, { line });
+      return;
+    }
+
+    const call = this.pending.get(message.id);
+    if (!call) return;
+    this.pending.delete(message.id);
+    clearTimeout(call.timer);
+
+    if (message.error) call.reject(new Error(message.error.message));
+    else call.resolve(message.result);
+  }
+
+  private shutdown(reason: Error) {
+    if (!this.alive) return;
+    this.alive = false;
+    this.pending.forEach((call) => {
+      clearTimeout(call.timer);
+      call.reject(reason);
+    });
+    this.pending.clear();
+    this.onExit(this);
+  }
+}
+
+/**
+ * Small pool of resident Python workers serving the LLM engines and memory actions.
+ * Requests go to the least-loaded worker; each worker handles many requests concurrently.
+ */
+export class PythonWorkerPool {
+  private workers: PythonWorker[] = [];
+  private spawned = 0;
+
+  constructor(private size: number = parseInt(process.env.LLM_WORKER_POOL_SIZE || '2')) {}
+
+  public call<T = any>(method: string, params: Record<string, any>, timeoutMs: number = 300000): Promise<T> {
+    return this.pickWorker().call<T>(method, params, timeoutMs);
+  }
+
+  public close() {
+    this.workers.forEach((worker) => worker.kill());
+    this.workers = [];
+  }
+
+  /**
+   * Graceful shutdown: lets every worker flush queued memories before exiting.
+   */
+  public async shutdown(graceMs: number = 10000): Promise<void> {
+    const workers = this.workers;
+    this.workers = [];
+    await Promise.all(workers.map((worker) => worker.stop(graceMs)));
+  }
+
+  private pickWorker(): PythonWorker {
+    while (this.workers.length < this.size) {
+      this.workers.push(new PythonWorker(this.spawned++, (dead) => {
+        this.workers = this.workers.filter((w) => w !== dead);
+      }));
+    }
+    return this.workers.reduce((best, w) => (w.load < best.load ? w : best));
+  }
+}
+
+export const pythonWorkerPool = new PythonWorkerPool();
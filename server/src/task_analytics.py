@@ -0,0 +1,422 @@
+import profiling
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Task analytics over the orchestrator's own records: the tasks table in
+# ai_team_governance.db (history is a JSON array of ExecutionResult), the
+# server/checkpoints/<task>_{planning,final}.json files and the LLM telemetry
+# JSONL. Each source is streamed in bounded memory (fetchmany chunks, one
+# checkpoint file at a time, history arrays decoded element by element) into
+# one row per task of NumPy columns.
+#
+# Columns and watermarks (tasks.updatedAt/id, checkpoint mtime, telemetry byte
+# offset) are persisted under TASK_ANALYTICS_DIR, so `refresh` only reads what
+# changed since the last run. Rewritten tasks (INSERT OR REPLACE) update their
+# row in place.
+
+_SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_DB_PATH = os.path.join(_SERVER_DIR, "ai_team_governance.db")
+DEFAULT_CHECKPOINT_DIR = os.path.join(_SERVER_DIR, "checkpoints")
+DEFAULT_STATE_DIR = os.path.join(_SERVER_DIR, ".cache", "task_analytics")
+
+# TaskStatus values in task_orchestrator.ts; -1 is unknown.
+STATUSES = ["pending", "planning", "executing", "repairing", "testing", "arbitrating", "completed", "failed"]
+CAUSES = ["unknown", "governance_intercept", "llm_failure", "shell_error", "workflow_error", "system_error"]
+FAILED_STATUSES = ("failed", "arbitrating")
+
+COLUMNS = {
+    "created": (np.float64, np.nan),
+    "planning": (np.float64, np.nan),
+    "final": (np.float64, np.nan),
+    "updated": (np.float64, np.nan),
+    "status": (np.int8, -1),
+    "attempts": (np.int16, 0),
+    "cause": (np.int8, 0),
+    "diagnosed": (np.bool_, False),
+    "arbitrated": (np.bool_, False),
+}
+
+_decoder = json.JSONDecoder()
+_SEPARATORS_RE = re.compile(r"[\s,]*")
+
+
+def db_path() -> str:
+    return os.environ.get("TASK_DB_PATH", DEFAULT_DB_PATH)
+
+
+def checkpoint_dir() -> str:
+    return os.environ.get("TASK_CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+
+
+def state_dir() -> str:
+    return os.environ.get("TASK_ANALYTICS_DIR", DEFAULT_STATE_DIR)
+
+
+def chunk_size() -> int:
+    return int(os.environ.get("TASK_ANALYTICS_CHUNK", "500"))
+
+
+def iter_json_array(text):
+    """
+    Yield the elements of a JSON array one at a time, so a long history is
+    never materialized as one list.
+    """
+    pos = _SEPARATORS_RE.match(text, 0).end()
+    if pos >= len(text) or text[pos] != "[":
+        return
+    pos += 1
+    while True:
+        pos = _SEPARATORS_RE.match(text, pos).end()
+        if pos >= len(text) or text[pos] == "]":
+            return
+        value, pos = _decoder.raw_decode(text, pos)
+        yield value
+
+
+def parse_time(value):
+    if not value:
+        return np.nan
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return np.nan
+
+
+def failure_cause(result) -> str:
+    """
+    Classify a failed ExecutionResult by how executor.ts reports each failure.
+    """
+    error = result.get("error") or ""
+    validation = result.get("governanceValidation")
+    if error.startswith("INTERCEPTED:") or (validation and validation.get("isValid") is False):
+        return "governance_intercept"
+    if error.startswith("LLM generation failed"):
+        return "llm_failure"
+    if error.startswith("Workflow parse error"):
+        return "workflow_error"
+    if error.startswith("Command failed") or "exit code" in error.lower():
+        return "shell_error"
+    return "system_error" if error else "unknown"
+
+
+class TaskColumns:
+    """
+    One row per task id, stored column-wise in growable NumPy arrays.
+    """
+
+    def __init__(self, capacity=1024):
+        self.ids = []
+        self.index = {}
+        self.capacity = capacity
+        self.data = {name: np.full(capacity, fill, dtype=dtype) for name, (dtype, fill) in COLUMNS.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, task_id) -> int:
+        i = self.index.get(task_id)
+        if i is not None:
+            return i
+        if len(self.ids) == self.capacity:
+            self.capacity *= 2
+            for name, (dtype, fill) in COLUMNS.items():
+                grown = np.full(self.capacity, fill, dtype=dtype)
+                grown[:len(self.ids)] = self.data[name]
+                self.data[name] = grown
+        i = len(self.ids)
+        self.ids.append(task_id)
+        self.index[task_id] = i
+        return i
+
+    def column(self, name):
+        return self.data[name][:len(self.ids)]
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, ids=np.array(self.ids, dtype=str), **{name: self.column(name) for name in COLUMNS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        columns = cls()
+        try:
+            with np.load(path) as saved:
+                ids = [str(i) for i in saved["ids"]]
+                columns = cls(max(1024, len(ids) * 2))
+                for name in COLUMNS:
+                    columns.data[name][:len(ids)] = saved[name]
+        except (OSError, ValueError, KeyError):
+            return cls()
+        columns.ids = ids
+        columns.index = {task_id: i for i, task_id in enumerate(ids)}
+        return columns
+
+
+class TaskAnalytics:
+    def __init__(self, directory=None, db=None, checkpoints=None, telemetry=None):
+        from llm_telemetry import telemetry_path
+        self.directory = directory or state_dir()
+        self.db = db or db_path()
+        self.checkpoints = checkpoints or checkpoint_dir()
+        self.telemetry = telemetry or telemetry_path()
+        self.columns = TaskColumns()
+        self.state = self._empty_state()
+        self.last_refresh = {}
+
+    @staticmethod
+    def _empty_state():
+        return {
+            "db": {"updated_at": "", "id": ""},
+            "checkpoints": {"mtime_ns": 0, "name": ""},
+            "telemetry": {"offset": 0, "inode": None, "engines": {}},
+        }
+
+    @property
+    def _columns_path(self):
+        return os.path.join(self.directory, "columns.npz")
+
+    @property
+    def _state_path(self):
+        return os.path.join(self.directory, "state.json")
+
+    def load(self):
+        try:
+            with open(self._state_path) as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            return self
+        self.columns = TaskColumns.load(self._columns_path)
+        return self
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.columns.save(self._columns_path)
+        tmp = f"{self._state_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self._state_path)
+
+    def reset(self):
+        self.columns = TaskColumns()
+        self.state = self._empty_state()
+
+    # -- sources ---------------------------------------------------------------
+
+    def _apply_task(self, task_id, status, history, created_at, updated_at):
+        i = self.columns.row(task_id)
+        data = self.columns.data
+        data["created"][i] = parse_time(created_at)
+        data["updated"][i] = parse_time(updated_at)
+        data["status"][i] = STATUSES.index(status) if status in STATUSES else -1
+        last, diagnosed, arbitrated = None, False, False
+        try:
+            for result in iter_json_array(history or "[]"):
+                if not isinstance(result, dict):
+                    continue
+                last = result
+                diagnosed = diagnosed or bool(result.get("diagnosis"))
+                arbitrated = arbitrated or bool(result.get("arbitrationDecision"))
+        except ValueError:
+            pass
+        data["diagnosed"][i] = diagnosed
+        data["arbitrated"][i] = arbitrated
+        if last is not None:
+            data["attempts"][i] = last.get("attempt") or data["attempts"][i]
+            data["cause"][i] = CAUSES.index(failure_cause(last)) if status in FAILED_STATUSES else 0
+
+    def _read_db(self):
+        if not os.path.exists(self.db):
+            return 0
+        mark = self.state["db"]
+        conn = sqlite3.connect(f"file:{self.db}?mode=ro", uri=True)
+        rows = 0
+        try:
+            cursor = conn.execute(
+                "SELECT id, currentStatus, history, createdAt, updatedAt FROM tasks"
+                " WHERE updatedAt > ? OR (updatedAt = ? AND id > ?) ORDER BY updatedAt, id",
+                (mark["updated_at"], mark["updated_at"], mark["id"]),
+            )
+            while True:
+                chunk = cursor.fetchmany(chunk_size())
+                if not chunk:
+                    break
+                for task_id, status, history, created_at, updated_at in chunk:
+                    self._apply_task(task_id, status, history, created_at, updated_at)
+                rows += len(chunk)
+                mark["updated_at"], mark["id"] = chunk[-1][4], chunk[-1][0]
+        except sqlite3.OperationalError as e:
+            print(f"Task table read error: {e}", file=sys.stderr)
+        finally:
+            conn.close()
+        return rows
+
+    def _read_checkpoints(self):
+        if not os.path.isdir(self.checkpoints):
+            return 0
+        mark = self.state["checkpoints"]
+        watermark = (mark["mtime_ns"], mark["name"])
+        pending = []
+        with os.scandir(self.checkpoints) as entries:
+            for entry in entries:
+                if entry.name.endswith(("_planning.json", "_final.json")):
+                    key = (entry.stat().st_mtime_ns, entry.name)
+                    if key > watermark:
+                        pending.append(key)
+        data = self.columns.data
+        for mtime_ns, name in sorted(pending):
+            try:
+                with open(os.path.join(self.checkpoints, name)) as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                continue
+            i = self.columns.row(checkpoint.get("taskId") or name.rsplit("_", 1)[0])
+            ts = parse_time(checkpoint.get("timestamp"))
+            state = checkpoint.get("state") or {}
+            if checkpoint.get("phase") == "planning":
+                data["planning"][i] = ts
+            elif checkpoint.get("phase") == "final":
+                data["final"][i] = ts
+                # The task row is authoritative; checkpoints fill in tasks missing from the database.
+                if data["status"][i] < 0 and state.get("status") in STATUSES:
+                    data["status"][i] = STATUSES.index(state["status"])
+                if not data["attempts"][i]:
+                    data["attempts"][i] = state.get("attempts") or 0
+            mark["mtime_ns"], mark["name"] = mtime_ns, name
+        return len(pending)
+
+    def _read_telemetry_lines(self, f, mark):
+        lines = 0
+        f.seek(mark["offset"])
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            mark["offset"] += len(line)
+            lines += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            # A coalesced follower waited on another call's latency; counting it would double it.
+            if record.get("outcome") == "coalesced":
+                continue
+            engine = mark["engines"].setdefault(record.get("engine") or "default", {"seconds": 0.0, "calls": 0})
+            engine["seconds"] += record.get("latency") or 0.0
+            engine["calls"] += 1
+        return lines
+
+    def _read_telemetry(self):
+        try:
+            f = open(self.telemetry, "rb")
+        except FileNotFoundError:
+            return 0
+        mark = self.state["telemetry"]
+        lines = 0
+        with f:
+            stat = os.fstat(f.fileno())
+            if mark.get("inode") is not None and stat.st_ino != mark["inode"]:
+                # Rotated by llm_telemetry: finish the previous generation (<path>.1) first.
+                try:
+                    with open(f"{self.telemetry}.1", "rb") as rotated:
+                        if os.fstat(rotated.fileno()).st_ino == mark["inode"]:
+                            lines += self._read_telemetry_lines(rotated, mark)
+                except FileNotFoundError:
+                    pass
+                mark["offset"] = 0
+            elif stat.st_size < mark["offset"]:
+                # Truncated: start over.
+                mark["offset"], mark["engines"] = 0, {}
+            mark["inode"] = stat.st_ino
+            lines += self._read_telemetry_lines(f, mark)
+        return lines
+
+    def refresh(self, full=False):
+        started = time.monotonic()
+        if full:
+            self.reset()
+        # Checkpoints last: a final checkpoint only fills what the task row left unknown.
+        rows = self._read_db()
+        checkpoints = self._read_checkpoints()
+        telemetry = self._read_telemetry()
+        self.last_refresh = {"full": full, "task_rows": rows, "checkpoints": checkpoints,
+                             "telemetry_lines": telemetry, "elapsed": round(time.monotonic() - started, 4)}
+        return self
+
+    # -- report ----------------------------------------------------------------
+
+    @staticmethod
+    def _distribution(values):
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return {"count": 0}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {"count": int(len(values)), "mean": float(values.mean()), "p50": float(p50), "p90": float(p90),
+                "p99": float(p99), "max": float(values.max())}
+
+    def report(self):
+        c = self.columns
+        status = c.column("status")
+        attempts = c.column("attempts")
+        cause = c.column("cause")
+        completed = status == STATUSES.index("completed")
+        failed = np.isin(status, [STATUSES.index(s) for s in FAILED_STATUSES])
+
+        execution = c.column("final") - c.column("planning")
+        total = c.column("updated") - c.column("created")
+        phases = {
+            "queue": self._distribution(c.column("planning") - c.column("created")),
+            "execution": self._distribution(execution),
+            "total": self._distribution(total),
+        }
+
+        attempts_ok = np.bincount(attempts[completed].clip(min=0), minlength=1)
+        engines = self.state["telemetry"]["engines"]
+        llm_seconds = sum(e["seconds"] for e in engines.values())
+        # Tasks without checkpoints count their whole lifetime.
+        execution_seconds = float(np.nansum(np.where(np.isfinite(execution), execution, total)))
+        # Engine time as a share of task execution time; what the engines do not
+        # account for is shell execution, governance checks and overhead.
+        denominator = max(execution_seconds, llm_seconds) or 1.0
+        engine_time = {name: {"seconds": round(e["seconds"], 3), "calls": e["calls"],
+                              "share": round(e["seconds"] / denominator, 4)}
+                       for name, e in sorted(engines.items())}
+        other = max(execution_seconds - llm_seconds, 0.0)
+        engine_time["other"] = {"seconds": round(other, 3), "share": round(other / denominator, 4)}
+
+        return {
+            "tasks": len(c),
+            "by_status": {STATUSES[s] if s >= 0 else "unknown": int(n)
+                          for s, n in zip(*np.unique(status, return_counts=True))},
+            "success_rate": float(completed.sum() / (completed.sum() + failed.sum())) if completed.any() or failed.any() else None,
+            "phases": phases,
+            "attempts_to_success": {str(a): int(n) for a, n in enumerate(attempts_ok) if n and a},
+            "failure_causes": {CAUSES[k]: int(n) for k, n in zip(*np.unique(cause[failed], return_counts=True))},
+            "diagnosed": int(c.column("diagnosed").sum()),
+            "arbitrated": int(c.column("arbitrated").sum()),
+            "engine_time": engine_time,
+            "refresh": self.last_refresh,
+        }
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    action = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    analytics = TaskAnalytics()
+    if action == "reset":
+        analytics.save()
+        print(json.dumps({"reset": True}))
+    elif action in ("refresh", "rescan"):
+        # refresh continues from the stored watermarks; rescan reads everything again.
+        analytics.load().refresh(full=action == "rescan")
+        analytics.save()
+        print(json.dumps(analytics.report(), indent=2))
+    else:
+        print("Usage: python3 task_analytics.py [refresh|rescan|reset]")
+        sys.exit(1)
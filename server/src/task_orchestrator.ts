@@ -4,7 +4,7 @@ import { ExecutionResult } from './executor';
 import { saveTask, getAllTasks } from './database';
 import { createLogger } from './logger';
 import { checkpointManager } from './checkpoint';
-import { spawn } from 'child_process';
+import { pythonWorkerPool } from './python_worker_pool';
 
 const logger = createLogger('TaskOrchestrator');
 
@@ -88,18 +88,15 @@ export class TaskOrchestrator {
   }
 
   private memorizeTask(id: string, goal: string, result: string) {
-    const data = JSON.stringify({ id, goal, result });
-    const pythonProcess = spawn('python3', ['./src/memory_engine.py', 'memorize', data], {
-      cwd: path.resolve(__dirname, '..'),
-    });
-
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
-        logger.info(`Task ${id} memorized successfully`);
-      } else {
-        logger.error(`Failed to memorize task ${id}`);
-      }
-    });
+    pythonWorkerPool.call('memory.memorize', { id, goal, result })
+      .then((res: any) => {
+        if (res && res.status === 'success') {
+          logger.info(`Task ${id} memorized successfully`);
+        } else {
+          logger.error(`Failed to memorize task ${id}`, { message: res && res.message });
+        }
+      })
+      .catch((error: Error) => logger.error(`Failed to memorize task ${id}`, { error: error.message }));
   }
 
   private async processTask(taskId: string): Promise<void> {
@@ -125,6 +122,7 @@ export class TaskOrchestrator {
         role: task.assignedRole,
         goal: task.goal,
         context: task.context,
+        taskId,
       };
 
       // We handle the loop within executor, but we can intercept or monitor if needed.
@@ -1,4 +1,11 @@
-import { spawn } from 'child_process';
+import { randomUUID } from 'crypto';
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+import { pythonWorkerPool } from './python_worker_pool';
+
+// 超过该长度的错误输出写入临时文件，由诊断器流式读取并压缩，避免整段日志进入一个 JSON 帧
+const ERROR_FILE_THRESHOLD = 1024 * 1024;
 
 export interface ErrorDiagnosis {
   isSyntaxError: boolean;
@@ -6,50 +13,63 @@ export interface ErrorDiagnosis {
   isLogicError: boolean;
   diagnosis: string;
   suggestedFix: string;
+  fingerprint?: string; // 归一化错误指纹，用于复用已知诊断
+  cached?: boolean; // 是否来自本地诊断库
+  condensed?: {
+    lines: number;
+    bytes: number;
+    tokens: number;
+    dropped: Record<string, number>; // progress / repeated / duplicate / omitted
+    error_blocks: number;
+    stack_traces: number;
+  }; // 日志被压缩时的统计
 }
 
-export async function diagnoseAndSuggestFix(errorOutput: string, context: string): Promise<ErrorDiagnosis> {
-  console.log(`[TesterEngine] Requesting error diagnosis for: ${errorOutput}`);
-
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python3', [
-      './src/llm_error_diagnoser.py',
-      errorOutput,
-      context,
-    ], {
-      cwd: '/home/ubuntu/ai-team-frontend/server',
-    });
-
-    let output = '';
-    let errorOutputFromPython = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
+/**
+ * Pass error output to a worker call: inline, or above ERROR_FILE_THRESHOLD as
+ * error_path to a temp file that is removed once the call settles.
+ */
+export async function withErrorOutput<T>(
+  errorOutput: string,
+  call: (params: { error_output: string; error_path?: string }) => Promise<T>
+): Promise<T> {
+  if (errorOutput.length <= ERROR_FILE_THRESHOLD) {
+    return call({ error_output: errorOutput });
+  }
+  const errorPath = path.join(os.tmpdir(), `ai-team-error-${randomUUID()}.log`);
+  await fs.promises.writeFile(errorPath, errorOutput);
+  try {
+    return await call({ error_output: '', error_path: errorPath });
+  } finally {
+    await fs.promises.unlink(errorPath).catch(() => undefined);
+  }
+}
 
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutputFromPython += data.toString();
-    });
+export async function diagnoseAndSuggestFix(errorOutput: string, context: string, taskId?: string): Promise<ErrorDiagnosis> {
+  const preview = errorOutput.length > 500 ? `${errorOutput.slice(0, 500)}... (${errorOutput.length} chars)` : errorOutput;
+  console.log(`[TesterEngine] Requesting error diagnosis for: ${preview}`);
 
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error(`[TesterEngine] Python script exited with code ${code}: ${errorOutputFromPython}`);
-        reject(new Error(`Failed to diagnose error: ${errorOutputFromPython}`));
-      } else {
-        try {
-          const diagnosis = JSON.parse(output.trim()) as ErrorDiagnosis;
-          console.log(`[TesterEngine] Diagnosis received: ${JSON.stringify(diagnosis, null, 2)}`);
-          resolve(diagnosis);
-        } catch (parseError: any) {
-          console.error(`[TesterEngine] Failed to parse JSON from Python script: ${parseError.message}, Raw output: ${output}`);
-          reject(new Error(`Failed to parse diagnosis: ${parseError.message}`));
-        }
-      }
-    });
+  try {
+    const output = await withErrorOutput(errorOutput, (errorParams) =>
+      pythonWorkerPool.call<string>('diagnose_error', { ...errorParams, context, task_id: taskId })
+    );
+    const diagnosis = JSON.parse(output.trim()) as ErrorDiagnosis;
+    console.log(`[TesterEngine] Diagnosis received: ${JSON.stringify(diagnosis, null, 2)}`);
+    return diagnosis;
+  } catch (error: any) {
+    console.error(`[TesterEngine] Failed to diagnose error: ${error.message}`);
+    throw new Error(`Failed to diagnose error: ${error.message}`);
+  }
+}
 
-    pythonProcess.on('error', (err) => {
-      console.error(`[TesterEngine] Failed to start Python subprocess: ${err.message}`);
-      reject(err);
-    });
-  });
+/**
+ * Tell the diagnosis store whether the fix suggested for a fingerprint worked on the next attempt.
+ * Fixes that did not work are invalidated so the next occurrence is re-diagnosed by the LLM.
+ */
+export async function reportFixOutcome(fingerprint: string, worked: boolean): Promise<void> {
+  try {
+    await pythonWorkerPool.call('diagnosis.feedback', { fingerprint, worked });
+  } catch (error: any) {
+    console.error(`[TesterEngine] Failed to report fix outcome for ${fingerprint}: ${error.message}`);
+  }
 }
@@ -0,0 +1,311 @@
+import profiling
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Tool retrieval for the generator and repair prompts. The MCP catalog arrives
+# as the JSON the TS side sends with every call; once it holds more than
+# LLM_TOOL_TOP_K tools, only the top-k tools for the goal (BM25 over tool
+# name, server, description and input-schema fields) are put in the prompt.
+# When nothing matches the goal the full catalog is used as before.
+#
+# The index is keyed by a hash of the canonical catalog, so it is rebuilt only
+# when the catalog changes. Stats cover query latency, fallbacks and recall:
+# the share of tools used by generated workflows that were in the selection.
+
+K1 = 1.2
+B = 0.75
+# Field weights, applied by repeating the field's tokens.
+FIELD_WEIGHTS = {"name": 3, "server": 2, "description": 1, "schema": 1}
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_CJK_RE = re.compile(r"[㐀-鿿]+")
+
+
+def top_k() -> int:
+    return int(os.environ.get("LLM_TOOL_TOP_K", "8"))
+
+
+def min_score() -> float:
+    return float(os.environ.get("LLM_TOOL_MIN_SCORE", "0"))
+
+
+def tokenize(text) -> list:
+    """
+    Lowercase word tokens with camelCase and snake_case split, plus character
+    bigrams for CJK runs (goals are often written in Chinese).
+    """
+    tokens = []
+    for word in _WORD_RE.findall(str(text or "")):
+        if _CJK_RE.fullmatch(word):
+            tokens.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+            continue
+        parts = _CAMEL_RE.findall(word) or [word]
+        tokens.extend(p.lower() for p in parts)
+        if len(parts) > 1:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _schema_text(schema, depth=0):
+    # Property names, descriptions and enum values, nested up to a few levels.
+    if not isinstance(schema, dict) or depth > 3:
+        return
+    for name, prop in (schema.get("properties") or {}).items():
+        yield name
+        if isinstance(prop, dict):
+            yield prop.get("description") or ""
+            for value in prop.get("enum") or []:
+                yield str(value)
+            yield from _schema_text(prop, depth + 1)
+            yield from _schema_text(prop.get("items"), depth + 1)
+
+
+def tool_key(tool) -> str:
+    return f"{tool.get('server')}:{tool.get('name')}"
+
+
+def catalog_hash(tools) -> str:
+    canonical = json.dumps(sorted(tools, key=tool_key), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ToolIndex:
+    """
+    BM25 over one catalog. Build once, query many times.
+    """
+
+    def __init__(self, tools):
+        self.tools = sorted((t for t in tools if isinstance(t, dict)), key=tool_key)
+        self.postings = {}
+        lengths = []
+        for i, tool in enumerate(self.tools):
+            fields = {
+                "name": tokenize(tool.get("name")),
+                "server": tokenize(tool.get("server")),
+                "description": tokenize(tool.get("description")),
+                "schema": tokenize(" ".join(_schema_text(tool.get("inputSchema")))),
+            }
+            counts = {}
+            for field, tokens in fields.items():
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + FIELD_WEIGHTS[field]
+            for token, tf in counts.items():
+                self.postings.setdefault(token, []).append((i, tf))
+            lengths.append(sum(counts.values()))
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+        n = len(self.tools)
+        self.idf = {token: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for token, p in self.postings.items()}
+
+    def search(self, query, k):
+        """
+        [(score, tool)] for the k best-scoring tools with a positive score.
+        """
+        scores = {}
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i, tf in self.postings[token]:
+                norm = K1 * (1 - B + B * self.lengths[i] / self.avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, self.tools[i]) for i, score in ranked]
+
+
+class ToolRetriever:
+    """
+    Per-process index cache (by catalog hash), selection cache and stats.
+    """
+
+    def __init__(self, max_indexes=4, max_selections=256):
+        self.lock = threading.Lock()
+        self.raw_hashes = OrderedDict()
+        self.indexes = OrderedDict()
+        self.selections = OrderedDict()
+        self.max_indexes = max_indexes
+        self.max_selections = max_selections
+        self.latencies = deque(maxlen=512)
+        self.counters = {"queries": 0, "cached": 0, "narrowed": 0, "builds": 0, "build_seconds": 0.0,
+                         "selected": 0, "catalog_size": 0, "fallbacks": {}, "used": 0, "used_selected": 0}
+
+    def _index(self, tools_json):
+        """
+        (catalog hash, index). The raw JSON is mapped to its canonical hash
+        first, so a reordered catalog reuses the index instead of rebuilding it.
+        """
+        raw_key = hashlib.sha256(tools_json.encode("utf-8")).hexdigest()
+        with self.lock:
+            digest = self.raw_hashes.get(raw_key)
+            if digest in self.indexes:
+                self.indexes.move_to_end(digest)
+                return digest, self.indexes[digest]
+        tools = json.loads(tools_json or "[]")
+        tools = [t for t in tools if isinstance(t, dict)] if isinstance(tools, list) else []
+        digest = catalog_hash(tools)
+        with self.lock:
+            self.raw_hashes[raw_key] = digest
+            while len(self.raw_hashes) > self.max_selections:
+                self.raw_hashes.popitem(last=False)
+            if digest in self.indexes:
+                self.indexes.move_to_end(digest)
+                return digest, self.indexes[digest]
+        started = time.perf_counter()
+        index = ToolIndex(tools)
+        with self.lock:
+            self.counters["builds"] += 1
+            self.counters["build_seconds"] += time.perf_counter() - started
+            self.indexes[digest] = index
+            while len(self.indexes) > self.max_indexes:
+                self.indexes.popitem(last=False)
+        return digest, index
+
+    def _fallback(self, reason):
+        # Caller holds self.lock.
+        self.counters["fallbacks"][reason] = self.counters["fallbacks"].get(reason, 0) + 1
+
+    def select(self, tools_json, query, k=None):
+        """
+        (tools, narrowed): the tools to show for query, and whether that is a
+        top-k subset rather than the whole catalog.
+        """
+        k = top_k() if k is None else k
+        try:
+            digest, index = self._index(tools_json)
+        except ValueError:
+            return [], False
+        selection_key = (digest, query, k)
+        with self.lock:
+            if selection_key in self.selections:
+                self.selections.move_to_end(selection_key)
+                self.counters["cached"] += 1
+                return self.selections[selection_key]
+
+        started = time.perf_counter()
+        if k <= 0 or len(index.tools) <= k:
+            result, reason = (index.tools, False), "small_catalog" if k > 0 else "disabled"
+        else:
+            hits = [tool for score, tool in index.search(query, k) if score > min_score()]
+            result, reason = ((hits, True), None) if hits else ((index.tools, False), "no_match")
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.counters["queries"] += 1
+            self.counters["catalog_size"] = len(index.tools)
+            self.latencies.append(elapsed)
+            if reason:
+                self._fallback(reason)
+            else:
+                self.counters["narrowed"] += 1
+                self.counters["selected"] += len(result[0])
+            self.selections[selection_key] = result
+            while len(self.selections) > self.max_selections:
+                self.selections.popitem(last=False)
+        return result
+
+    def observe_usage(self, tools_json, query, outputs, k=None):
+        """
+        Count the tools that generated workflows actually use, and how many of
+        them the selection for query included. Only narrowed selections count.
+        """
+        tools, narrowed = self.select(tools_json, query, k)
+        if not narrowed:
+            return
+        selected = {tool_key(t) for t in tools}
+        used = set()
+        for output in outputs:
+            try:
+                data = json.loads(output)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(data, dict) or data.get("type") != "workflow":
+                continue
+            for step in (data.get("plan") or {}).get("steps") or []:
+                if isinstance(step, dict):
+                    used.add(f"{step.get('server')}:{step.get('tool')}")
+        with self.lock:
+            self.counters["used"] += len(used)
+            self.counters["used_selected"] += len(used & selected)
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            c = dict(self.counters, fallbacks=dict(self.counters["fallbacks"]))
+        return {
+            **c,
+            "top_k": top_k(),
+            "mean_selected": c["selected"] / c["narrowed"] if c["narrowed"] else None,
+            "recall": c["used_selected"] / c["used"] if c["used"] else None,
+            "latency_ms_p50": latencies[len(latencies) // 2] * 1000 if latencies else None,
+            "latency_ms_p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        }
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> ToolRetriever:
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = ToolRetriever()
+    return _retriever
+
+
+def evaluate(tools, cases, k=None):
+    """
+    Offline recall@k and latency over [{"query": ..., "tools": ["server:name", ...]}].
+    """
+    k = top_k() if k is None else k
+    started = time.perf_counter()
+    index = ToolIndex(tools)
+    build = time.perf_counter() - started
+    hits = expected = 0
+    latencies = []
+    for case in cases:
+        started = time.perf_counter()
+        found = {tool_key(tool) for _, tool in index.search(case["query"], k)}
+        latencies.append(time.perf_counter() - started)
+        wanted = set(case["tools"])
+        hits += len(wanted & found)
+        expected += len(wanted)
+    latencies.sort()
+    return {
+        "tools": len(index.tools),
+        "cases": len(cases),
+        "k": k,
+        "recall": hits / expected if expected else None,
+        "build_ms": build * 1000,
+        "latency_ms_p50": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "latency_ms_p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    profiling.mark("import")
+    action = sys.argv[1] if len(sys.argv) > 1 else ""
+    if action == "search" and len(sys.argv) > 3:
+        with open(sys.argv[2]) as f:
+            catalog = json.load(f)
+        index = ToolIndex(catalog)
+        print(json.dumps([{"tool": tool_key(t), "score": round(s, 4)} for s, t in index.search(sys.argv[3], top_k())]))
+    elif action == "eval" and len(sys.argv) > 3:
+        # eval <catalog.json> <cases.jsonl>
+        with open(sys.argv[2]) as f:
+            catalog = json.load(f)
+        with open(sys.argv[3]) as f:
+            cases = [json.loads(line) for line in f if line.strip()]
+        print(json.dumps(evaluate(catalog, cases), indent=2))
+    else:
+        print("Usage: python3 tool_index.py [search <catalog.json> <query> | eval <catalog.json> <cases.jsonl>]")
+        sys.exit(1)
@@ -0,0 +1,283 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Local retrieval tier for memory_engine.
+# Embeddings live in an append-only float32 matrix (embeddings.f32) that is
+# memory-mapped for search; row metadata lives in a sidecar metadata.jsonl with
+# one line per row. Vectors are L2-normalized on insert, so cosine similarity
+# is a single matrix-vector product. Appends and compaction rewrites hold an
+# exclusive lock on .lock; readers take it shared while they pick up changes.
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "memory_index")
+DEFAULT_DIM = 384
+
+_TOKEN_RE = re.compile(r"[\w]+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline embedder: hashes word unigrams, bigrams and character
+    trigrams into a fixed number of signed buckets. No network, no model files.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def _features(self, text: str):
+        words = _TOKEN_RE.findall(text.lower())
+        for word in words:
+            yield "w:" + word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3], 0.5
+        for a, b in zip(words, words[1:]):
+            yield f"b:{a} {b}", 0.7
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vec[bucket] += sign * weight
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+
+class OpenAIEmbedder:
+    """
+    Embeds through the OpenAI-compatible endpoint configured for llm_client.
+    """
+
+    name = "openai"
+
+    def __init__(self, model: str, dim: int):
+        self.model = model
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        from llm_client import get_llm_client
+        response = get_llm_client().embeddings.create(model=self.model, input=text)
+        vec = np.asarray(response.data[0].embedding, dtype=np.float32)[: self.dim]
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+
+class CachedEmbedder:
+    """
+    LRU in front of an embedder so each distinct string is embedded once per process.
+    """
+
+    def __init__(self, embedder, max_entries: int = 4096):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.dim = embedder.dim
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        with self.lock:
+            vec = self.cache.get(text)
+            if vec is not None:
+                self.cache.move_to_end(text)
+                self.hits += 1
+                return vec
+        vec = self.embedder.embed(text)
+        with self.lock:
+            self.misses += 1
+            self.cache[text] = vec
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return vec
+
+
+def get_embedder():
+    kind = os.environ.get("MEMORY_EMBEDDER", "hashing")
+    dim = int(os.environ.get("MEMORY_EMBEDDING_DIM", str(DEFAULT_DIM)))
+    if kind == "openai":
+        model = os.environ.get("MEMORY_EMBEDDING_MODEL", "nvidia/nv-embedqa-e5-v5")
+        embedder = OpenAIEmbedder(model, dim)
+    else:
+        embedder = HashingEmbedder(dim)
+    return CachedEmbedder(embedder, int(os.environ.get("MEMORY_EMBEDDING_CACHE", "4096")))
+
+
+class VectorIndex:
+    def __init__(self, index_dir=None, embedder=None):
+        self.index_dir = index_dir or os.environ.get("MEMORY_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self.embedder = embedder or get_embedder()
+        self.dim = self.embedder.dim
+        self.matrix_path = os.path.join(self.index_dir, "embeddings.f32")
+        self.meta_path = os.path.join(self.index_dir, "metadata.jsonl")
+        self.lock_path = os.path.join(self.index_dir, ".lock")
+        self.header_path = os.path.join(self.index_dir, "index.json")
+        self._matrix = None
+        self._rows = 0
+        self._metadata = []
+        self._meta_offset = 0
+        self._matrix_inode = None
+        self.lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._check_header()
+
+    def _check_header(self):
+        header = {"dim": self.dim, "embedder": self.embedder.name, "dtype": "float32"}
+        if os.path.exists(self.header_path):
+            with open(self.header_path) as f:
+                existing = json.load(f)
+            if existing != header:
+                raise ValueError(f"Memory index at {self.index_dir} was built with {existing}, not {header}")
+        else:
+            with open(self.header_path, "w") as f:
+                json.dump(header, f)
+
+    def __len__(self):
+        return self._row_count()
+
+    def _row_count(self):
+        try:
+            return os.path.getsize(self.matrix_path) // (self.dim * 4)
+        except OSError:
+            return 0
+
+    def add(self, text: str, metadata: dict) -> int:
+        """
+        Append one document. The matrix row and its metadata line are written
+        under an exclusive file lock so concurrent worker processes stay aligned.
+        """
+        vec = self.embedder.embed(text).astype(np.float32)
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                row = self._row_count()
+                with open(self.matrix_path, "ab") as f:
+                    f.write(vec.tobytes())
+                with open(self.meta_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**metadata, "row": row}, ensure_ascii=False) + "\n")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return row
+
+    def _file_lock(self, mode):
+        lock_file = open(self.lock_path, "a")
+        fcntl.flock(lock_file, mode)
+        return lock_file
+
+    def _refresh(self):
+        lock_file = self._file_lock(fcntl.LOCK_SH)
+        try:
+            self._refresh_locked()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _refresh_locked(self):
+        try:
+            inode = os.stat(self.matrix_path).st_ino
+        except OSError:
+            inode = None
+        if inode != self._matrix_inode:
+            # Rewritten by compaction: start over from the new files.
+            self._matrix, self._rows, self._metadata, self._meta_offset = None, 0, [], 0
+            self._matrix_inode = inode
+        rows = self._row_count()
+        if rows != self._rows or self._matrix is None:
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+            self._rows = rows
+        # Read only metadata lines appended since the last refresh.
+        if os.path.exists(self.meta_path) and os.path.getsize(self.meta_path) > self._meta_offset:
+            with open(self.meta_path, "rb") as f:
+                f.seek(self._meta_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._metadata.append(json.loads(line))
+                    self._meta_offset += len(line)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0):
+        """
+        Return up to k metadata dicts (with a "score") ranked by cosine similarity.
+        """
+        with self.lock:
+            self._refresh()
+            matrix, metadata = self._matrix, self._metadata
+            rows = min(self._rows, len(metadata))
+        if not rows:
+            return []
+
+        query_vec = self.embedder.embed(query)
+        scores = np.asarray(matrix[:rows] @ query_vec)
+        k = min(k, rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**metadata[i], "score": float(scores[i])}
+            for i in top
+            if scores[i] >= min_score
+        ]
+
+    def snapshot(self):
+        """
+        (matrix, metadata) for every complete row: a copy of the embeddings and
+        the metadata list, consistent with each other.
+        """
+        with self.lock:
+            self._refresh()
+            rows = min(self._rows, len(self._metadata))
+            matrix = np.array(self._matrix[:rows]) if rows else np.zeros((0, self.dim), dtype=np.float32)
+            return matrix, list(self._metadata[:rows])
+
+    def rewrite(self, keep, base_rows: int) -> int:
+        """
+        Replace the index with `keep`, a list of (row, metadata) pairs taken
+        from a snapshot of `base_rows` rows, followed by any rows appended since
+        that snapshot. Both files are swapped in under the exclusive lock.
+        Returns the new row count.
+        """
+        lock_file = self._file_lock(fcntl.LOCK_EX)
+        try:
+            current = np.memmap(self.matrix_path, dtype=np.float32, mode="r",
+                                shape=(self._row_count(), self.dim)) if self._row_count() else None
+            with open(self.meta_path, "rb") as f:
+                lines = [line for line in f if line.endswith(b"\n")]
+            late = [json.loads(line) for line in lines[base_rows:]]
+
+            tmp_matrix, tmp_meta = self.matrix_path + ".tmp", self.meta_path + ".tmp"
+            row = 0
+            with open(tmp_matrix, "wb") as mf, open(tmp_meta, "w", encoding="utf-8") as tf:
+                for old_row, metadata in keep + [(m["row"], m) for m in late]:
+                    mf.write(np.asarray(current[old_row], dtype=np.float32).tobytes())
+                    tf.write(json.dumps({**metadata, "row": row}, ensure_ascii=False) + "\n")
+                    row += 1
+            del current
+            os.replace(tmp_meta, self.meta_path)
+            os.replace(tmp_matrix, self.matrix_path)
+            return row
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def stats(self):
+        with self.lock:
+            self._refresh()
+            return {
+                "rows": self._rows,
+                "dim": self.dim,
+                "embedder": self.embedder.name,
+                "matrix_bytes": self._rows * self.dim * 4,
+                "metadata_bytes": self._meta_offset,
+                "embedding_cache_hits": getattr(self.embedder, "hits", 0),
+                "embedding_cache_misses": getattr(self.embedder, "misses", 0),
+            }